@@ -213,7 +213,12 @@ def mkdirp(*paths):
     """Creates a directory, as well as parent directories if needed."""
     for path in paths:
         if not os.path.exists(path):
-            os.makedirs(path)
+            try:
+                os.makedirs(path)
+            except OSError as e:
+                # Another process may have just created it.
+                if e.errno != errno.EEXIST or not os.path.isdir(path):
+                    raise
         elif not os.path.isdir(path):
             raise OSError(errno.EEXIST, "File alredy exists", path)
 
@@ -198,6 +198,58 @@ class memoized(object):
         self.cache.clear()
 
 
+class LRUCache(object):
+    """Dict-like cache that holds at most ``size`` items.
+
+       When the cache is full, the least recently used quarter of its
+       items is evicted at once.  ``hits`` and ``misses`` count the
+       lookups done with ``get()``.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._used = {}
+        self._tick = 0
+
+
+    def get(self, key, default=None):
+        if key in self._data:
+            self.hits += 1
+            self._tick += 1
+            self._used[key] = self._tick
+            return self._data[key]
+        self.misses += 1
+        return default
+
+
+    def __setitem__(self, key, value):
+        if key not in self._data and len(self._data) >= self.size:
+            oldest = sorted(self._used, key=self._used.get)
+            for old_key in oldest[:max(1, self.size // 4)]:
+                del self._data[old_key]
+                del self._used[old_key]
+
+        self._tick += 1
+        self._data[key] = value
+        self._used[key] = self._tick
+
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+    def __len__(self):
+        return len(self._data)
+
+
+    def clear(self):
+        """Remove all items.  Hit and miss counts are kept."""
+        self._data.clear()
+        self._used.clear()
+
+
 def list_modules(directory, **kwargs):
     """Lists all of the modules, excluding __init__.py, in a
        particular directory.  Listed packages have no particular
@@ -23,6 +23,7 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
 import os
+import sys
 import fcntl
 import errno
 import time
@@ -34,10 +35,28 @@ _default_timeout = 60
 # Sleep time per iteration in spin loop (in seconds)
 _sleep_time = 1e-5
 
+# Number of bits that byte offsets passed to lockf() can safely have.
+# (Not sys.maxsize.bit_length(), which needs Python 2.7.)
+max_offset_bits = len(bin(sys.maxsize)) - 3
+
 
 class Lock(object):
-    def __init__(self,file_path):
+    """A POSIX lock on a file, or on a range of bytes in a file.
+
+    By default the whole file is locked.  Pass ``start`` and
+    ``length`` to lock only that byte range, so that one lock file can
+    hold many independent locks.  The bytes need not exist in the file.
+
+    POSIX locks belong to processes, and closing any descriptor for a
+    file releases all of the process's locks on it.  So a process
+    should not hold byte-range locks on the same file through more
+    than one ``Lock`` object at a time.
+    """
+
+    def __init__(self, file_path, start=0, length=0):
         self._file_path = file_path
+        self._start = start
+        self._length = length
         self._fd = None
         self._reads = 0
         self._writes = 0
@@ -49,21 +68,28 @@ class Lock(object):
         The lock is implemented as a spin lock using a nonblocking
         call to lockf().
 
-        On acquiring an exclusive lock, the lock writes this process's
-        pid and host to the lock file, in case the holding process
-        needs to be killed later.
+        On acquiring an exclusive lock on a whole file, the lock writes
+        this process's pid and host to the lock file, in case the
+        holding process needs to be killed later.
 
-        If the lock times out, it raises a ``LockError``.
+        If the lock times out, it raises a ``LockError``.  If timeout
+        is None, this blocks until the lock is acquired.
         """
+        if self._fd is None:
+            self._fd = os.open(self._file_path, os.O_RDWR | os.O_CREAT)
+
+        if timeout is None:
+            fcntl.lockf(self._fd, op, self._length, self._start)
+            self._write_owner(op)
+            return
+
+        # Always try at least once, so a zero timeout means "don't wait".
         start_time = time.time()
-        while (time.time() - start_time) < timeout:
+        while True:
             try:
-                if self._fd is None:
-                    self._fd = os.open(self._file_path, os.O_RDWR)
-
-                fcntl.lockf(self._fd, op | fcntl.LOCK_NB)
-                if op == fcntl.LOCK_EX:
-                    os.write(self._fd, "pid=%s,host=%s" % (os.getpid(), socket.getfqdn()))
+                fcntl.lockf(self._fd, op | fcntl.LOCK_NB,
+                            self._length, self._start)
+                self._write_owner(op)
                 return
 
             except IOError as error:
@@ -71,11 +97,25 @@ class Lock(object):
                     pass
                 else:
                     raise
+            if (time.time() - start_time) >= timeout:
+                break
             time.sleep(_sleep_time)
 
+        # Don't keep the file open if this object holds no lock in it.
+        if self._reads == 0 and self._writes == 0:
+            os.close(self._fd)
+            self._fd = None
         raise LockError("Timed out waiting for lock.")
 
 
+    def _write_owner(self, op):
+        """Record the pid and host holding an exclusive whole-file lock.
+           Byte-range locks share their file, so they record nothing."""
+        if op == fcntl.LOCK_EX and self._start == 0 and self._length == 0:
+            os.write(self._fd, "pid=%s,host=%s"
+                     % (os.getpid(), socket.getfqdn()))
+
+
     def _unlock(self):
         """Releases a lock using POSIX locks (``fcntl.lockf``)
 
@@ -83,7 +123,7 @@ class Lock(object):
         be masquerading as write locks, but this removes either.
 
         """
-        fcntl.lockf(self._fd,fcntl.LOCK_UN)
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, self._length, self._start)
         os.close(self._fd)
         self._fd = None
 
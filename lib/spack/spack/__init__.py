@@ -45,6 +45,7 @@ hooks_path     = join_path(module_path, "hooks")
 var_path       = join_path(spack_root, "var", "spack")
 stage_path     = join_path(var_path, "stage")
 repos_path     = join_path(var_path, "repos")
+cache_path     = join_path(var_path, "cache")
 share_path     = join_path(spack_root, "share", "spack")
 
 prefix = spack_root
@@ -103,6 +104,13 @@ abi = ABI()
 from spack.concretize import DefaultConcretizer
 concretizer = DefaultConcretizer()
 
+#
+# Concretized specs are cached here, keyed by everything that
+# concretization depends on.  Clear with `spack clean --concretize-cache`.
+#
+from spack.concretize import ConcretizationCache
+concretization_cache = ConcretizationCache(join_path(cache_path, "concretize"))
+
 # Version information
 from spack.version import Version
 spack_version = Version("0.9.1")
@@ -144,6 +152,12 @@ for path in _tmp_candidates:
 # for.
 do_checksum = True
 
+# Directory of prebuilt install prefixes, keyed by DAG hash.  Installs
+# are extracted from it when possible, and packages that are built are
+# added to it.  It can be the root of a local mirror.  None disables
+# the build cache.  See spack.build_cache.
+build_cache_path = None
+
 #
 # SYS_TYPE to use for the spack installation.
 # Value of this determines what platform spack thinks it is by
@@ -0,0 +1,336 @@
+##############################################################################
+# Copyright (c) 2013-2016, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/llnl/spack
+# Please also see the LICENSE file for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""
+A cache of built install prefixes, stored as relocatable tarballs.
+
+When ``spack.build_cache_path`` is set, each package that Spack builds
+is archived afterwards, prefix and ``.spack`` metadata directory
+included, as::
+
+    <build_cache_path>/build_cache/<name>-<version>-<dag_hash>.tar.gz
+
+Before building a package, Spack looks for its tarball there and, if
+it finds one, extracts it instead of building.  The cache is a plain
+directory.  It can live on a shared filesystem or in a local mirror.
+
+Each tarball holds the prefix under ``prefix/``, plus a
+``build_cache.yaml`` file that records the paths the package was
+built with.  If the tarball is extracted into a different install
+tree, relocate() rewrites those paths.  This covers the package's own
+prefix, the prefixes of its dependencies (which are in the same tree),
+and sbang lines.  Text files are rewritten in place.  In binaries, a
+path can be replaced by one that is no longer, padded with leading
+slashes so that offsets don't change.  Longer paths can only be fixed
+in ELF RPATHs, and only if ``patchelf`` is available.  A package that
+can't be relocated is built from source.
+"""
+import os
+import re
+import shutil
+import stat
+import tarfile
+import tempfile
+import time
+from contextlib import closing
+from StringIO import StringIO
+
+import yaml
+
+import llnl.util.tty as tty
+from llnl.util.filesystem import join_path, mkdirp
+
+import spack
+import spack.build_environment
+import spack.hooks
+from spack.error import SpackError
+from spack.util.executable import which
+
+# Name of the directory under the cache root that holds tarballs.
+_cache_dirname = 'build_cache'
+
+# Name of the file in each tarball describing how it was built.
+_info_name = 'build_cache.yaml'
+
+# Directory in each tarball that holds the prefix.
+_prefix_name = 'prefix'
+
+# Files with a NUL byte among their first this many bytes are binary.
+_binary_check_size = 8192
+
+
+def tarball_path(spec, root=None):
+    """Path of the tarball for a concrete spec in a build cache."""
+    if root is None:
+        root = spack.build_cache_path
+    return join_path(root, _cache_dirname, "%s-%s-%s.tar.gz" % (
+        spec.name, spec.version, spec.dag_hash()))
+
+
+def sbang_path():
+    """Path of the sbang script that shebang lines refer to."""
+    return join_path(spack.spack_root, 'bin', 'sbang')
+
+
+def store(spec, root=None):
+    """Archive the install prefix of a concrete spec into the build
+       cache at root, unless it is already there.  Returns the path of
+       the tarball.
+
+       The tarball is written under a temporary name and renamed, so
+       other processes never see a partial tarball.
+    """
+    path = tarball_path(spec, root)
+    if os.path.exists(path):
+        return path
+
+    cache_dir = os.path.dirname(path)
+    mkdirp(cache_dir)
+
+    info = {'prefix': spack.install_layout.path_for_spec(spec),
+            'install_root': spack.install_layout.root,
+            'sbang': sbang_path()}
+    info_text = yaml.dump(info, default_flow_style=False)
+
+    # Build stats describe the build that made this prefix, not the
+    # installs that extract it, so they stay out of the tarball.
+    # (tarfile's filter argument needs Python 2.7, so use exclude.)
+    stats_path = spack.install_layout.build_stats_path(spec)
+
+    def exclude_stats(path):
+        return path == stats_path
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=cache_dir, prefix='.' + os.path.basename(path))
+    os.close(fd)
+    stored = False
+    try:
+        with closing(tarfile.open(tmp_path, 'w:gz')) as tar:
+            tar.add(info['prefix'], arcname=_prefix_name,
+                    exclude=exclude_stats)
+
+            tarinfo = tarfile.TarInfo(_info_name)
+            tarinfo.size = len(info_text)
+            tarinfo.mtime = time.time()
+            tar.addfile(tarinfo, StringIO(info_text))
+
+        os.chmod(tmp_path, 0644)
+        os.rename(tmp_path, path)
+        stored = True
+    finally:
+        if not stored:
+            os.remove(tmp_path)
+    return path
+
+
+def extract(spec, root=None):
+    """Install a concrete spec from the build cache at root.
+
+       Returns False if the cache has no tarball for the spec.  The
+       prefix is unpacked and relocated next to its final location and
+       then renamed into place, so a failed extraction leaves nothing
+       behind.  Raises BuildCacheError if the tarball can't be used.
+    """
+    path = tarball_path(spec, root)
+    if not os.path.isfile(path):
+        return False
+
+    prefix = spack.install_layout.path_for_spec(spec)
+    parent = os.path.dirname(prefix)
+    mkdirp(parent)
+
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.build-cache-')
+    try:
+        with closing(tarfile.open(path)) as tar:
+            for member in tar.getmembers():
+                _check_member(path, member)
+            tar.extractall(tmp_dir)
+
+        with open(join_path(tmp_dir, _info_name)) as info_file:
+            info = yaml.load(info_file)
+
+        new_prefix = join_path(tmp_dir, _prefix_name)
+        relocate(new_prefix, [
+            (info['prefix'], prefix),
+            (info['install_root'], spack.install_layout.root),
+            (info['sbang'], sbang_path())])
+
+        os.rename(new_prefix, prefix)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # Make sure we got what we asked for.
+    installed = False
+    try:
+        spack.install_layout.check_installed(spec)
+        installed = True
+    finally:
+        if not installed:
+            shutil.rmtree(prefix, ignore_errors=True)
+    return True
+
+
+def install_from_cache(pkg):
+    """Install a package from the build cache, if it is there.
+
+       Returns True if the package was installed.  Problems with the
+       cache are reported as warnings and leave the package to be built
+       from source.
+
+       Like a build, this runs in a forked process with the package's
+       build environment, which the post-install hooks rely on.
+    """
+    if not os.path.isfile(tarball_path(pkg.spec)):
+        return False
+
+    def extract_process():
+        start_time = time.time()
+        extract(pkg.spec)
+        spack.hooks.post_install(pkg)
+        tty.msg("Installed %s from the build cache in %.2fs" %
+                (pkg.name, time.time() - start_time))
+
+    try:
+        spack.build_environment.fork(pkg, extract_process)
+    except spack.build_environment.InstallError:
+        if os.path.exists(pkg.prefix):
+            pkg.remove_prefix()
+        tty.warn("Could not install %s from the build cache; "
+                 "building it from source." % pkg.name)
+        return False
+    return True
+
+
+def add_to_cache(pkg):
+    """Add a package that was just built to the build cache.  Failure
+       to do so is only a warning; the install itself succeeded."""
+    try:
+        store(pkg.spec)
+    except Exception as e:
+        tty.warn("Could not add %s to the build cache." % pkg.name, str(e))
+
+
+def relocate(path, replacements):
+    """Rewrite paths in the files under path.
+
+       replacements is a list of (old, new) path pairs.  Files,
+       including binaries, and symbolic link targets are rewritten.
+       Raises RelocationError if a binary can't be relocated.
+    """
+    mapping = dict((old, new) for old, new in replacements if old != new)
+    if not mapping:
+        return
+
+    # Match all old paths in one pass, longest first, so that a new
+    # path is never rewritten again by a later replacement.
+    olds = sorted(mapping, key=len, reverse=True)
+    pattern = re.compile('|'.join(re.escape(old) for old in olds))
+
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in dirnames + filenames:
+            file_path = join_path(dirpath, name)
+            if os.path.islink(file_path):
+                target = os.readlink(file_path)
+                new_target = pattern.sub(
+                    lambda m: mapping[m.group(0)], target)
+                if new_target != target:
+                    os.unlink(file_path)
+                    os.symlink(new_target, file_path)
+
+            elif name in filenames and os.path.isfile(file_path):
+                _relocate_file(file_path, pattern, mapping)
+
+
+def _relocate_file(path, pattern, mapping):
+    """Rewrite the paths matched by pattern in one file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not pattern.search(data):
+        return
+
+    if '\0' in data[:_binary_check_size]:
+        data = _relocate_binary(path, data, pattern, mapping)
+    else:
+        data = pattern.sub(lambda m: mapping[m.group(0)], data)
+
+    # Installed files are often read-only.
+    mode = os.stat(path).st_mode
+    if not mode & stat.S_IWUSR:
+        os.chmod(path, mode | stat.S_IWUSR)
+    with open(path, 'wb') as f:
+        f.write(data)
+    os.chmod(path, mode)
+
+
+def _relocate_binary(path, data, pattern, mapping):
+    """Return the contents of a binary with paths rewritten.
+
+       Paths are replaced by new ones padded to the same length with
+       leading slashes.  Longer new paths in ELF RPATHs are set with
+       patchelf first.
+    """
+    too_long = [old for old, new in mapping.items() if len(new) > len(old)]
+    if too_long and data.startswith('\x7fELF'):
+        patchelf = which('patchelf')
+        if patchelf:
+            rpath = patchelf('--print-rpath', path, output=str).strip()
+            new_rpath = pattern.sub(lambda m: mapping[m.group(0)], rpath)
+            if new_rpath != rpath:
+                patchelf('--set-rpath', new_rpath, path)
+                with open(path, 'rb') as f:
+                    data = f.read()
+
+    def padded(match):
+        old = match.group(0)
+        new = mapping[old]
+        if len(new) > len(old):
+            raise RelocationError(
+                "Cannot relocate %s: %s is longer than %s."
+                % (path, new, old))
+        return new.rjust(len(old), '/')
+
+    return pattern.sub(padded, data)
+
+
+def _check_member(path, member):
+    """Ensure a tarball member can only extract into the tarball's
+       own directory."""
+    name = os.path.normpath(member.name)
+    if (name != _info_name and name != _prefix_name and
+            not name.startswith(_prefix_name + os.sep)):
+        raise BuildCacheError(
+            "Unexpected file in build cache tarball %s: %s"
+            % (path, member.name))
+    if member.islnk() and os.path.isabs(member.linkname):
+        raise BuildCacheError(
+            "Absolute hard link in build cache tarball %s: %s"
+            % (path, member.name))
+
+
+class BuildCacheError(SpackError):
+    """Raised when a build cache tarball can't be used."""
+
+
+class RelocationError(BuildCacheError):
+    """Raised when a binary can't be relocated to a new prefix."""
@@ -0,0 +1,147 @@
+##############################################################################
+# Copyright (c) 2013-2016, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/llnl/spack
+# Please also see the LICENSE file for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""
+Resource usage of the phases of a build.
+
+Package.do_install_self() records the wall time, CPU time and peak
+resident set size of each phase of a build, and writes them to
+``build_stats.yaml`` in the prefix's metadata directory.  The phases
+are, in order:
+
+    fetch, checksum, expand, patch, install, post_install
+
+plus ``total``, which covers the whole build.  When the installer
+fetched the sources ahead of the build, the fetch worker's usage is
+added to the build's.  CPU time includes the processes a phase runs,
+like compilers.  Peak RSS is that of the largest process the phase
+ran: Executable reports the ``ru_maxrss`` of each process it waits
+for through child_exited().  A phase that runs no processes, like a
+fake install, records a peak RSS of 0.
+
+``spack build-stats`` reads these files back to show which packages
+take the most time to build.
+"""
+# Need this because of spack.resource
+from __future__ import absolute_import
+
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+import yaml
+
+from llnl.util.filesystem import mkdirp
+
+"""Phases of a build, in the order they run."""
+phases = ['fetch', 'checksum', 'expand', 'patch', 'install',
+          'post_install', 'total']
+
+"""Measurements recorded for each phase."""
+fields = ['wall', 'cpu', 'max_rss']
+
+# Largest peak RSS (in KB) of the child processes that exited during
+# each phase that is running, innermost last.
+_phase_max_rss = []
+
+
+def _usage():
+    """Current wall time and CPU time of this process and its finished
+       children."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (own.ru_utime + own.ru_stime +
+           children.ru_utime + children.ru_stime)
+    return time.time(), cpu
+
+
+def child_exited(rusage):
+    """Record the resource usage of a child process, as returned by
+       os.wait4(), in the phases that are running."""
+    max_rss = rusage.ru_maxrss
+    if sys.platform == 'darwin':
+        max_rss //= 1024    # Reported in bytes, not KB.
+    for i, phase_max_rss in enumerate(_phase_max_rss):
+        _phase_max_rss[i] = max(phase_max_rss, max_rss)
+
+
+class BuildStats(object):
+    """Resource usage of the phases of one build.
+
+       ``stats[phase]`` is a dict with the phase's ``wall`` and ``cpu``
+       seconds and its ``max_rss`` in KB.  Phases that run more than
+       once, e.g. because a fetch is retried, add up.
+    """
+
+    def __init__(self, stats=None):
+        self.stats = stats or {}
+
+    @contextmanager
+    def phase(self, name):
+        """Record the resource usage of the code in a with block."""
+        start_wall, start_cpu = _usage()
+        _phase_max_rss.append(0)
+        try:
+            yield
+        finally:
+            wall, cpu = _usage()
+            max_rss = _phase_max_rss.pop()
+            stats = self.stats.setdefault(
+                name, {'wall': 0.0, 'cpu': 0.0, 'max_rss': 0})
+            stats['wall'] += wall - start_wall
+            stats['cpu'] += cpu - start_cpu
+            stats['max_rss'] = max(stats['max_rss'], max_rss)
+
+    def add(self, other):
+        """Add the usage recorded in another BuildStats, e.g. one from
+           a process that fetched the sources ahead of the build."""
+        for name, other_stats in other.stats.items():
+            stats = self.stats.setdefault(
+                name, {'wall': 0.0, 'cpu': 0.0, 'max_rss': 0})
+            stats['wall'] += other_stats['wall']
+            stats['cpu'] += other_stats['cpu']
+            stats['max_rss'] = max(stats['max_rss'], other_stats['max_rss'])
+
+    def __getitem__(self, phase):
+        return self.stats[phase]
+
+    def __contains__(self, phase):
+        return phase in self.stats
+
+    def write(self, path):
+        mkdirp(os.path.dirname(path))
+        with open(path, 'w') as f:
+            yaml.dump({'build_stats': self.stats}, f,
+                      default_flow_style=False)
+
+    @staticmethod
+    def read(path):
+        """Read stats written by write(), or return None if there are
+           none at path."""
+        if not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            return BuildStats(yaml.load(f)['build_stats'])
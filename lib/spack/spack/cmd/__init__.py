@@ -32,6 +32,7 @@ from llnl.util.lang import attr_setdefault
 import spack
 import spack.spec
 import spack.config
+import spack.concretize
 
 #
 # Settings for commands that modify configuration
@@ -93,16 +94,20 @@ def parse_specs(args, **kwargs):
     """
     concretize = kwargs.get('concretize', False)
     normalize = kwargs.get('normalize', False)
+    unify = kwargs.get('unify', False)
+    reuse = kwargs.get('reuse', False)
 
     if isinstance(args, (python_list, tuple)):
         args = " ".join(args)
 
     try:
         specs = spack.spec.parse(args)
-        for spec in specs:
-            if concretize:
-                spec.concretize() # implies normalize
-            elif normalize:
+        if concretize:
+            # implies normalize
+            spack.concretize.concretize_together(
+                specs, unify=unify, reuse=reuse)
+        elif normalize:
+            for spec in specs:
                 spec.normalize()
 
         return specs
@@ -0,0 +1,121 @@
+##############################################################################
+# Copyright (c) 2013-2016, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/llnl/spack
+# Please also see the LICENSE file for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+import argparse
+
+import llnl.util.tty as tty
+import spack
+import spack.cmd
+import spack.build_stats
+from spack.build_stats import BuildStats
+
+description = "Show the time and memory used to build installed packages"
+
+
+def setup_parser(subparser):
+    subparser.add_argument(
+        '-s', '--sort', default='total',
+        choices=spack.build_stats.phases,
+        help="Sort by wall time of this phase (default: total).")
+    subparser.add_argument(
+        '-n', '--number', type=int, default=None,
+        help="Show only the N packages that took longest.")
+    subparser.add_argument(
+        'query_specs', nargs=argparse.REMAINDER,
+        help="Installed specs to show build stats for (default: all).")
+
+
+def format_rss(kb):
+    """Format a size in KB the way top does."""
+    for unit in ('K', 'M', 'G'):
+        if kb < 1024:
+            return "%.0f%s" % (kb, unit)
+        kb /= 1024.0
+    return "%.1fT" % kb
+
+
+def build_stats(parser, args):
+    query_specs = spack.cmd.parse_specs(args.query_specs)
+
+    with spack.installed_db.read_transaction():
+        if not query_specs:
+            specs = set(spack.installed_db.query())
+        else:
+            specs = set.union(*[set(spack.installed_db.query(qs))
+                                for qs in query_specs])
+
+    if not specs:
+        tty.msg("No installed packages match.")
+        return
+
+    # Packages installed before stats were recorded, or taken from a
+    # build cache, have none.
+    found, missing = [], []
+    for spec in specs:
+        path = spack.install_layout.build_stats_path(spec)
+        stats = BuildStats.read(path)
+        if stats is None or 'total' not in stats:
+            missing.append(spec)
+        else:
+            found.append((spec, stats))
+
+    if not found:
+        tty.msg("No build stats for %d installed packages." % len(missing))
+        return
+
+    def wall(stats, phase):
+        return stats[phase]['wall'] if phase in stats else 0.0
+
+    found.sort(key=lambda (spec, stats): wall(stats, args.sort),
+               reverse=True)
+    if args.number is not None:
+        found = found[:args.number]
+
+    # One row per package: overall usage, then wall time of each phase.
+    phases = [p for p in spack.build_stats.phases if p != 'total']
+    header = ['package', 'wall', 'cpu', 'max_rss'] + phases
+    rows = []
+    for spec, stats in found:
+        total = stats['total']
+        rows.append([spec.format('$_$@$#'),
+                     "%.1f" % total['wall'],
+                     "%.1f" % total['cpu'],
+                     format_rss(total['max_rss'])] +
+                    ["%.1f" % wall(stats, p) for p in phases])
+    rows.append(['total (%d)' % len(found),
+                 "%.1f" % sum(s['total']['wall'] for _, s in found),
+                 "%.1f" % sum(s['total']['cpu'] for _, s in found),
+                 format_rss(max(s['total']['max_rss'] for _, s in found))] +
+                ["%.1f" % sum(wall(s, p) for _, s in found) for p in phases])
+
+    widths = [max(len(row[i]) for row in [header] + rows)
+              for i in range(len(header))]
+    for i, row in enumerate([header] + rows):
+        if i == len(rows):
+            print '  '.join('-' * w for w in widths)
+        print '  '.join([row[0].ljust(widths[0])] +
+                        [c.rjust(w) for c, w in zip(row[1:], widths[1:])])
+
+    if missing:
+        tty.msg("%d installed packages have no build stats." % len(missing))
@@ -32,11 +32,20 @@ import spack.cmd
 description = "Remove build stage and source tarball for packages."
 
 def setup_parser(subparser):
+    subparser.add_argument(
+        '--concretize-cache', action='store_true',
+        help="Remove all cached concretizations.")
     subparser.add_argument('packages', nargs=argparse.REMAINDER,
                            help="specs of packages to clean")
 
 
 def clean(parser, args):
+    if args.concretize_cache:
+        removed = spack.concretization_cache.clear()
+        tty.msg("Removed %d cached concretizations." % removed)
+        if not args.packages:
+            return
+
     if not args.packages:
         tty.die("spack clean requires at least one package spec.")
 
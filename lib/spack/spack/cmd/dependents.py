@@ -42,5 +42,6 @@ def dependents(parser, args):
         tty.die("spack dependents takes only one spec.")
 
     fmt = '$_$@$%@$+$=$#'
-    deps = [d.format(fmt, color=True) for d in specs[0].package.installed_dependents]
+    deps = [d.format(fmt, color=True)
+            for d in spack.installed_db.dependents(specs[0], transitive=True)]
     tty.msg("Dependents of %s" % specs[0].format(fmt, color=True), *deps)
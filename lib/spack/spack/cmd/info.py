@@ -44,7 +44,8 @@ def setup_parser(subparser):
 
 
 def print_text_info(pkg):
-    """Print out a plain text description of a package."""
+    """Print out a plain text description of a package, given its
+       cached PackageMetadata."""
     print "Package:   ", pkg.name
     print "Homepage:  ", pkg.homepage
 
@@ -54,10 +55,16 @@ def print_text_info(pkg):
     if not pkg.versions:
         print("    None")
     else:
+        fetchers = pkg.fetchers
+        if fetchers is None:
+            # The package needs a spec to find its URLs, so load it.
+            real_pkg = spack.repo.get(pkg.name)
+            fetchers = dict((v, fs.for_package_version(real_pkg, v))
+                            for v in pkg.versions)
+
         pad = padder(pkg.versions, 4)
         for v in reversed(sorted(pkg.versions)):
-            f = fs.for_package_version(pkg, v)
-            print "    %s%s" % (pad(v), str(f))
+            print "    %s%s" % (pad(v), str(fetchers[v]))
 
     print
     print "Variants:"
@@ -98,12 +105,12 @@ def print_text_info(pkg):
 
     print
     print "Description:"
-    if pkg.__doc__:
+    if pkg.doc:
         print pkg.format_doc(indent=4)
     else:
         print "    None"
 
 
 def info(parser, args):
-    pkg = spack.repo.get(args.name)
+    pkg = spack.repo.get_pkg_metadata(args.name)
     print_text_info(pkg)
@@ -23,11 +23,14 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
 import argparse
+import os
+import re
 
 import llnl.util.tty as tty
 
 import spack
 import spack.cmd
+import spack.installer
 
 description = "Build and install packages"
 
@@ -38,6 +41,17 @@ def setup_parser(subparser):
     subparser.add_argument(
         '-j', '--jobs', action='store', type=int,
         help="Explicitly set number of make jobs.  Default is #cpus.")
+    subparser.add_argument(
+        '-p', '--jobs-packages', action='store', type=int, default=1,
+        dest='jobs_packages',
+        help="Build up to this many packages at once, sharing the make "
+             "jobs among them.  Default is 1.")
+    subparser.add_argument(
+        '--fetch-jobs', action='store', type=int, default=None,
+        dest='fetch_jobs',
+        help="Fetch up to this many packages' sources while building.  "
+             "Default is 4 with -p N, and 0 otherwise; 0 fetches each "
+             "package when it is built.")
     subparser.add_argument(
         '--keep-prefix', action='store_true', dest='keep_prefix',
         help="Don't remove the install prefix if installation fails.")
@@ -53,6 +67,18 @@ def setup_parser(subparser):
     subparser.add_argument(
         '--fake', action='store_true', dest='fake',
         help="Fake install.  Just remove the prefix and touch a fake file in it.")
+    subparser.add_argument(
+        '--build-cache', action='store', dest='build_cache', metavar='DIR',
+        help="Install prebuilt packages from this directory when they are "
+             "there, and add the packages that are built to it.")
+    subparser.add_argument(
+        '--unify', action='store_true', dest='unify',
+        help="Use one configuration for dependencies shared by the "
+             "packages.")
+    subparser.add_argument(
+        '--reuse', action='store_true', dest='reuse',
+        help="Prefer installed versions, variants, and compilers to "
+             "rebuilding.")
     subparser.add_argument(
         'packages', nargs=argparse.REMAINDER, help="specs of packages to install")
 
@@ -65,18 +91,48 @@ def install(parser, args):
         if args.jobs <= 0:
             tty.die("The -j option must be a positive integer!")
 
+    if args.jobs_packages <= 0:
+        tty.die("The --jobs-packages option must be a positive integer!")
+
+    if args.fetch_jobs is not None and args.fetch_jobs < 0:
+        tty.die("The --fetch-jobs option must not be negative!")
+
     if args.no_checksum:
         spack.do_checksum = False        # TODO: remove this global.
 
-    specs = spack.cmd.parse_specs(args.packages, concretize=True)
+    if args.build_cache:
+        # Accept local mirror URLs as well as paths.
+        path = re.sub(r'^file://', '', args.build_cache)
+        spack.build_cache_path = os.path.abspath(path)
+
+    specs = spack.cmd.parse_specs(
+        args.packages, concretize=True, unify=args.unify, reuse=args.reuse)
+
+    # Installs lock the database only to record each package, and lock
+    # the prefixes they build, so other Spack processes can install
+    # into the same tree at the same time.  Plain `spack install`
+    # builds one package at a time, without forking fetch workers.
+    fetch_jobs = args.fetch_jobs
+    if fetch_jobs is None:
+        fetch_jobs = 4 if args.jobs_packages > 1 else 0
+    if not args.ignore_deps and (args.jobs_packages > 1 or fetch_jobs):
+        spack.installer.install_specs(
+            specs, args.jobs_packages,
+            make_jobs=args.jobs,
+            fetch_jobs=fetch_jobs,
+            keep_prefix=args.keep_prefix,
+            keep_stage=args.keep_stage,
+            verbose=args.verbose,
+            fake=args.fake)
+        return
+
     for spec in specs:
         package = spack.repo.get(spec)
-        with spack.installed_db.write_transaction():
-            package.do_install(
-                keep_prefix=args.keep_prefix,
-                keep_stage=args.keep_stage,
-                ignore_deps=args.ignore_deps,
-                make_jobs=args.jobs,
-                verbose=args.verbose,
-                fake=args.fake,
-                explicit=True)
+        package.do_install(
+            keep_prefix=args.keep_prefix,
+            keep_stage=args.keep_stage,
+            ignore_deps=args.ignore_deps,
+            make_jobs=args.jobs,
+            verbose=args.verbose,
+            fake=args.fake,
+            explicit=True)
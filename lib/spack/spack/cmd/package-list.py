@@ -48,7 +48,8 @@ def rst_table(elts):
 
 def print_rst_package_list():
     """Print out information on all packages in restructured text."""
-    pkgs = sorted(spack.repo.all_packages(), key=lambda s:s.name.lower())
+    pkgs = sorted(spack.repo.all_package_metadata(),
+                  key=lambda s: s.name.lower())
 
     print ".. _package-list:"
     print
@@ -83,7 +84,7 @@ def print_rst_package_list():
         if pkg.dependencies:
             print "Dependencies"
             print "  " + ", ".join("`%s`_" % d if d != "mpi" else d
-                                   for d in pkg.dependencies)
+                                   for d in sorted(pkg.dependencies))
             print
         print "Description:"
         print pkg.format_doc(indent=2)
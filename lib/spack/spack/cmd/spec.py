@@ -28,6 +28,7 @@ import spack.cmd
 import llnl.util.tty as tty
 
 import spack
+import spack.concretize
 import spack.url as url
 
 description = "print out abstract and concrete versions of a spec."
@@ -35,6 +36,9 @@ description = "print out abstract and concrete versions of a spec."
 def setup_parser(subparser):
     subparser.add_argument('-i', '--ids', action='store_true',
                            help="show numerical ids for dependencies.")
+    subparser.add_argument(
+        '--reuse', action='store_true',
+        help="prefer installed versions, variants, and compilers.")
     subparser.add_argument('specs', nargs=argparse.REMAINDER, help="specs of packages")
 
 
@@ -55,5 +59,5 @@ def spec(parser, args):
 
         print "Concretized"
         print "------------------------------"
-        spec.concretize()
+        spack.concretize.concretize_together([spec], reuse=args.reuse)
         print spec.tree(**kwargs)
@@ -33,11 +33,20 @@ or user preferences.
 TODO: make this customizable and allow users to configure
       concretization  policies.
 """
+import os
+import sys
+import socket
+import hashlib
+
+import llnl.util.tty as tty
+from llnl.util.filesystem import join_path, mkdirp
+
 import spack
 import spack.spec
 import spack.compilers
 import spack.architecture
 import spack.error
+import spack.util.spack_json as sjson
 from spack.version import *
 from functools import partial
 from spec import DependencyMap
@@ -50,6 +59,128 @@ class DefaultConcretizer(object):
        concretization.  You can subclass it to override just some of the
        default concretization strategies, or you can override all of them.
     """
+    # State shared by the specs of a concretize_together() call, or
+    # None when specs are concretized one at a time.
+    batch = None
+
+    def _all_compilers(self):
+        batch = self.batch
+        if batch is None:
+            return spack.compilers.all_compilers()
+        if batch.compilers is None:
+            batch.compilers = spack.compilers.all_compilers()
+        return batch.compilers
+
+
+    def _compiler_for_spec(self, compiler_spec):
+        batch = self.batch
+        if batch is None:
+            return spack.compilers.compiler_for_spec(compiler_spec)
+        if compiler_spec not in batch.compilers_for:
+            batch.compilers_for[compiler_spec] = \
+                spack.compilers.compiler_for_spec(compiler_spec)
+        return batch.compilers_for[compiler_spec]
+
+
+    def _providers_for(self, spec):
+        batch = self.batch
+        if batch is None:
+            return spack.repo.providers_for(spec)
+        key = str(spec)
+        if key not in batch.providers:
+            batch.providers[key] = spack.repo.providers_for(spec)
+        return batch.providers[key]
+
+
+    def _chosen(self, spec):
+        """Node to copy settings from for spec's package: the one chosen
+           by an earlier spec in a unifying batch, or else an installed
+           one when reusing.  None if there is neither."""
+        batch = self.batch
+        if batch is None:
+            return None
+        if batch.unify and spec.name in batch.chosen:
+            return batch.chosen[spec.name]
+        if spec.name in batch.preferred:
+            return batch.preferred[spec.name][1]
+        return None
+
+
+    def _preference(self, candidate):
+        """Sort key for providers: those satisfied by chosen nodes
+           first, then by installed ones in the order they were
+           preferred, then the rest."""
+        batch = self.batch
+        name = candidate.name
+        if batch.unify and name in batch.chosen:
+            if batch.chosen[name].satisfies(candidate, deps=False):
+                return -1
+        if name in batch.preferred:
+            rank, node = batch.preferred[name]
+            if node.satisfies(candidate, deps=False):
+                return rank
+        return sys.maxint
+
+
+    def cacheable(self):
+        """Whether concretized specs depend only on what the
+           concretization cache uses as its key."""
+        batch = self.batch
+        return batch is None or not (batch.unify or batch.reuse)
+
+
+    def _installed(self, node):
+        """Installed specs that could be used for node, ignoring its
+           dependencies."""
+        query = node.copy(deps=False)
+        key = str(query)
+        batch = self.batch
+        if key not in batch.installed:
+            batch.installed[key] = spack.installed_db.query(query)
+        return batch.installed[key]
+
+
+    def prefer_installed(self, spec):
+        """Prefer installed nodes for the packages in spec, which must
+           be normalized, so that as much as possible of its DAG is
+           already installed.
+
+           Nodes are looked at from the root down.  For each one, the
+           installed spec that agrees with the most nodes of the DAG
+           is preferred, along with the dependencies it was installed
+           with, so that whole installed sub-DAGs are reused.
+        """
+        batch = self.batch
+        batch.preferred = {}
+        nodes = dict((n.name, n) for n in spec.traverse())
+
+        def compatible(installed_node):
+            target = nodes.get(installed_node.name)
+            return target is None or installed_node.satisfies(
+                target, deps=False)
+
+        def score(installed):
+            agree = conflict = 0
+            for n in installed.traverse():
+                if n.name in nodes:
+                    if compatible(n):
+                        agree += 1
+                    else:
+                        conflict += 1
+            return (-conflict, agree, installed.version, installed.dag_hash())
+
+        for node in spec.traverse():
+            if node.name in batch.preferred:
+                continue
+            candidates = self._installed(node)
+            if not candidates:
+                continue
+
+            best = max(candidates, key=score)
+            for n in best.traverse():
+                if n.name not in batch.preferred and compatible(n):
+                    batch.preferred[n.name] = (len(batch.preferred), n)
+
 
     def _valid_virtuals_and_externals(self, spec):
         """Returns a list of candidate virtual dep providers and external
@@ -57,7 +188,9 @@ class DefaultConcretizer(object):
         # First construct a list of concrete candidates to replace spec with.
         candidates = [spec]
         if spec.virtual:
-            providers = spack.repo.providers_for(spec)
+            # These belong to the repository's provider index, and the
+            # one chosen becomes part of the DAG, so work on copies.
+            providers = [p.copy() for p in self._providers_for(spec)]
             if not providers:
                 raise UnsatisfiableProviderSpecError(providers[0], spec)
             spec_w_preferred_providers = find_spec(
@@ -130,6 +263,10 @@ class DefaultConcretizer(object):
 
         # Pull the candidates back out and return them in order
         candidates = [c for s,l,c in keys]
+
+        # Stick with providers chosen for earlier specs or installed.
+        if self.batch is not None:
+            candidates.sort(key=self._preference)
         return candidates
 
 
@@ -151,6 +288,26 @@ class DefaultConcretizer(object):
         if spec.versions.concrete:
             return False
 
+        chosen = self._chosen(spec)
+        if chosen and any(chosen.version.satisfies(sv)
+                          for sv in spec.versions):
+            spec.versions = ver([chosen.version])
+            return True
+
+        # Specs with the same constraints get the same version.
+        batch = self.batch
+        if batch is not None:
+            key = (spec.name, str(spec.versions))
+            if key not in batch.versions:
+                self._choose_version(spec)
+                batch.versions[key] = spec.versions
+            spec.versions = batch.versions[key].copy()
+        else:
+            self._choose_version(spec)
+        return True   # Things changed
+
+
+    def _choose_version(self, spec):
         # If there are known available versions, return the most recent
         # version that satisfies the spec
         pkg = spec.package
@@ -185,8 +342,6 @@ class DefaultConcretizer(object):
                 else:
                     spec.versions = ver([last])
 
-        return True   # Things changed
-
 
     def concretize_architecture(self, spec):
         """If the spec already had an architecture, return.  Otherwise if
@@ -205,7 +360,10 @@ class DefaultConcretizer(object):
         if spec.architecture is not None:
             return False
 
-        if spec.root.architecture:
+        chosen = self._chosen(spec)
+        if chosen:
+            spec.architecture = chosen.architecture
+        elif spec.root.architecture:
             spec.architecture = spec.root.architecture
         else:
             spec.architecture = spack.architecture.sys_type()
@@ -219,9 +377,14 @@ class DefaultConcretizer(object):
            the default variants from the package specification.
         """
         changed = False
+        chosen = self._chosen(spec)
         for name, variant in spec.package_class.variants.items():
             if name not in spec.variants:
-                spec.variants[name] = spack.spec.VariantSpec(name, variant.default)
+                if chosen and name in chosen.variants:
+                    value = chosen.variants[name].value
+                else:
+                    value = variant.default
+                spec.variants[name] = spack.spec.VariantSpec(name, value)
                 changed = True
         return changed
 
@@ -238,13 +401,19 @@ class DefaultConcretizer(object):
            build with the compiler that will be used by libraries that
            link to this one, to maximize compatibility.
         """
-        all_compilers = spack.compilers.all_compilers()
+        all_compilers = self._all_compilers()
 
         if (spec.compiler and
             spec.compiler.concrete and
             spec.compiler in all_compilers):
             return False
 
+        chosen = self._chosen(spec)
+        if (chosen and chosen.compiler in all_compilers and
+            (not spec.compiler or chosen.compiler.satisfies(spec.compiler))):
+            spec.compiler = chosen.compiler.copy()
+            return True
+
         #Find the another spec that has a compiler, or the root if none do
         other_spec = spec if spec.compiler else find_spec(spec, lambda(x) : x.compiler)
         if not other_spec:
@@ -258,7 +427,8 @@ class DefaultConcretizer(object):
             return True
 
         # Filter the compilers into a sorted list based on the compiler_order from spackconfig
-        compiler_list = all_compilers if not other_compiler else spack.compilers.find(other_compiler)
+        compiler_list = all_compilers if not other_compiler else [
+            c for c in all_compilers if c.satisfies(other_compiler)]
         cmp_compilers = partial(spack.pkgsort.compiler_compare, other_spec.name)
         matches = sorted(compiler_list, cmp=cmp_compilers)
         if not matches:
@@ -307,7 +477,7 @@ class DefaultConcretizer(object):
         # Include the compiler flag defaults from the config files
         # This ensures that spack will detect conflicts that stem from a change
         # in default compiler flags.
-        compiler = spack.compilers.compiler_for_spec(spec.compiler)
+        compiler = self._compiler_for_spec(spec.compiler)
         for flag in compiler.flags:
             if flag not in spec.compiler_flags:
                 spec.compiler_flags[flag] = compiler.flags[flag]
@@ -384,6 +554,206 @@ def cmp_specs(lhs, rhs):
     return 0
 
 
+class _ConcretizationBatch(object):
+    """Lookups shared by the specs in one concretize_together() call.
+
+       Compilers, providers and version choices depend only on the
+       configuration, the packages and the installed specs, which
+       don't change during the call, so each is looked up once for the
+       whole batch.
+    """
+    def __init__(self, unify, reuse):
+        self.unify = unify
+        self.reuse = reuse
+        self.compilers = None
+        self.compilers_for = {}
+        self.providers = {}
+        self.versions = {}
+        self.installed = {}
+
+        # package name -> node chosen for it, when unifying.
+        self.chosen = {}
+
+        # package name -> (rank, installed node) preferred for the spec
+        # being concretized, when reusing.
+        self.preferred = {}
+
+
+def concretize_together(specs, unify=False, reuse=False):
+    """Concretize several specs, in order, sharing the work common to
+       them.  Returns the specs, which are concretized in place.
+
+       If unify is True, a package that appears in more than one spec
+       gets the version, variants, compiler and architecture (and, for
+       virtual dependencies, the provider) chosen for it in the first
+       spec, wherever the later specs' constraints allow.  Common
+       dependencies then have the same hash in every spec, so they are
+       built and installed once.
+
+       If reuse is True, installed versions, variants, compilers and
+       providers are preferred over the defaults wherever the specs
+       allow, so that installed DAGs are reused instead of rebuilt
+       when preferences or packages change.  See prefer_installed().
+    """
+    concretizer = spack.concretizer
+    saved_batch = concretizer.batch
+    batch = _ConcretizationBatch(unify, reuse)
+    concretizer.batch = batch
+    try:
+        for spec in specs:
+            if reuse and not spec.concrete:
+                spec.normalize()
+                concretizer.prefer_installed(spec)
+            spec.concretize()
+            if unify:
+                for node in spec.traverse():
+                    batch.chosen.setdefault(node.name, node)
+    finally:
+        concretizer.batch = saved_batch
+    return specs
+
+
+# Bump this if the format of cached concretizations changes.
+_concretization_cache_version = 1
+
+# Most concretizations to keep in the cache.  Each change to a package
+# or to the configuration makes new keys, so old entries are removed,
+# least recently used first.
+_concretization_cache_size = 1000
+
+
+class ConcretizationCache(object):
+    """Persistent cache of concretized specs.
+
+       Concretizing a spec depends only on the abstract spec, the
+       package files in the configured repositories, the packages and
+       compilers configuration, the architecture, and the concretizer
+       itself.  Results are stored in one file per hash of all of
+       these, so a spec that has been concretized before can be read
+       back instead of being concretized again.
+
+       At most max_entries files are kept.  Reading an entry updates
+       its modification time, and writing one removes the entries that
+       were used least recently beyond that.
+    """
+    def __init__(self, root, max_entries=_concretization_cache_size):
+        self.root = root
+        self.max_entries = max_entries
+        self.enabled = True
+
+        # Counts for this process, reported in debug output.
+        self.hits = 0
+        self.misses = 0
+
+
+    def key(self, spec):
+        """Hash of everything that concretizing spec depends on."""
+        concretizer = type(spack.concretizer)
+        inputs = {
+            'version': _concretization_cache_version,
+            'spack': str(spack.spack_version),
+            'concretizer': '%s.%s' % (concretizer.__module__,
+                                      concretizer.__name__),
+            'arch': str(spack.architecture.sys_type()),
+            'spec': spec.dag_hash(),
+            'repos': [[repo.namespace, repo.packages_fingerprint()]
+                      for repo in spack.repo.repos],
+            'packages': get_config('packages'),
+            'compilers': spack.compilers.all_compilers_config()
+        }
+        return hashlib.sha1(sjson.dump(inputs)).hexdigest()
+
+
+    def _path(self, key):
+        return join_path(self.root, key + '.json')
+
+
+    def get(self, key):
+        """Return the concrete spec cached under key, or None."""
+        path = self._path(key)
+        spec = None
+        if os.path.isfile(path):
+            try:
+                data = sjson.load(path)
+                if data.get('version') == _concretization_cache_version:
+                    spec = spack.spec.Spec.from_dict(data)
+                    for node in spec.traverse():
+                        node.external = data['externals'].get(node.name)
+            except (IOError, ValueError, KeyError) as e:
+                tty.debug("Ignoring unreadable concretization cache %s: %s"
+                          % (path, e))
+
+        if spec is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+        return spec
+
+
+    def put(self, key, spec):
+        """Store the concrete spec under key.  Failures are not fatal;
+           the spec is just not cached."""
+        data = spec.to_dict()
+        data['version'] = _concretization_cache_version
+
+        # Concrete specs don't record external paths, so keep them here.
+        data['externals'] = dict((s.name, s.external)
+                                 for s in spec.traverse() if s.external)
+
+        path = self._path(key)
+        temp_path = '%s.%s.%s.temp' % (path, socket.getfqdn(), os.getpid())
+        try:
+            mkdirp(self.root)
+            with open(temp_path, 'w') as f:
+                sjson.dump(data, f)
+            os.rename(temp_path, path)
+            self._prune()
+        except (IOError, OSError) as e:
+            tty.debug("Could not write concretization cache %s: %s"
+                      % (path, e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+    def _prune(self):
+        """Remove the least recently used entries beyond max_entries."""
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith('.json'):
+                path = join_path(self.root, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass    # Removed by another process.
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+    def clear(self):
+        """Remove all cached concretizations.  Returns how many there
+           were."""
+        if not os.path.isdir(self.root):
+            return 0
+
+        removed = 0
+        for name in os.listdir(self.root):
+            if name.endswith('.json'):
+                os.remove(join_path(self.root, name))
+                removed += 1
+        return removed
+
+
 class UnavailableCompilerVersionError(spack.error.SpackError):
     """Raised when there is no available compiler that satisfies a
        compiler spec."""
@@ -51,9 +51,11 @@ from llnl.util.lock import *
 
 import spack.spec
 from spack.version import Version
-from spack.spec import Spec
+from spack.spec import Spec, SpackYAMLError
 from spack.error import SpackError
 from spack.repository import UnknownPackageError
+from spack.util.crypto import hash_bits
+import spack.util.spack_json as sjson
 
 
 # DB goes in this directory underneath the root
@@ -65,6 +67,24 @@ _db_version = Version('0.9.1')
 # Default timeout for spack database locks is 5 min.
 _db_lock_timeout = 60
 
+# Number of journaled operations after which the journal is compacted
+# into a fresh snapshot of the index.
+_db_journal_max_ops = 1000
+
+
+def _stat_key(path):
+    """Return a key that changes whenever the file at path changes, or
+       None if there is no such file.
+
+    Files are replaced by rename or appended to, so a change always
+    alters the inode, the size, or the modification time.
+    """
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime, st.st_size)
+    except OSError:
+        return None
+
 
 def _autospec(function):
     """Decorator that automatically converts the argument of a single-arg
@@ -111,6 +131,10 @@ class InstallRecord(object):
             'explicit': self.explicit
         }
 
+    def state(self):
+        """Mutable fields of the record, used to detect changes."""
+        return (self.path, self.installed, self.ref_count, self.explicit)
+
     @classmethod
     def from_dict(cls, spec, dictionary):
         d = dictionary
@@ -129,10 +153,22 @@ class Database(object):
         under ``root/.spack-db``, which is created if it does not
         exist.  This is the ``db_dir``.
 
-        The Database will attempt to read an ``index.yaml`` file in
-        ``db_dir``.  If it does not find one, it will be created when
-        needed by scanning the entire Database root for ``spec.yaml``
-        files according to Spack's ``DirectoryLayout``.
+        The Database will attempt to read an ``index.json`` file in
+        ``db_dir``.  If it does not find one, it will fall back to an
+        older ``index.yaml`` file, and failing that it will be created
+        when needed by scanning the entire Database root for
+        ``spec.yaml`` files according to Spack's ``DirectoryLayout``.
+
+        The index is stored as JSON rather than YAML because Python's
+        JSON parser is implemented in C and loads large databases much
+        faster.  YAML remains the format for export and interchange
+        (see ``_write_to_yaml`` and ``_read_from_yaml``).
+
+        Write transactions do not rewrite the index.  Instead, the
+        records they change are appended to ``journal.json``, which is
+        replayed on top of the index when the Database is read.  Once
+        the journal grows past ``_db_journal_max_ops`` operations, it
+        is compacted into a new ``index.json``.
 
         Caller may optionally provide a custom ``db_dir`` parameter
         where data will be stored.  This is intended to be used for
@@ -149,8 +185,11 @@ class Database(object):
             self._db_dir = db_dir
 
         # Set up layout of database files within the db dir
-        self._index_path = join_path(self._db_dir, 'index.yaml')
+        self._index_path = join_path(self._db_dir, 'index.json')
+        self._yaml_index_path = join_path(self._db_dir, 'index.yaml')
+        self._journal_path = join_path(self._db_dir, 'journal.json')
         self._lock_path = join_path(self._db_dir, 'lock')
+        self._prefix_lock_path = join_path(self._db_dir, 'prefix_lock')
 
         # Create needed directories and files
         if not os.path.exists(self._db_dir):
@@ -163,6 +202,36 @@ class Database(object):
         self.lock = Lock(self._lock_path)
         self._data = {}
 
+        # Secondary indexes on _data, used by query() to narrow the
+        # records it checks.  Maintained by _set_data(), _insert() and
+        # _delete().
+        self._by_name = {}
+        self._by_compiler = {}
+        self._by_arch = {}
+
+        # Reverse dependency edges: hash of a record's spec -> hashes of
+        # the records that depend on it directly.
+        self._dependents = {}
+
+        # State of each record as of the last read or write of the
+        # files on disk.  Used to compute what to append to the journal.
+        self._persisted = {}
+        self._journal_ops = 0
+        self._needs_snapshot = False
+
+        # Parsed contents of the index file, and the stat() results
+        # they were read from, so that an unchanged index is not parsed
+        # again.
+        self._index_stat = None
+        self._index_contents = None
+
+        # stat() results for the index and journal when _data was last
+        # known to match them.  If the files are unchanged at the start
+        # of a transaction, _data is reused instead of read again.
+        self._files_stat = None
+        self._read_hits = 0
+        self._read_misses = 0
+
     def write_transaction(self, timeout=_db_lock_timeout):
         """Get a write lock context manager for use in a `with` block."""
         return WriteTransaction(self, self._read, self._write, timeout)
@@ -171,11 +240,20 @@ class Database(object):
         """Get a read lock context manager for use in a `with` block."""
         return ReadTransaction(self, self._read, None, timeout)
 
-    def _write_to_yaml(self, stream):
-        """Write out the databsae to a YAML file.
+    def prefix_lock(self, spec):
+        """Get a lock on the install prefix of a concrete spec.
 
-        This function does not do any locking or transactions.
+        Installs of a spec hold this for writing, so that concurrent
+        Spack processes don't build the same prefix twice.  Each spec
+        has a one-byte range of the ``prefix_lock`` file, at an offset
+        derived from its DAG hash, so prefixes are locked independently.
         """
+        return Lock(self._prefix_lock_path,
+                    start=hash_bits(spec.dag_hash(), max_offset_bits),
+                    length=1)
+
+    def _database_dict(self):
+        """Dictionary representation of the database, for writing."""
         # map from per-spec hash code to installation record.
         installs = dict((k, v.to_dict()) for k, v in self._data.items())
 
@@ -185,49 +263,96 @@ class Database(object):
         # the same spec well.  If there are 2 identical specs with
         # different paths, it can't differentiate.
         # TODO: fix this before we support multiple install locations.
-        database = {
+        return {
             'database': {
                 'installs': installs,
                 'version': str(_db_version)
             }
         }
 
+    def _write_to_yaml(self, stream):
+        """Write out the databsae to a YAML file.
+
+        This function does not do any locking or transactions.
+        """
         try:
-            return yaml.dump(database, stream=stream, default_flow_style=False)
+            return yaml.dump(self._database_dict(), stream=stream,
+                             default_flow_style=False)
         except YAMLError as e:
             raise SpackYAMLError("error writing YAML database:", str(e))
 
-    def _read_spec_from_yaml(self, hash_key, installs, parent_key=None):
-        """Recursively construct a spec from a hash in a YAML database.
+    def _write_to_json(self, stream):
+        """Write out the database to a JSON file.
+
+        Records are converted and written one at a time instead of
+        building the whole database dict first.  The output is the same
+        as dumping _database_dict().
+
+        This function does not do any locking or transactions.
+        """
+        stream.write('{"database":{"installs":{')
+        for i, key in enumerate(sorted(self._data)):
+            if i:
+                stream.write(',')
+            stream.write(sjson.dumps(key))
+            stream.write(':')
+            stream.write(sjson.dumps(self._data[key].to_dict()))
+        stream.write('},"version":%s}}' % sjson.dumps(str(_db_version)))
+
+    def _read_spec_from_yaml(self, hash_key, installs, nodes=None):
+        """Construct a spec from a hash in a YAML database.
+
+        ``nodes`` maps hashes to specs that were already constructed.
+        Each hash is read only once and the resulting spec is shared
+        by all of its dependents, so that reading a database takes
+        time linear in the number of records.
 
         Does not do any locking.
         """
-        spec_dict = installs[hash_key]['spec']
+        if nodes is None:
+            nodes = {}
+        if hash_key in nodes:
+            return nodes[hash_key]
+
+        # Reuse the spec if it was already read in this process.
+        spec = spack.spec.interned_spec(hash_key)
+        if spec is not None:
+            nodes[hash_key] = spec
+            return spec
 
-        # Install records don't include hash with spec, so we add it in here
-        # to ensure it is read properly.
-        for name in spec_dict:
-            spec_dict[name]['hash'] = hash_key
+        spec_dict = installs[hash_key]['spec']
 
-        # Build spec from dict first.
+        # Build spec from dict first.  Install records don't include
+        # the hash with the spec, so we add it in here to ensure it is
+        # read properly.
         spec = Spec.from_node_dict(spec_dict)
+        spec._hash = hash_key
 
         # Add dependencies from other records in the install DB to
-        # form a full spec.
+        # form a full spec.  Children are interned and shared with other
+        # specs, so don't add this spec to their dependents.
         for dep_hash in spec_dict[spec.name]['dependencies'].values():
-            child = self._read_spec_from_yaml(dep_hash, installs, hash_key)
-            spec._add_dependency(child)
+            child = self._read_spec_from_yaml(dep_hash, installs, nodes)
+            spec.dependencies[child.name] = child
 
         # Specs from the database need to be marked concrete because
-        # they represent actual installations.
-        spec._mark_concrete()
+        # they represent actual installations.  Dependencies were
+        # marked when they were read.
+        spec._normal = True
+        spec._concrete = True
+
+        spec = spec._intern()
+        nodes[hash_key] = spec
         return spec
 
-    def _read_from_yaml(self, stream):
+    def _read_from_yaml(self, stream, journal=None):
         """
         Fill database from YAML, do not maintain old data
         Translate the spec portions from node-dict form to spec form
 
+        If ``journal`` is the path of a journal file, its operations
+        are replayed on top of the records read from ``stream``.
+
         Does not do any locking.
         """
         try:
@@ -240,21 +365,56 @@ class Database(object):
         except MarkedYAMLError as e:
             raise SpackYAMLError("error parsing YAML database:", str(e))
 
-        if yfile is None:
+        self._read_from_dict(yfile, journal)
+
+    def _read_from_json(self, stream, journal=None):
+        """
+        Fill database from JSON, do not maintain old data.
+
+        If ``stream`` is a path and the file has not changed since it
+        was last read, the previously parsed contents are reused.
+
+        Does not do any locking.
+        """
+        try:
+            if isinstance(stream, basestring):
+                stat_key = _stat_key(stream)
+                if stat_key != self._index_stat:
+                    self._index_contents = sjson.load(stream)
+                    self._index_stat = stat_key
+                jfile = self._index_contents
+            else:
+                jfile = sjson.load(stream)
+
+        except ValueError as e:
+            raise CorruptDatabaseError(
+                self._index_path, "error parsing JSON database: %s" % e)
+
+        self._read_from_dict(jfile, journal)
+
+    def _read_from_dict(self, dbfile, journal=None):
+        """Fill database from a dictionary read from an index file.
+
+        ``dbfile`` is not modified, so it can be reused.
+
+        Does not do any locking.
+        """
+        if dbfile is None:
             return
 
         def check(cond, msg):
             if not cond:
                 raise CorruptDatabaseError(self._index_path, msg)
 
-        check('database' in yfile, "No 'database' attribute in YAML.")
+        check('database' in dbfile, "No 'database' attribute in index.")
 
         # High-level file checks
-        db = yfile['database']
-        check('installs' in db, "No 'installs' in YAML DB.")
-        check('version' in db, "No 'version' in YAML DB.")
+        db = dbfile['database']
+        check('installs' in db, "No 'installs' in DB index.")
+        check('version' in db, "No 'version' in DB index.")
 
-        installs = db['installs']
+        # Shallow copy so that replaying the journal leaves db alone.
+        installs = dict(db['installs'])
 
         # TODO: better version checking semantics.
         version = Version(db['version'])
@@ -263,13 +423,17 @@ class Database(object):
         elif version < _db_version:
             self.reindex(spack.install_layout)
             installs = dict((k, v.to_dict()) for k, v in self._data.items())
+        elif journal:
+            self._replay_journal(journal, installs)
 
         # Iterate through database and check each record.
         data = {}
+        nodes = {}
         for hash_key, rec in installs.items():
             try:
-                # This constructs a spec DAG from the list of all installs
-                spec = self._read_spec_from_yaml(hash_key, installs)
+                # This constructs a spec DAG from the list of all
+                # installs, sharing nodes with the DAGs built so far.
+                spec = self._read_spec_from_yaml(hash_key, installs, nodes)
 
                 # Validate the spec by ensuring the stored and actual
                 # hashes are the same.
@@ -280,10 +444,9 @@ class Database(object):
                         (hash_key, spec_hash))
                     continue  # TODO: is skipping the right thing to do?
 
-                # Insert the brand new spec in the database.  Each
-                # spec has its own copies of its dependency specs.
-                # TODO: would a more immmutable spec implementation simplify
-                #       this?
+                # Insert the brand new spec in the database.  Specs
+                # read from the database share their dependency nodes,
+                # so they must not be modified.
                 data[hash_key] = InstallRecord.from_dict(spec, rec)
 
             except Exception as e:
@@ -292,7 +455,68 @@ class Database(object):
                          "hash:  %s" % hash_key, "cause: %s" % str(e))
                 raise
 
-        self._data = data
+        self._set_data(data)
+        self._persisted = dict((k, v.state()) for k, v in data.items())
+
+    def _replay_journal(self, path, installs):
+        """Apply the operations in the journal at ``path`` to ``installs``.
+
+        ``installs`` is the raw dictionary of records read from the
+        index.  Operations store absolute values, so replaying a
+        journal that was already compacted into the index is harmless.
+
+        Does not do any locking.
+        """
+        self._journal_ops = 0
+        if not os.path.isfile(path):
+            return
+
+        try:
+            with open(path, 'r') as f:
+                transactions = [sjson.loads(line) for line in f]
+        except ValueError as e:
+            raise CorruptDatabaseError(
+                path, "error parsing database journal: %s" % e)
+
+        for ops in transactions:
+            for op in ops:
+                self._journal_ops += 1
+                key = op['hash']
+                if op['op'] == 'add':
+                    installs[key] = op['record']
+                elif op['op'] == 'update':
+                    if key not in installs:
+                        raise CorruptDatabaseError(
+                            path, "Update of unknown record %s." % key)
+                    installs[key] = dict(installs[key], **op['fields'])
+                elif op['op'] == 'remove':
+                    installs.pop(key, None)
+                else:
+                    raise CorruptDatabaseError(
+                        path, "Unknown journal operation: %s" % op['op'])
+
+    def _journal_changes(self):
+        """List the operations that bring the files on disk up to date
+           with the in-memory database.
+
+        Does not do any locking.
+        """
+        ops = []
+        for key, rec in self._data.items():
+            old_state = self._persisted.get(key)
+            if old_state is None:
+                ops.append({'op': 'add', 'hash': key,
+                            'record': rec.to_dict()})
+            elif old_state != rec.state():
+                fields = rec.to_dict()
+                del fields['spec']
+                ops.append({'op': 'update', 'hash': key, 'fields': fields})
+
+        for key in self._persisted:
+            if key not in self._data:
+                ops.append({'op': 'remove', 'hash': key})
+
+        return ops
 
     def reindex(self, directory_layout):
         """Build database index from scratch based from a directory layout.
@@ -303,7 +527,7 @@ class Database(object):
         with self.write_transaction():
             old_data = self._data
             try:
-                self._data = {}
+                self._set_data({})
 
                 # Ask the directory layout to traverse the filesystem.
                 for spec in directory_layout.all_specs():
@@ -313,11 +537,105 @@ class Database(object):
 
                 self._check_ref_counts()
 
+                # A reindex rewrites everything; don't journal it.
+                self._needs_snapshot = True
+
             except:
                 # If anything explodes, restore old data, skip write.
-                self._data = old_data
+                self._set_data(old_data)
                 raise
 
+    def _set_data(self, data):
+        """Replace all records in the database and rebuild its indexes."""
+        self._data = {}
+        self._by_name = {}
+        self._by_compiler = {}
+        self._by_arch = {}
+        self._dependents = {}
+        for key, rec in data.items():
+            self._insert(key, rec)
+
+    def _index_keys(self, rec):
+        """Yield the (index, key) pairs under which rec is indexed."""
+        spec = rec.spec
+        yield self._by_name, spec.name
+
+        # Compilers are indexed by name and version, as a string, and
+        # records without a compiler or architecture under None.
+        compiler = str(spec.compiler) if spec.compiler else None
+        yield self._by_compiler, compiler
+        yield self._by_arch, spec.architecture
+
+    def _insert(self, key, rec):
+        """Add a record to _data and to the indexes."""
+        self._data[key] = rec
+        for index, index_key in self._index_keys(rec):
+            index.setdefault(index_key, set()).add(key)
+        for dep in rec.spec.dependencies.values():
+            self._dependents.setdefault(dep.dag_hash(), set()).add(key)
+
+    def _delete(self, key):
+        """Remove a record from _data and from the indexes."""
+        rec = self._data.pop(key)
+        for index, index_key in self._index_keys(rec):
+            keys = index[index_key]
+            keys.discard(key)
+            if not keys:
+                del index[index_key]
+        for dep in rec.spec.dependencies.values():
+            dep_key = dep.dag_hash()
+            parents = self._dependents[dep_key]
+            parents.discard(key)
+            if not parents:
+                del self._dependents[dep_key]
+
+    def _candidate_keys(self, query_spec):
+        """Keys of the records that could satisfy query_spec.
+
+        Uses the secondary indexes to narrow the set of records that
+        query() has to check with ``satisfies()``.  The result may
+        include records that do not satisfy query_spec, but it never
+        leaves out records that do.
+        """
+        if query_spec is any:
+            return self._data.keys()
+
+        candidates = []
+        if query_spec.name:
+            names = [query_spec.name]
+            if query_spec.virtual:
+                # Records for packages that no longer exist look
+                # virtual, so keep the query name as well.
+                try:
+                    providers = spack.repo.providers_for(
+                        Spec(query_spec.name))
+                    names.extend(p.name for p in providers)
+                except UnknownPackageError:
+                    pass
+            candidates.append(set().union(
+                *(self._by_name.get(n, ()) for n in names)))
+
+        if query_spec.compiler:
+            keys = set(self._by_compiler.get(None, ()))
+            for compiler_key, compiler_keys in self._by_compiler.items():
+                if compiler_key is None:
+                    continue
+                compiler = spack.spec.CompilerSpec(compiler_key)
+                if compiler.satisfies(query_spec.compiler):
+                    keys.update(compiler_keys)
+            candidates.append(keys)
+
+        if query_spec.architecture:
+            candidates.append(
+                self._by_arch.get(query_spec.architecture, set()) |
+                self._by_arch.get(None, set()))
+
+        if not candidates:
+            return self._data.keys()
+
+        candidates.sort(key=len)
+        return set.intersection(*candidates)
+
     def _check_ref_counts(self):
         """Ensure consistency of reference counts in the DB.
 
@@ -343,7 +661,38 @@ class Database(object):
                     (key, found, expected, self._index_path))
 
     def _write(self):
-        """Write the in-memory database index to its file path.
+        """Write changes to the in-memory database to disk.
+
+        Changes are appended to the journal.  If there is no index yet,
+        if the database was reindexed, or if the journal has grown too
+        large, a new snapshot of the index is written instead.
+
+        Does no locking.
+
+        """
+        if (self._needs_snapshot or
+                not os.path.isfile(self._index_path) or
+                self._journal_ops >= _db_journal_max_ops):
+            self._write_snapshot()
+            return
+
+        ops = self._journal_changes()
+        if not ops:
+            return
+
+        # Each transaction is one line, appended in a single write.
+        with open(self._journal_path, 'a') as f:
+            f.write(sjson.dumps(ops) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._journal_ops += len(ops)
+        self._persisted = dict((k, v.state()) for k, v in self._data.items())
+        self._files_stat = self._stat_files()
+
+    def _write_snapshot(self):
+        """Write the entire in-memory database to the index and
+           truncate the journal.
 
         Does no locking.
 
@@ -354,7 +703,7 @@ class Database(object):
         # Write a temporary database file them move it into place
         try:
             with open(temp_file, 'w') as f:
-                self._write_to_yaml(f)
+                self._write_to_json(f)
             os.rename(temp_file, self._index_path)
         except:
             # Clean up temp file if something goes wrong.
@@ -362,14 +711,53 @@ class Database(object):
                 os.remove(temp_file)
             raise
 
+        # The journal is now part of the index, and an index.yaml from
+        # an older Spack is out of date.
+        for path in (self._journal_path, self._yaml_index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+        self._journal_ops = 0
+        self._needs_snapshot = False
+        self._persisted = dict((k, v.state()) for k, v in self._data.items())
+        self._files_stat = self._stat_files()
+
+    def _stat_files(self):
+        """Identify the current state of the index and journal files."""
+        return (_stat_key(self._index_path), _stat_key(self._journal_path))
+
     def _read(self):
         """Re-read Database from the data in the set location.
 
+        If neither the index nor the journal changed since they were
+        last read or written by this process, the in-memory data is
+        already up to date and nothing is read.
+
         This does no locking.
         """
+        files_stat = self._stat_files()
+        if files_stat[0] is not None and files_stat == self._files_stat:
+            self._read_hits += 1
+            tty.debug("Database unchanged, reusing in-memory index "
+                      "(%d hits, %d misses)" %
+                      (self._read_hits, self._read_misses))
+            return
+
+        self._read_misses += 1
+        tty.debug("Reading database index "
+                  "(%d hits, %d misses)" %
+                  (self._read_hits, self._read_misses))
+
         if os.path.isfile(self._index_path):
-            # Read from YAML file if a database exists
-            self._read_from_yaml(self._index_path)
+            # Read from JSON file if a database exists
+            self._read_from_json(self._index_path, self._journal_path)
+            self._files_stat = files_stat
+
+        elif os.path.isfile(self._yaml_index_path):
+            # Read an index written by an older Spack, and convert it
+            # to JSON on the next write.
+            self._read_from_yaml(self._yaml_index_path, self._journal_path)
+            self._needs_snapshot = True
 
         else:
             # The file doesn't exist, try to traverse the directory.
@@ -398,8 +786,8 @@ class Database(object):
             rec.path = path
 
         else:
-            self._data[key] = InstallRecord(spec, path, True,
-                                            explicit=explicit)
+            self._insert(key, InstallRecord(spec, path, True,
+                                            explicit=explicit))
             for dep in spec.dependencies.values():
                 self._increment_ref_count(dep, directory_layout)
 
@@ -413,7 +801,7 @@ class Database(object):
                 path = directory_layout.path_for_spec(spec)
                 installed = os.path.isdir(path)
 
-            self._data[key] = InstallRecord(spec.copy(), path, installed)
+            self._insert(key, InstallRecord(spec.copy(), path, installed))
 
             for dep in spec.dependencies.values():
                 self._increment_ref_count(dep)
@@ -459,7 +847,7 @@ class Database(object):
         rec.ref_count -= 1
 
         if rec.ref_count == 0 and not rec.installed:
-            del self._data[key]
+            self._delete(key)
             for dep in spec.dependencies.values():
                 self._decrement_ref_count(dep)
 
@@ -473,7 +861,7 @@ class Database(object):
             rec.installed = False
             return rec.spec
 
-        del self._data[key]
+        self._delete(key)
         for dep in rec.spec.dependencies.values():
             self._decrement_ref_count(dep)
 
@@ -497,20 +885,53 @@ class Database(object):
         with self.write_transaction():
             return self._remove(spec)
 
+    @_autospec
+    def dependents(self, spec, transitive=False, installed=True):
+        """Return the specs of records in the database that depend on spec.
+
+        ``transitive``
+            If True, return all specs that depend on spec directly or
+            indirectly.  Otherwise, return only direct dependents.
+
+        ``installed``
+            Possible values: True, False, any.  Same as for ``query()``.
+            Dependents are found through records that are not
+            installed even when only installed ones are returned.
+
+        Takes time proportional to the number of dependents found.
+        """
+        with self.read_transaction():
+            found = set()
+            stack = [spec.dag_hash()]
+            while stack:
+                for parent in self._dependents.get(stack.pop(), ()):
+                    if parent not in found:
+                        found.add(parent)
+                        if transitive:
+                            stack.append(parent)
+
+            return sorted(
+                self._data[key].spec for key in found
+                if installed is any or self._data[key].installed == installed)
+
     @_autospec
     def installed_extensions_for(self, extendee_spec):
         """
         Return the specs of all packages that extend
         the given spec
         """
-        for s in self.query():
-            try:
-                if s.package.extends(extendee_spec):
-                    yield s.package
-            except UnknownPackageError:
-                continue
-            # skips unknown packages
-            # TODO: conditional way to do this instead of catching exceptions
+        # Only look at installed packages that can extend the spec.
+        names = spack.repo.extension_index.get(extendee_spec.name, [])
+        for name in names:
+            for s in self.query(name):
+                try:
+                    if s.package.extends(extendee_spec):
+                        yield s.package
+                except UnknownPackageError:
+                    continue
+                # skips unknown packages
+                # TODO: conditional way to do this instead of catching
+                # exceptions
 
     def query(self, query_spec=any, known=any, installed=True, explicit=any):
         """Run a query on the database.
@@ -547,16 +968,26 @@ class Database(object):
               these really special cases that only belong here?
 
         """
+        if query_spec is not any and not isinstance(query_spec, Spec):
+            query_spec = Spec(query_spec)
+
         with self.read_transaction():
+            # Whether each package name is known, looked up only once.
+            known_names = {}
+
             results = []
-            for key, rec in self._data.items():
+            for key in self._candidate_keys(query_spec):
+                rec = self._data[key]
                 if installed is not any and rec.installed != installed:
                     continue
                 if explicit is not any and rec.explicit != explicit:
                     continue
-                if known is not any and spack.repo.exists(
-                        rec.spec.name) != known:
-                    continue
+                if known is not any:
+                    name = rec.spec.name
+                    if name not in known_names:
+                        known_names[name] = spack.repo.exists(name)
+                    if known_names[name] != known:
+                        continue
                 if query_spec is any or rec.spec.satisfies(query_spec):
                     results.append(rec.spec)
 
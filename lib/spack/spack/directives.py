@@ -229,8 +229,8 @@ def provides(pkg, *specs, **kwargs):
     spec_string = kwargs.get('when', pkg.name)
     provider_spec = parse_anonymous_spec(spec_string, pkg.name)
 
-    for string in specs:
-        for provided_spec in spack.spec.parse(string):
+    for provided_specs in spack.spec.parse_many(specs):
+        for provided_spec in provided_specs:
             if pkg.name == provided_spec.name:
                 raise CircularReferenceError('depends_on', pkg.name)
             pkg.provided[provided_spec] = provider_spec
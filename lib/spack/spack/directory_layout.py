@@ -185,6 +185,7 @@ class YamlDirectoryLayout(DirectoryLayout):
         self.extension_file_name = 'extensions.yaml'
         self.build_log_name      = 'build.out'  # build log.
         self.build_env_name      = 'build.env'  # build environment
+        self.build_stats_name    = 'build_stats.yaml'  # build resource usage
         self.packages_dir        = 'repos'      # archive of package.py files
 
         # Cache of already written/read extension maps.
@@ -222,14 +223,15 @@ class YamlDirectoryLayout(DirectoryLayout):
             spec.to_yaml(f)
 
 
-    def read_spec(self, path):
-        """Read the contents of a file and parse them as a spec"""
-        with open(path) as f:
-            spec = Spec.from_yaml(f)
+    def read_spec(self, path, verify=False):
+        """Read the contents of a file and parse them as a spec.
 
-        # Specs read from actual installations are always concrete
-        spec._mark_concrete()
-        return spec
+           Specs read from actual installations are always concrete,
+           so they share nodes with other specs read from files, and
+           their stored hashes are trusted unless verify is True.
+        """
+        with open(path) as f:
+            return Spec.from_yaml(f, concrete=True, verify=verify)
 
 
     def spec_file_path(self, spec):
@@ -252,6 +254,11 @@ class YamlDirectoryLayout(DirectoryLayout):
                          self.build_env_name)
 
 
+    def build_stats_path(self, spec):
+        return join_path(self.path_for_spec(spec), self.metadata_dir,
+                         self.build_stats_name)
+
+
     def build_packages_path(self, spec):
         return join_path(self.path_for_spec(spec), self.metadata_dir,
                          self.packages_dir)
@@ -282,15 +289,14 @@ class YamlDirectoryLayout(DirectoryLayout):
                 "  " + path)
 
         installed_spec = self.read_spec(spec_file_path)
-        if installed_spec == spec:
-            return path
-
-        if spec.dag_hash() == installed_spec.dag_hash():
-            raise SpecHashCollisionError(installed_hash, spec_hash)
-        else:
+        if spec.dag_hash() != installed_spec.dag_hash():
             raise InconsistentInstallDirectoryError(
                 'Spec file in %s does not match hash!' % spec_file_path)
 
+        if installed_spec is not spec and installed_spec != spec:
+            raise SpecHashCollisionError(installed_spec, spec)
+        return path
+
 
     def all_specs(self):
         if not os.path.isdir(self.root):
@@ -432,7 +438,7 @@ class SpecHashCollisionError(DirectoryLayoutError):
     def __init__(self, installed_spec, new_spec):
         super(SpecHashCollisionError, self).__init__(
             'Specs %s and %s have the same SHA-1 prefix!'
-            % installed_spec, new_spec)
+            % (installed_spec, new_spec))
 
 
 class RemoveFailedError(DirectoryLayoutError):
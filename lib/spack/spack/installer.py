@@ -0,0 +1,350 @@
+##############################################################################
+# Copyright (c) 2013-2016, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/llnl/spack
+# Please also see the LICENSE file for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""
+Install the DAGs of several concrete specs with concurrent builds.
+
+``Package.do_install()`` installs dependencies depth-first, one build
+at a time.  ``install_specs()`` orders all the packages to install
+with ``spack.graph.topological_sort()`` instead, and builds every
+package whose dependencies are installed as soon as a slot is free.
+
+Each build runs in its own forked worker process.  The parent process
+waits for workers and records each finished install in the database,
+so the database has a single writer.  If a build fails, only the
+packages that depend on it are skipped; independent builds go on.
+
+Other Spack processes may be installing into the same tree.  Packages
+whose prefixes they have locked are scheduled like any other; their
+workers wait for the lock and then reuse the finished install.
+
+Sources are fetched ahead of the builds.  Up to fetch_jobs fetch
+workers download and checksum the archives (and resources) of the
+packages to build, in build order, while other packages build.  A
+package's build starts only after its prefetch has finished.  Fetch
+strategies change the working directory, so these are processes, not
+threads.  Prefetch failures are not reported; the build fetches again
+and reports the error itself.  A fetch worker sends the resource usage
+of its fetch back through a pipe, and the build adds it to its own
+build stats.  The worker also says whether it checked the archive
+against its checksum, and if so the build doesn't check it again.
+"""
+import os
+import sys
+import time
+import multiprocessing
+
+import llnl.util.tty as tty
+
+from llnl.util.lock import LockError
+
+import spack
+import spack.error
+import spack.util.spack_json as sjson
+from spack.build_stats import BuildStats
+from spack.graph import topological_sort
+from spack.package import InstallError
+
+# Seconds between checks for finished workers.
+_poll_interval = 0.01
+
+
+def install_specs(specs, jobs_packages, make_jobs=None, fetch_jobs=4,
+                  **kwargs):
+    """Install concrete specs and their dependencies, building up to
+       jobs_packages packages at a time.
+
+       Arguments:
+       specs         -- concrete specs to install.  These are recorded
+                        as explicitly installed.
+       jobs_packages -- maximum number of concurrent builds.
+       make_jobs     -- total number of make jobs shared by concurrent
+                        builds.  Defaults to the number of CPUs.  Each
+                        build gets an equal share of at least one job,
+                        and builds wait until a share is free.
+       fetch_jobs    -- maximum number of concurrent prefetches.  Zero
+                        leaves fetching to the builds.
+
+       Other keyword arguments (keep_prefix, keep_stage, skip_patch,
+       verbose, fake) are passed to Package.do_install_self().
+
+       Raises InstallError after all other builds finish if any
+       package failed.
+    """
+    if jobs_packages < 1:
+        raise ValueError("jobs_packages must be at least 1")
+    budget = make_jobs or multiprocessing.cpu_count()
+    build_jobs = max(1, budget // jobs_packages)
+
+    explicit = set(s.dag_hash() for s in specs)
+
+    # Packages to build, keyed by DAG hash, in topological order.
+    nodes = {}
+    order = []
+    for spec in specs:
+        for name in topological_sort(spec, reverse=True):
+            node = spec[name]
+            key = node.dag_hash()
+            if key not in nodes:
+                nodes[key] = node
+                order.append(key)
+
+    # Already-installed and external packages need no build.  Let
+    # do_install() report them and mark explicit ones.
+    pending = []
+    for key in order:
+        node = nodes[key]
+        if node.external or _installed(node):
+            node.package.do_install(ignore_deps=True,
+                                    explicit=key in explicit)
+        else:
+            pending.append(key)
+
+    # Dependencies each pending package is still waiting for, and the
+    # reverse map, for packages being built.
+    waiting = {}
+    dependents = dict((key, []) for key in pending)
+    for key in pending:
+        waiting[key] = set()
+        for dep in nodes[key].dependencies.values():
+            dep_key = dep.dag_hash()
+            if dep_key in dependents:
+                waiting[key].add(dep_key)
+                dependents[dep_key].append(key)
+
+    # Packages whose sources are fetched ahead of their builds.
+    to_fetch = []
+    if not kwargs.get('fake'):
+        to_fetch = [k for k in pending if _can_prefetch(nodes[k])]
+    if fetch_jobs and to_fetch:
+        tty.msg("Fetching sources for %d packages" % len(to_fetch))
+    else:
+        to_fetch = []
+
+    fetching = {}   # pid -> (key, fd of the worker's result pipe)
+    fetched = {}    # key -> (BuildStats, checked) of a finished prefetch
+    running = {}    # pid -> (key, make jobs given to the build)
+    free_jobs = budget
+    failed = []
+    skipped = []
+
+    while pending or running or fetching:
+        while to_fetch and len(fetching) < fetch_jobs:
+            key = to_fetch.pop(0)
+            pid, result_fd = _start_fetch(nodes[key])
+            fetching[pid] = (key, result_fd)
+
+        unfetched = set(to_fetch) | set(k for k, _ in fetching.values())
+        ready = [k for k in pending
+                 if not waiting[k] and k not in unfetched]
+        for key in ready[:jobs_packages - len(running)]:
+            # Never run more make jobs in total than the budget.
+            jobs = min(build_jobs, free_jobs)
+            if jobs < 1:
+                break
+            free_jobs -= jobs
+            pending.remove(key)
+            fetch_stats, fetch_checked = fetched.pop(key, (None, False))
+            pid = _start_build(nodes[key], jobs, kwargs,
+                               fetch_stats, fetch_checked)
+            running[pid] = (key, jobs)
+
+        pid, status = _wait_for_any(list(fetching) + list(running))
+        if pid in fetching:
+            key, result_fd = fetching.pop(pid)
+            result = _read_fetch_result(result_fd)
+            if status == 0 and result:
+                fetched[key] = result
+            continue
+
+        key, jobs = running.pop(pid)
+        free_jobs += jobs
+        node = nodes[key]
+        if status == 0:
+            spack.installed_db.add(node, node.prefix,
+                                   explicit=key in explicit)
+            for dependent in dependents[key]:
+                waiting[dependent].discard(key)
+        else:
+            tty.error("Installation of %s failed." % node.name)
+            failed.append(node)
+            for dependent in _all_dependents(key, dependents):
+                if dependent in pending:
+                    pending.remove(dependent)
+                    if dependent in to_fetch:
+                        to_fetch.remove(dependent)
+                    skipped.append(nodes[dependent])
+                    tty.warn("Skipping %s: it depends on %s."
+                             % (nodes[dependent].name, node.name))
+
+    if failed:
+        raise InstallError(
+            "Failed to install %s." % ', '.join(s.name for s in failed),
+            "Skipped dependents: %s." % (
+                ', '.join(s.name for s in skipped) or 'none'))
+
+
+def _start_build(node, make_jobs, kwargs, fetch_stats=None,
+                 fetch_checked=False):
+    """Fork a worker that builds and installs node; return its pid.
+       fetch_stats is the BuildStats of node's prefetch, if any, and
+       fetch_checked whether the prefetch checked the archive."""
+    pkg = node.package
+    tty.msg("Installing %s with %d make jobs" % (pkg.name, make_jobs))
+
+    # Don't let the worker repeat output buffered by the parent.
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    try:
+        pid = os.fork()
+    except OSError as e:
+        raise InstallError("Unable to fork build process: %s" % e)
+
+    if pid == 0:
+        try:
+            pkg.do_install_self(make_jobs=make_jobs,
+                                fetch_stats=fetch_stats,
+                                fetch_checked=fetch_checked, **kwargs)
+            os._exit(0)
+        except spack.error.SpackError as e:
+            e.die()
+        except BaseException:
+            # The worker must not return to the scheduler, even on
+            # KeyboardInterrupt, so report any error and exit.
+            sys.excepthook(*sys.exc_info())
+            os._exit(1)
+    return pid
+
+
+def _wait_for_any(pids):
+    """Wait for one of the worker processes in pids to exit.  Returns
+       its pid and exit status, like os.waitpid().
+
+       Doesn't use os.waitpid(-1), which would also reap children that
+       the caller started for other reasons.
+    """
+    while True:
+        for pid in pids:
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                return done, status
+        time.sleep(_poll_interval)
+
+
+def _all_dependents(key, dependents):
+    """Keys of all packages that depend on key, directly or not."""
+    result = set()
+    stack = list(dependents[key])
+    while stack:
+        dependent = stack.pop()
+        if dependent not in result:
+            result.add(dependent)
+            stack.extend(dependents[dependent])
+    return result
+
+
+def _installed(node):
+    """Whether node is installed and no other process is installing it."""
+    prefix_lock = spack.installed_db.prefix_lock(node)
+    try:
+        prefix_lock.acquire_read(timeout=0)
+    except LockError:
+        return False
+    try:
+        return bool(spack.install_layout.check_installed(node))
+    finally:
+        prefix_lock.release_read()
+
+
+def _can_prefetch(node):
+    """Whether node's sources can be fetched without asking the user.
+
+       Packages without a checksum for their version make do_fetch()
+       prompt, so they are left for the build to fetch.
+    """
+    pkg = node.package
+    return not spack.do_checksum or pkg.version in pkg.versions
+
+
+def _start_fetch(node):
+    """Fork a worker that fetches and checks node's sources.  Returns
+       its pid and the read end of a pipe on which the worker writes
+       the BuildStats of the fetch and whether it checked the archive.
+    """
+    pkg = node.package
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    read_fd, write_fd = os.pipe()
+    try:
+        pid = os.fork()
+    except OSError as e:
+        os.close(read_fd)
+        os.close(write_fd)
+        raise InstallError("Unable to fork fetch process: %s" % e)
+
+    if pid == 0:
+        os.close(read_fd)
+        # Keep concurrent downloads from writing over build output.
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        status = 1
+        try:
+            # Leave stages that another process is using to the build.
+            pkg.stage.lock.acquire_write(timeout=0)
+            with pkg.build_stats.phase('total'):
+                pkg.do_fetch()
+            # The result is far smaller than a pipe's buffer, so this
+            # doesn't block before the parent reads it.
+            os.write(write_fd, sjson.dumps({
+                'build_stats': pkg.build_stats.stats,
+                'checked': pkg.archive_checked}))
+            status = 0
+        except Exception:
+            pass
+        finally:
+            # Never return to the scheduler, even on KeyboardInterrupt.
+            os._exit(status)
+
+    os.close(write_fd)
+    return pid, read_fd
+
+
+def _read_fetch_result(fd):
+    """Read what a finished fetch worker wrote to fd, and close it.
+       Returns the BuildStats of the fetch and whether the worker
+       checked the archive, or None if the worker wrote nothing."""
+    chunks = []
+    while True:
+        chunk = os.read(fd, 4096)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(fd)
+    if not chunks:
+        return None
+    result = sjson.loads(''.join(chunks))
+    return BuildStats(result['build_stats']), result['checked']
@@ -37,6 +37,7 @@ from llnl.util.filesystem import *
 
 import spack
 import spack.error
+import spack.concretize
 import spack.url as url
 import spack.fetch_strategy as fs
 from spack.spec import Spec
@@ -151,8 +152,7 @@ def create(path, specs, **kwargs):
     # Get concrete specs for each matching version of these specs.
     version_specs = get_matching_versions(
         specs, num_versions=kwargs.get('num_versions', 0))
-    for s in version_specs:
-        s.concretize()
+    spack.concretize.concretize_together(version_specs)
 
     # Get the absolute path of the root before we start jumping around.
     mirror_root = os.path.abspath(path)
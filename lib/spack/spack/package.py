@@ -35,12 +35,13 @@ README.
 """
 import os
 import re
-import textwrap
 import time
 
 import llnl.util.tty as tty
 import spack
+import spack.build_cache
 import spack.build_environment
+import spack.build_stats
 import spack.compilers
 import spack.directives
 import spack.error
@@ -49,11 +50,12 @@ import spack.hooks
 import spack.mirror
 import spack.repository
 import spack.url
+import spack.util.string
 import spack.util.web
-from StringIO import StringIO
 from llnl.util.filesystem import *
 from llnl.util.lang import *
 from llnl.util.link_tree import LinkTree
+from llnl.util.lock import LockError
 from llnl.util.tty.log import log_output
 from spack.stage import DIYStage, Stage, ResourceStage, StageComposite
 from spack.util.compression import allowed_archive
@@ -393,6 +395,10 @@ class Package(object):
         # Set up some internal variables for timing.
         self._fetch_time = 0.0
         self._total_time = 0.0
+        self._build_stats = spack.build_stats.BuildStats()
+
+        # Whether the archive in the stage has passed its checksum.
+        self._archive_checked = False
 
         if self.is_extension:
             spack.repo.get(self.extendee_spec)._check_extendable()
@@ -564,6 +570,18 @@ class Package(object):
     def fetcher(self, f):
         self._fetcher = f
 
+    @property
+    def build_stats(self):
+        """Resource usage of the phases of this package's last build,
+           or of fetches made outside a build (see spack.build_stats)."""
+        return self._build_stats
+
+    @property
+    def archive_checked(self):
+        """Whether do_fetch() checked the archive in the stage against
+           its checksum."""
+        return self._archive_checked
+
     @property
     def extendee_spec(self):
         """
@@ -676,18 +694,8 @@ class Package(object):
     @property
     def installed_dependents(self):
         """Return a list of the specs of all installed packages that depend
-           on this one.
-
-        TODO: move this method to database.py?
-        """
-        dependents = []
-        for spec in spack.installed_db.query():
-            if self.name == spec.name:
-                continue
-            for dep in spec.traverse():
-                if self.spec == dep:
-                    dependents.append(spec)
-        return dependents
+           on this one."""
+        return spack.installed_db.dependents(self.spec, transitive=True)
 
     @property
     def prefix(self):
@@ -746,12 +754,24 @@ class Package(object):
                 raise FetchError("Will not fetch %s" %
                                  self.spec.format('$_$@'), checksum_msg)
 
-        self.stage.fetch(mirror_only)
-
-        self._fetch_time = time.time() - start_time
-
-        if spack.do_checksum and self.version in self.versions:
-            self.stage.check()
+        _wait_for_lock(self.stage.lock.acquire_write,
+                       "Waiting for another process to fetch %s" % self.name)
+        try:
+            # An archive that was checked is not checked again, unless
+            # it is missing and has to be downloaded again.
+            checked = self._archive_checked and self.stage.archive_file
+            with self._build_stats.phase('fetch'):
+                self.stage.fetch(mirror_only)
+
+            self._fetch_time = time.time() - start_time
+
+            if (spack.do_checksum and self.version in self.versions and
+                    not checked):
+                with self._build_stats.phase('checksum'):
+                    self.stage.check()
+                self._archive_checked = True
+        finally:
+            self.stage.lock.release_write()
 
     def do_stage(self, mirror_only=False):
         """Unpacks the fetched tarball, then changes into the expanded tarball
@@ -760,7 +780,8 @@ class Package(object):
             raise ValueError("Can only stage concrete packages.")
 
         self.do_fetch(mirror_only)
-        self.stage.expand_archive()
+        with self._build_stats.phase('expand'):
+            self.stage.expand_archive()
         self.stage.chdir_to_source()
 
     def do_patch(self):
@@ -772,6 +793,12 @@ class Package(object):
         # Kick off the stage first.
         self.do_stage()
 
+        with self._build_stats.phase('patch'):
+            self._apply_patches()
+
+    def _apply_patches(self):
+        """Apply this package's patches in its stage, unless they were
+           applied already."""
         # Package can add its own patch function.
         has_patch_fun = hasattr(self, 'patch') and callable(self.patch)
 
@@ -951,13 +978,29 @@ class Package(object):
                     (self.name, self.spec.external))
             return
 
-        # Ensure package is not already installed
-        if spack.install_layout.check_installed(self.spec):
+        # Ensure package is not already installed.  A prefix that
+        # another process is installing isn't installed until it's done.
+        prefix_lock = spack.installed_db.prefix_lock(self.spec)
+        _wait_for_lock(prefix_lock.acquire_read,
+                       "Waiting for another process to install %s" % self.name)
+        try:
+            installed = spack.install_layout.check_installed(self.spec)
+        finally:
+            prefix_lock.release_read()
+
+        if installed:
             tty.msg("%s is already installed in %s" % (self.name, self.prefix))
-            rec = spack.installed_db.get_record(self.spec)
-            if (not rec.explicit) and explicit:
-                with spack.installed_db.write_transaction():
+            with spack.installed_db.write_transaction():
+                try:
                     rec = spack.installed_db.get_record(self.spec)
+                except KeyError:
+                    # Another Spack process installed it and has not
+                    # recorded it yet.
+                    rec = None
+                if rec is None or not rec.installed:
+                    spack.installed_db.add(
+                        self.spec, self.prefix, explicit=explicit)
+                elif (not rec.explicit) and explicit:
                     rec.explicit = True
             return
 
@@ -973,14 +1016,100 @@ class Package(object):
                                          verbose=verbose,
                                          make_jobs=make_jobs)
 
+        # Then install the package itself.
+        self.do_install_self(keep_prefix=keep_prefix,
+                             keep_stage=keep_stage,
+                             skip_patch=skip_patch,
+                             verbose=verbose,
+                             make_jobs=make_jobs,
+                             fake=fake)
+
+        # note: PARENT of the build process adds the new package to
+        # the database, so that we don't need to re-read from file.
+        spack.installed_db.add(self.spec, self.prefix, explicit=explicit)
+
+    def do_install_self(self,
+                        keep_prefix=False,
+                        keep_stage=False,
+                        skip_patch=False,
+                        verbose=False,
+                        make_jobs=None,
+                        fake=False,
+                        fetch_stats=None,
+                        fetch_checked=False):
+        """Build and install this package, assuming its dependencies
+        are installed.  Arguments are as for do_install(), plus:
+
+        fetch_stats   -- BuildStats of a process that fetched the
+                         sources ahead of the build.  They are added to
+                         the build's.
+        fetch_checked -- whether that process checked the archive
+                         against its checksum, so the build need not.
+
+        This does not add the package to the database; callers must do
+        that once it returns.
+
+        The install holds a lock on the prefix, so other Spack processes
+        installing the same spec wait for it to finish and then use its
+        result.
+
+        If spack.build_cache_path is set, the package is extracted from
+        the build cache when it is there, and added to it when it is
+        built.
+        """
+        prefix_lock = spack.installed_db.prefix_lock(self.spec)
+        _wait_for_lock(prefix_lock.acquire_write,
+                       "Waiting for another process to install %s" % self.name)
+        try:
+            if spack.install_layout.check_installed(self.spec):
+                tty.msg("%s was installed by another process in %s" %
+                        (self.name, self.prefix))
+                return
+
+            use_cache = spack.build_cache_path and not fake
+            if use_cache and spack.build_cache.install_from_cache(self):
+                return
+
+            self._install_self(keep_prefix=keep_prefix,
+                               keep_stage=keep_stage,
+                               skip_patch=skip_patch,
+                               verbose=verbose,
+                               make_jobs=make_jobs,
+                               fake=fake,
+                               fetch_stats=fetch_stats,
+                               fetch_checked=fetch_checked)
+
+            if use_cache:
+                spack.build_cache.add_to_cache(self)
+        finally:
+            prefix_lock.release_write()
+
+    def _install_self(self, keep_prefix, keep_stage, skip_patch, verbose,
+                      make_jobs, fake, fetch_stats, fetch_checked):
+        """Does the work of do_install_self(), with the prefix locked."""
         # Set parallelism before starting build.
         self.make_jobs = make_jobs
+        self._archive_checked = fetch_checked
 
-        # Then install the package itself.
         def build_process():
             """Forked for each build. Has its own process and python
                module space set up by build_environment.fork()."""
-
+            # Keep other processes out of the stage until it is removed.
+            _wait_for_lock(self.stage.lock.acquire_write,
+                           "Waiting for another process to use the stage "
+                           "for %s" % self.name)
+            try:
+                # Record the resources each phase uses.
+                stats = self._build_stats = spack.build_stats.BuildStats()
+                with stats.phase('total'):
+                    build()
+                if fetch_stats:
+                    stats.add(fetch_stats)
+                stats.write(spack.install_layout.build_stats_path(self.spec))
+            finally:
+                self.stage.lock.release_write()
+
+        def build():
             start_time = time.time()
             if not fake:
                 if not skip_patch:
@@ -997,7 +1126,8 @@ class Package(object):
                 spack.hooks.pre_install(self)
 
                 if fake:
-                    self.do_fake_install()
+                    with self._build_stats.phase('install'):
+                        self.do_fake_install()
                 else:
                     # Do the real install in the source directory.
                     self.stage.chdir_to_source()
@@ -1013,7 +1143,8 @@ class Package(object):
                         with log_output(log_file, verbose, sys.stdout.isatty(),
                                         True):
                             dump_environment(env_path)
-                            self.install(self.spec, self.prefix)
+                            with self._build_stats.phase('install'):
+                                self.install(self.spec, self.prefix)
 
                     except ProcessError as e:
                         # Annotate ProcessErrors with the location of
@@ -1037,7 +1168,8 @@ class Package(object):
                     dump_packages(self.spec, packages_dir)
 
                 # Run post install hooks before build stage is removed.
-                spack.hooks.post_install(self)
+                with self._build_stats.phase('post_install'):
+                    spack.hooks.post_install(self)
 
             # Stop timer.
             self._total_time = time.time() - start_time
@@ -1065,10 +1197,6 @@ class Package(object):
                          wrap=True)
             raise
 
-        # note: PARENT of the build process adds the new package to
-        # the database, so that we don't need to re-read from file.
-        spack.installed_db.add(self.spec, self.prefix, explicit=explicit)
-
     def sanity_check_prefix(self):
         """This function checks whether install succeeded."""
 
@@ -1377,17 +1505,8 @@ class Package(object):
 
     def format_doc(self, **kwargs):
         """Wrap doc string at 72 characters and format nicely"""
-        indent = kwargs.get('indent', 0)
-
-        if not self.__doc__:
-            return ""
-
-        doc = re.sub(r'\s+', ' ', self.__doc__)
-        lines = textwrap.wrap(doc, 72)
-        results = StringIO()
-        for line in lines:
-            results.write((" " * indent) + line + "\n")
-        return results.getvalue()
+        return spack.util.string.format_doc(
+            self.__doc__, kwargs.get('indent', 0))
 
     @property
     def all_urls(self):
@@ -1520,6 +1639,17 @@ def print_pkg(message):
     print(message)
 
 
+def _wait_for_lock(acquire, message):
+    """Call a Lock's acquire_read or acquire_write method, waiting as
+       long as it takes.  Prints message first if another process holds
+       the lock."""
+    try:
+        acquire(timeout=0)
+    except LockError:
+        tty.msg(message)
+        acquire(timeout=None)
+
+
 def _hms(seconds):
     """Convert time in seconds to hours, minutes, seconds."""
     m, s = divmod(seconds, 60)
@@ -115,12 +115,16 @@ class Parser(object):
                 self.next_token_error("Unexpected end of input")
             sys.exit(1)
 
-    def setup(self, text):
+    def setup(self, text, tokens=None):
+        """Prepare to parse text.  Callers that already lexed the
+           text can pass its tokens to skip lexing it again."""
         self.text = text
-        self.push_tokens(self.lexer.lex(text))
+        if tokens is None:
+            tokens = self.lexer.lex(text)
+        self.push_tokens(tokens)
 
-    def parse(self, text):
-        self.setup(text)
+    def parse(self, text, tokens=None):
+        self.setup(text, tokens)
         return self.do_parse()
 
 
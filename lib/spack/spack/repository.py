@@ -23,13 +23,15 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
 import os
+import errno
 import exceptions
 import sys
 import inspect
 import imp
 import re
+import socket
+import hashlib
 import traceback
-from bisect import bisect_left
 from external import yaml
 
 import llnl.util.tty as tty
@@ -38,6 +40,10 @@ from llnl.util.filesystem import *
 import spack.error
 import spack.config
 import spack.spec
+import spack.util.spack_json as sjson
+import spack.util.string
+from spack.version import Version
+from spack.variant import Variant
 from spack.virtual import ProviderIndex
 from spack.util.naming import *
 
@@ -57,6 +63,10 @@ package_file_name  = 'package.py'  # Filename for packages in a repository.
 # Guaranteed unused default value for some functions.
 NOT_PROVIDED = object()
 
+# Version of the format of repository cache files.  Caches written with
+# a different version are ignored and rebuilt.
+_repo_cache_version = 2
+
 
 def _autospec(function):
     """Decorator that automatically converts the argument of a single-arg
@@ -106,6 +116,7 @@ class RepoPath(object):
 
         self._all_package_names = []
         self._provider_index = None
+        self._extension_index = None
 
         # If repo_dirs is empty, just use the configuration
         if not repo_dirs:
@@ -137,12 +148,16 @@ class RepoPath(object):
                  'by_namespace',
                  'by_path',
                  '_all_package_names',
-                 '_provider_index']
+                 '_provider_index',
+                 '_extension_index']
         for attr in attrs:
             tmp = getattr(self, attr)
             setattr(self, attr, getattr(other, attr))
             setattr(other, attr, tmp)
 
+        # Which specs satisfy which depends on the packages.
+        spack.spec.clear_satisfies_cache()
+
 
     def _add(self, repo):
         """Add a repository to the namespace and path indexes.
@@ -151,6 +166,11 @@ class RepoPath(object):
         directory, and they provide have the same namespace.
 
         """
+        # Providers and extensions change when repos are added.
+        self._provider_index = None
+        self._extension_index = None
+        spack.spec.clear_satisfies_cache()
+
         if repo.root in self.by_path:
             raise DuplicateRepoError("Duplicate repository: '%s'" % repo.root)
 
@@ -185,6 +205,9 @@ class RepoPath(object):
         """Remove a repo from the search path."""
         if repo in self.repos:
             self.repos.remove(repo)
+            self._provider_index = None
+            self._extension_index = None
+            spack.spec.clear_satisfies_cache()
 
 
     def get_repo(self, namespace, default=NOT_PROVIDED):
@@ -222,20 +245,54 @@ class RepoPath(object):
             yield self.get(name)
 
 
-    @_autospec
-    def providers_for(self, vpkg_spec):
+    @property
+    def provider_index(self):
+        """Merged ProviderIndex of all repos in the path.
+
+        A package in an earlier repo hides packages of the same name in
+        later repos, so only the first one's providers are included.
+        """
         if self._provider_index is None:
-            self._provider_index = ProviderIndex(self.all_package_names())
+            index = ProviderIndex([])
+            seen = set()
+            for repo in self.repos:
+                index.merge(repo.provider_index, exclude=seen)
+                seen.update(repo.all_package_names())
+            self._provider_index = index
+        return self._provider_index
 
-        providers = self._provider_index.providers_for(vpkg_spec)
+
+    @_autospec
+    def providers_for(self, vpkg_spec):
+        providers = self.provider_index.providers_for(vpkg_spec)
         if not providers:
             raise UnknownPackageError(vpkg_spec.name)
         return providers
 
 
+    @property
+    def extension_index(self):
+        """Merged extension index (extendee name -> names of packages
+        that extend it) of all repos in the path.  Like the provider
+        index, packages hidden by earlier repos are left out.
+        """
+        if self._extension_index is None:
+            index = {}
+            seen = set()
+            for repo in self.repos:
+                for extendee, names in repo.extension_index.items():
+                    index.setdefault(extendee, []).extend(
+                        n for n in names if n not in seen)
+                seen.update(repo.all_package_names())
+            self._extension_index = index
+        return self._extension_index
+
+
     @_autospec
     def extensions_for(self, extendee_spec):
-        return [p for p in self.all_packages() if p.extends(extendee_spec)]
+        names = self.extension_index.get(extendee_spec.name, [])
+        return [p for p in (self.get(n) for n in names)
+                if p.extends(extendee_spec)]
 
 
     def find_module(self, fullname, path=None):
@@ -321,6 +378,25 @@ class RepoPath(object):
         return self.repo_for_pkg(pkg_name).get_pkg_class(pkg_name)
 
 
+    def get_pkg_metadata(self, pkg_name):
+        """Get cached metadata for a package, without loading it if
+           possible."""
+        return self.repo_for_pkg(pkg_name).get_pkg_metadata(pkg_name)
+
+
+    def all_package_metadata(self):
+        """Metadata for all unique packages in all repositories.  Like
+           all_package_names(), earlier repos hide later ones."""
+        seen = set()
+        metadata = []
+        for repo in self.repos:
+            for pkg_metadata in repo.all_package_metadata():
+                if pkg_metadata.name not in seen:
+                    seen.add(pkg_metadata.name)
+                    metadata.append(pkg_metadata)
+        return metadata
+
+
     @_autospec
     def dump_provenance(self, spec, path):
         """Dump provenance information for a spec to a particular path.
@@ -415,7 +491,17 @@ class Repo(object):
         self._classes = {}
         self._instances = {}
         self._provider_index = None
+        self._extension_index = None
         self._all_package_names = None
+        self._package_names_set = None
+        self._metadata = None
+        self._fingerprint = None
+
+        # Persistent caches for this repo are stored here.  The root's
+        # hash keeps repos that share a namespace apart.
+        root_hash = hashlib.sha1(self.root).hexdigest()[:8]
+        self.cache_path = join_path(
+            spack.cache_path, 'repos', '%s-%s' % (self.namespace, root_hash))
 
         # make sure the namespace for packages in this repo exists.
         self._create_namespace()
@@ -601,20 +687,69 @@ class Repo(object):
         self._instances.clear()
 
 
-    @_autospec
-    def providers_for(self, vpkg_spec):
+    @property
+    def provider_index(self):
+        """ProviderIndex of all packages in this repo.
+
+        The index is cached in this repo's cache directory along with a
+        fingerprint of all package files, and it is rebuilt from package
+        metadata when any of them changes.
+        """
         if self._provider_index is None:
-            self._provider_index = ProviderIndex(self.all_package_names())
+            fingerprint = self.packages_fingerprint()
+            cache = self._read_cache('providers.json')
+            if cache and cache['fingerprint'] == fingerprint:
+                self._provider_index = ProviderIndex.from_dict(cache['index'])
+            else:
+                index = ProviderIndex([])
+                for metadata in self.all_package_metadata():
+                    index.update(metadata.name, metadata.provided)
+                self._write_cache('providers.json', {
+                    'fingerprint': fingerprint,
+                    'index': index.to_dict()})
+                self._provider_index = index
 
-        providers = self._provider_index.providers_for(vpkg_spec)
+        return self._provider_index
+
+
+    @_autospec
+    def providers_for(self, vpkg_spec):
+        providers = self.provider_index.providers_for(vpkg_spec)
         if not providers:
             raise UnknownPackageError(vpkg_spec.name)
         return providers
 
 
+    @property
+    def extension_index(self):
+        """Dict of extendee name -> sorted names of the packages in this
+        repo that extend it.
+
+        Cached and rebuilt from package metadata like the provider index.
+        """
+        if self._extension_index is None:
+            fingerprint = self.packages_fingerprint()
+            cache = self._read_cache('extensions.json')
+            if cache and cache['fingerprint'] == fingerprint:
+                self._extension_index = cache['index']
+            else:
+                index = {}
+                for metadata in self.all_package_metadata():
+                    for spec, args in metadata.extendees.values():
+                        index.setdefault(spec.name, []).append(metadata.name)
+                self._write_cache('extensions.json', {
+                    'fingerprint': fingerprint,
+                    'index': index})
+                self._extension_index = index
+
+        return self._extension_index
+
+
     @_autospec
     def extensions_for(self, extendee_spec):
-        return [p for p in self.all_packages() if p.extends(extendee_spec)]
+        names = self.extension_index.get(extendee_spec.name, [])
+        return [p for p in (self.get(n) for n in names)
+                if p.extends(extendee_spec)]
 
 
     def _check_namespace(self, spec):
@@ -646,35 +781,78 @@ class Repo(object):
         return join_path(pkg_dir, package_file_name)
 
 
-    def all_package_names(self):
-        """Returns a sorted list of all package names in the Repo."""
-        if self._all_package_names is None:
-            self._all_package_names = []
+    def _scan_package_names(self):
+        """Find all packages in the repository by listing its packages
+           directory.  Returns a sorted list of package names and a list
+           of directories that do not (yet) contain a package file."""
+        names = []
+        incomplete = []
+        for pkg_name in os.listdir(self.packages_path):
+            # Skip non-directories in the package root.
+            pkg_dir = join_path(self.packages_path, pkg_name)
+            if not os.path.isdir(pkg_dir):
+                continue
 
-            for pkg_name in os.listdir(self.packages_path):
-                # Skip non-directories in the package root.
-                pkg_dir = join_path(self.packages_path, pkg_name)
-                if not os.path.isdir(pkg_dir):
-                    continue
+            # Skip directories without a package.py in them.
+            pkg_file = join_path(pkg_dir, package_file_name)
+            if not os.path.isfile(pkg_file):
+                incomplete.append(pkg_name)
+                continue
 
-                # Skip directories without a package.py in them.
-                pkg_file = join_path(self.packages_path, pkg_name, package_file_name)
-                if not os.path.isfile(pkg_file):
-                    continue
+            # Warn about invalid names that look like packages.
+            if not valid_module_name(pkg_name):
+                tty.warn("Skipping package at %s. '%s' is not a valid "
+                         "Spack module name." % (pkg_dir, pkg_name))
+                continue
 
-                # Warn about invalid names that look like packages.
-                if not valid_module_name(pkg_name):
-                    tty.warn("Skipping package at %s. '%s' is not a valid Spack module name."
-                             % (pkg_dir, pkg_name))
-                    continue
+            # All checks passed.  Add it to the list.
+            names.append(pkg_name)
 
-                # All checks passed.  Add it to the list.
-                self._all_package_names.append(pkg_name)
-            self._all_package_names.sort()
+        return sorted(names), incomplete
+
+
+    def all_package_names(self):
+        """Returns a sorted list of all package names in the Repo.
+
+        The list is cached in this repo's cache directory, and it is
+        only rebuilt when the packages directory's mtime changes (i.e.,
+        when a package directory is added or removed).  Directories that
+        had no package file when the cache was written are checked again,
+        so a package created with ``spack create`` is found even if its
+        file was written after the cache.
+
+        Deleting only a package's package.py does not change the mtime
+        either.  Code that stats package files calls
+        _rescan_package_names() when it finds one missing.
+        """
+        if self._all_package_names is None:
+            mtime = os.stat(self.packages_path).st_mtime
+
+            cache = self._read_cache('names.json')
+            if (cache and cache['mtime'] == mtime and not any(
+                    os.path.isfile(self.filename_for_package_name(name))
+                    for name in cache['incomplete'])):
+                self._all_package_names = cache['names']
+                self._package_names_set = set(cache['names'])
+            else:
+                self._rescan_package_names()
 
         return self._all_package_names
 
 
+    def _rescan_package_names(self):
+        """List the packages directory again and rewrite the names cache."""
+        mtime = os.stat(self.packages_path).st_mtime
+        names, incomplete = self._scan_package_names()
+        self._write_cache('names.json', {
+            'mtime': mtime,
+            'names': names,
+            'incomplete': incomplete})
+
+        self._all_package_names = names
+        self._package_names_set = set(names)
+
+
     def all_packages(self):
         for name in self.all_package_names():
             yield self.get(name)
@@ -682,10 +860,9 @@ class Repo(object):
 
     def exists(self, pkg_name):
         """Whether a package with the supplied name exists."""
-        # This does a binary search in the sorted list.
-        idx = bisect_left(self.all_package_names(), pkg_name)
-        return (idx < len(self._all_package_names) and
-                self._all_package_names[idx] == pkg_name)
+        if self._package_names_set is None:
+            self.all_package_names()
+        return pkg_name in self._package_names_set
 
 
     def _get_pkg_module(self, pkg_name):
@@ -737,6 +914,135 @@ class Repo(object):
         return cls
 
 
+    def _read_cache(self, name):
+        """Read the cache file with the supplied name in this repo's cache
+           directory.  Returns None if it is missing, unreadable, or was
+           written by a different version of Spack."""
+        path = join_path(self.cache_path, name)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            data = sjson.load(path)
+        except (IOError, ValueError) as e:
+            tty.debug("Ignoring unreadable repository cache %s: %s"
+                      % (path, e))
+            return None
+
+        if data.get('version') != _repo_cache_version:
+            return None
+        return data
+
+
+    def _write_cache(self, name, data):
+        """Atomically write data to a cache file in this repo's cache
+           directory.  Failures are not fatal; the cache is just not
+           updated."""
+        path = join_path(self.cache_path, name)
+        temp_path = '%s.%s.%s.temp' % (path, socket.getfqdn(), os.getpid())
+
+        data['version'] = _repo_cache_version
+        try:
+            mkdirp(self.cache_path)
+            with open(temp_path, 'w') as f:
+                sjson.dump(data, f)
+            os.rename(temp_path, path)
+        except (IOError, OSError) as e:
+            tty.debug("Could not write repository cache %s: %s" % (path, e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+    def _package_file_stat(self, pkg_name):
+        """Modification time and size of a package's package.py file.
+           Raises UnknownPackageError if the file does not exist."""
+        try:
+            st = os.stat(self.filename_for_package_name(pkg_name))
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                raise UnknownPackageError(pkg_name, self)
+            raise
+        return [st.st_mtime, st.st_size]
+
+
+    def packages_fingerprint(self):
+        """Hash of the stats of all package files in this repo, used to
+           check whether indexes and concretizations built from them are
+           still valid.
+
+           Package files are only stat'ed once per Repo instance, i.e.
+           once per process unless the repository configuration changes.
+        """
+        def all_stats():
+            return dict((name, self._package_file_stat(name))
+                        for name in self.all_package_names())
+
+        if self._fingerprint is None:
+            try:
+                stats = all_stats()
+            except UnknownPackageError:
+                # A cached name's package.py was deleted.
+                self._rescan_package_names()
+                stats = all_stats()
+            self._fingerprint = hashlib.sha1(sjson.dumps(stats)).hexdigest()
+        return self._fingerprint
+
+
+    def _update_metadata(self, pkg_names):
+        """Make sure cached metadata for the named packages is current.
+
+        Packages whose package.py changed since their metadata was cached
+        are loaded, and the cache is written back once if anything changed.
+        """
+        if self._metadata is None:
+            cache = self._read_cache('metadata.json')
+            self._metadata = cache['packages'] if cache else {}
+
+        changed = False
+        for pkg_name in pkg_names:
+            stat = self._package_file_stat(pkg_name)
+            entry = self._metadata.get(pkg_name)
+            if entry and entry['stat'] == stat:
+                continue
+
+            metadata = PackageMetadata.from_package_class(
+                pkg_name, self.get_pkg_class(pkg_name))
+            self._metadata[pkg_name] = {'stat': stat,
+                                        'metadata': metadata.to_dict()}
+            changed = True
+
+        if changed:
+            # Drop packages that were removed from the repo.
+            for name in self._metadata.keys():
+                if not self.exists(name):
+                    del self._metadata[name]
+            self._write_cache('metadata.json', {'packages': self._metadata})
+
+
+    def get_pkg_metadata(self, pkg_name):
+        """Get metadata for a package, without loading its package.py
+           file if it has not changed since its metadata was cached."""
+        if not self.exists(pkg_name):
+            raise UnknownPackageError(pkg_name, self)
+
+        self._update_metadata([pkg_name])
+        return PackageMetadata.from_dict(
+            self._metadata[pkg_name]['metadata'])
+
+
+    def all_package_metadata(self):
+        """Metadata for all packages in this repo, loading only those
+           whose package.py files have changed since they were cached."""
+        try:
+            self._update_metadata(self.all_package_names())
+        except UnknownPackageError:
+            # A cached name's package.py was deleted.
+            self._rescan_package_names()
+            self._update_metadata(self.all_package_names())
+        return [PackageMetadata.from_dict(self._metadata[n]['metadata'])
+                for n in self.all_package_names()]
+
+
     def __str__(self):
         return "[Repo '%s' at '%s']" % (self.namespace, self.root)
 
@@ -749,6 +1055,155 @@ class Repo(object):
         return self.exists(pkg_name)
 
 
+class PackageMetadata(object):
+    """Information about a package that can be read without loading it.
+
+    This is the data that directives add to a package class (versions,
+    variants, dependencies, provided virtuals, extendees), along with its
+    URLs, where each version is fetched from, and its doc string.  It is
+    cached per ``Repo`` so that read-only queries like ``spack info`` do
+    not have to execute ``package.py`` files.
+
+    Specs are stored as strings and parsed when the corresponding
+    attribute is first used.
+    """
+    def __init__(self, name, versions, variants, dependencies, provided,
+                 extendees, url=None, homepage=None, doc=None,
+                 fetchers=None):
+        self.name = name
+        self._versions = versions
+        self._variants = variants
+        self._dependencies = dependencies
+        self._provided = provided
+        self._extendees = extendees
+        self.url = url
+        self.homepage = homepage
+        self.doc = doc
+        self._fetchers = fetchers
+
+
+    @property
+    def versions(self):
+        """Dict of Version -> fetch arguments, like Package.versions."""
+        return dict((Version(v), args) for v, args in self._versions.items())
+
+
+    @property
+    def variants(self):
+        """Dict of name -> Variant, like Package.variants."""
+        return dict((name, Variant(v['default'], v['description']))
+                    for name, v in self._variants.items())
+
+
+    @property
+    def dependencies(self):
+        """Dict of dependency name -> {when spec : dependency spec}."""
+        return dict(
+            (name, dict((spack.spec.Spec(when), spack.spec.Spec(dep))
+                        for when, dep in conditions.items()))
+            for name, conditions in self._dependencies.items())
+
+
+    @property
+    def provided(self):
+        """Dict of provided virtual spec -> when spec."""
+        return dict((spack.spec.Spec(vspec), spack.spec.Spec(when))
+                    for vspec, when in self._provided)
+
+
+    @property
+    def extendees(self):
+        """Dict of extendee name -> (extendee spec, extension args)."""
+        return dict((name, (spack.spec.Spec(spec), args))
+                    for name, (spec, args) in self._extendees.items())
+
+
+    @property
+    def fetchers(self):
+        """Dict of Version -> description of its fetch strategy, or None
+           if they could not be worked out without a spec."""
+        if self._fetchers is None:
+            return None
+        return dict((Version(v), f) for v, f in self._fetchers.items())
+
+
+    def format_doc(self, **kwargs):
+        """Wrap doc string at 72 characters, like Package.format_doc()."""
+        return spack.util.string.format_doc(self.doc, kwargs.get('indent', 0))
+
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'versions': self._versions,
+            'variants': self._variants,
+            'dependencies': self._dependencies,
+            'provided': self._provided,
+            'extendees': self._extendees,
+            'url': self.url,
+            'homepage': self.homepage,
+            'doc': self.doc,
+            'fetchers': self._fetchers
+        }
+
+
+    @staticmethod
+    def from_dict(d):
+        return PackageMetadata(
+            d['name'], d['versions'], d['variants'], d['dependencies'],
+            d['provided'], d['extendees'], d['url'], d['homepage'], d['doc'],
+            d['fetchers'])
+
+
+    @staticmethod
+    def from_package_class(name, cls):
+        """Extract metadata from the directives in a package class."""
+        # Like Package.__init__, make sure all directive dicts exist.
+        import spack.directives
+        spack.directives.ensure_dicts(cls)
+
+        versions = dict((str(v), args) for v, args in cls.versions.items())
+        variants = dict(
+            (name, {'default': v.default, 'description': v.description})
+            for name, v in cls.variants.items())
+        dependencies = dict(
+            (name, dict((str(when), str(dep))
+                        for when, dep in conditions.items()))
+            for name, conditions in cls.dependencies.items())
+
+        # Provided specs are not unique as strings, so use a list.
+        provided = sorted([str(vspec), str(when)]
+                          for vspec, when in cls.provided.items())
+        # Callable extension arguments (e.g. ignore=lambda...) can't be
+        # stored; they are only needed to activate a real extension.
+        extendees = dict(
+            (name, [str(spec), dict((k, v) for k, v in args.items()
+                                    if not callable(v))])
+            for name, (spec, args) in cls.extendees.items())
+
+        return PackageMetadata(
+            name, versions, variants, dependencies, provided, extendees,
+            getattr(cls, 'url', None), getattr(cls, 'homepage', None),
+            cls.__doc__, _fetch_descriptions(cls))
+
+
+def _fetch_descriptions(cls):
+    """Describe where each version of a package class is fetched from.
+
+    Package instances need a spec, but working out fetch URLs usually
+    only needs class attributes, so this uses an uninitialized instance.
+    Returns None if a package needs more than that, e.g. a
+    url_for_version() that looks at self.spec.
+    """
+    import spack.fetch_strategy as fs
+    pkg = cls.__new__(cls)
+    try:
+        return dict((str(v), str(fs.for_package_version(pkg, v)))
+                    for v in cls.versions)
+    except Exception:
+        return None
+
+
 def create_repo(root, namespace=None):
     """Create a new repository in root with the specified namespace.
 
@@ -95,9 +95,10 @@ thing.  Spack uses ~variant in directory names and in the canonical form of
 specs to avoid ambiguity.  Both are provided because ~ can cause shell
 expansion when it is the first character in an id typed on the command line.
 """
-import sys
+import time
 import hashlib
 import base64
+import weakref
 from StringIO import StringIO
 from operator import attrgetter
 import yaml
@@ -111,6 +112,7 @@ import spack
 import spack.parse
 import spack.error
 import spack.compilers as compilers
+import spack.util.spack_yaml as syaml
 
 from spack.version import *
 from spack.util.string import *
@@ -147,6 +149,32 @@ _separators = '[%s]' % ''.join(color_formats.keys())
    every time we call str()"""
 _any_version = VersionList([':'])
 
+"""Interned concrete specs, keyed by DAG hash.  Specs with the same hash
+   describe the same DAG, so specs read from files share these instead of
+   keeping their own copies.  See Spec._intern()."""
+_interned_specs = weakref.WeakValueDictionary()
+
+
+def interned_spec(dag_hash):
+    """Return the interned concrete spec with this DAG hash, or None."""
+    return _interned_specs.get(dag_hash)
+
+
+"""Results of Spec.satisfies(), keyed by the constraints of both specs.
+   Results also depend on which packages exist and what they provide,
+   so the package RepoPath clears this when its repositories change."""
+_satisfies_cache = LRUCache(50000)
+
+
+def clear_satisfies_cache():
+    """Forget memoized satisfies() results."""
+    _satisfies_cache.clear()
+
+
+"""Specs parsed from strings, keyed by the string.  Package directives
+   parse the same few strings over and over; see parse_many()."""
+_parse_cache = LRUCache(10000)
+
 
 def index_specs(specs):
     """Take a list of specs and return a dict of lists.  Dict is
@@ -456,7 +484,7 @@ class Spec(object):
         if not isinstance(spec_like, basestring):
             raise TypeError("Can't make spec out of %s" % type(spec_like))
 
-        spec_list = SpecParser().parse(spec_like)
+        spec_list = parse(spec_like)
         if len(spec_list) > 1:
             raise ValueError("More than one spec in string: " + spec_like)
         if len(spec_list) < 1:
@@ -479,6 +507,7 @@ class Spec(object):
         self.variants.spec = self
         self.namespace = other.namespace
         self._hash = other._hash
+        self._cmp_key_cache = None
 
         # Specs are by default not assumed to be normal, but in some
         # cases we've read them from a file want to assume normal.
@@ -686,36 +715,60 @@ class Spec(object):
 
         if visited is None:
             visited = set()
-        key = key_fun(self)
-
-        # Node traversal does not yield visited nodes.
-        if key in visited and cover == 'nodes':
-            return
-
-        # Determine whether and what to yield for this node.
-        yield_me = yield_root or d > 0
-        result = (d, self) if depth else self
+        successors_attr = 'dependencies'
+        if direction == 'parents':
+            successors_attr = 'dependents'
+
+        # Sorted successor names, computed once per node.  Successors are
+        # still looked up by name when reached, as callers may modify the
+        # DAG while walking it.
+        sorted_names = {}
+
+        # Walk with an explicit stack instead of recursing through nested
+        # generators, which makes every yield cost O(depth).  Each entry is
+        # [node, depth, successors, names, next name index]; successors
+        # is None until the node has been entered.
+        stack = [[self, d, None, None, 0]]
+        while stack:
+            entry = stack[-1]
+            node, node_depth, successors = entry[0], entry[1], entry[2]
+
+            if successors is None:
+                key = key_fun(node)
+
+                # Node traversal does not yield visited nodes.
+                if key in visited and cover == 'nodes':
+                    stack.pop()
+                    continue
 
-        # Preorder traversal yields before successors
-        if yield_me and order == 'pre':
-            yield result
+                # Preorder traversal yields before successors
+                if order == 'pre' and (yield_root or node_depth > 0):
+                    yield (node_depth, node) if depth else node
 
-        # Edge traversal yields but skips children of visited nodes
-        if not (key in visited and cover == 'edges'):
-            # This code determines direction and yields the children/parents
-            successors = self.dependencies
-            if direction == 'parents':
-                successors = self.dependents
+                successors = getattr(node, successors_attr)
+                entry[2] = successors
 
-            visited.add(key)
-            for name in sorted(successors):
-                child = successors[name]
-                for elt in child.traverse(visited, d + 1, **kwargs):
-                    yield elt
+                # Edge traversal yields but skips children of visited nodes
+                if key in visited and cover == 'edges':
+                    entry[3] = ()
+                else:
+                    visited.add(key)
+                    node_id = id(node)
+                    if node_id not in sorted_names:
+                        sorted_names[node_id] = sorted(successors)
+                    entry[3] = sorted_names[node_id]
+
+            names, i = entry[3], entry[4]
+            if i < len(names):
+                entry[4] = i + 1
+                stack.append([successors[names[i]], node_depth + 1,
+                              None, None, 0])
+            else:
+                stack.pop()
 
-        # Postorder traversal yields after successors
-        if yield_me and order == 'post':
-            yield result
+                # Postorder traversal yields after successors
+                if order == 'post' and (yield_root or node_depth > 0):
+                    yield (node_depth, node) if depth else node
 
     @property
     def short_spec(self):
@@ -739,23 +792,46 @@ class Spec(object):
         """
         if self._hash:
             return self._hash[:length]
-        else:
-            yaml_text = yaml.dump(
-                self.to_node_dict(), default_flow_style=True, width=sys.maxint)
-            sha = hashlib.sha1(yaml_text)
-            b32_hash = base64.b32encode(sha.digest()).lower()[:length]
+        return self._dag_hash({})[:length]
+
+    def _dag_hash(self, memo):
+        """Compute the DAG hash of this spec.
+
+        Hashes of concrete specs are stored on the spec.  Hashes of
+        non-concrete specs can change whenever the spec is modified, so
+        they are only remembered in ``memo`` (keyed by ``id``) for the
+        length of one call.  That way each node in a DAG that is being
+        concretized is hashed once per call, not once per path to it.
+        """
+        if self._hash:
+            return self._hash
+
+        key = id(self)
+        if key not in memo:
+            b32_hash = self._compute_hash(memo)
             if self.concrete:
                 self._hash = b32_hash
-            return b32_hash
+            memo[key] = b32_hash
+        return memo[key]
+
+    def _compute_hash(self, memo):
+        """Hash this node's contents, ignoring any stored hash for it.
+           Dependencies contribute their own (possibly stored) hashes."""
+        node_text = syaml.flow_dump(self._to_node_dict(memo))
+        sha = hashlib.sha1(node_text)
+        return base64.b32encode(sha.digest()).lower()
 
     def to_node_dict(self):
+        return self._to_node_dict({})
+
+    def _to_node_dict(self, memo):
         params = dict((name, v.value) for name, v in self.variants.items())
         params.update(dict((name, value)
                       for name, value in self.compiler_flags.items()))
         d = {
             'parameters': params,
             'arch': self.architecture,
-            'dependencies': dict((d, self.dependencies[d].dag_hash())
+            'dependencies': dict((d, self.dependencies[d]._dag_hash(memo))
                                  for d in sorted(self.dependencies)),
         }
 
@@ -772,14 +848,31 @@ class Spec(object):
 
         return {self.name: d}
 
-    def to_yaml(self, stream=None):
+    def to_dict(self):
         node_list = []
         for s in self.traverse(order='pre'):
             node = s.to_node_dict()
             node[s.name]['hash'] = s.dag_hash()
             node_list.append(node)
-        return yaml.dump({'spec': node_list},
-                         stream=stream, default_flow_style=False)
+        return {'spec': node_list}
+
+    def to_yaml(self, stream=None):
+        """Write this spec as YAML to stream, or return it as a string.
+
+        Nodes are converted and written one at a time, so the whole
+        document is never built in memory.  The output reads back the
+        same as dumping to_dict(), except that values shared between
+        nodes are written out in full rather than as YAML aliases.
+        """
+        out = StringIO() if stream is None else stream
+        out.write('spec:\n')
+        for s in self.traverse(order='pre'):
+            node = s.to_node_dict()
+            node[s.name]['hash'] = s.dag_hash()
+            yaml.dump([node], stream=out, default_flow_style=False)
+
+        if stream is None:
+            return out.getvalue()
 
     @staticmethod
     def from_node_dict(node):
@@ -817,35 +910,76 @@ class Spec(object):
         return spec
 
     @staticmethod
-    def from_yaml(stream):
+    def from_yaml(stream, concrete=False, verify=False):
         """Construct a spec from YAML.
 
         Parameters:
         stream -- string or file object to read from.
 
-        TODO: currently discards hashes. Include hashes when they
-        represent more than the DAG does.
-
+        See from_dict() for concrete and verify.
         """
-        deps = {}
-        spec = None
-
         try:
             yfile = yaml.load(stream)
         except MarkedYAMLError, e:
             raise SpackYAMLError("error parsing YAML spec:", str(e))
 
-        for node in yfile['spec']:
+        return Spec.from_dict(yfile, concrete, verify)
+
+    @staticmethod
+    def from_dict(data, concrete=False, verify=False):
+        """Construct a spec from a dict in the format of to_dict().
+
+        Hashes stored with the nodes are kept, so they are not
+        recomputed when the spec is hashed.
+
+        If concrete is True, the data must describe a concrete spec,
+        such as one read from an installation.  The result is marked
+        concrete and interned, and nodes whose stored hash is already
+        interned are reused instead of being constructed again, so
+        specs read from many files share their common dependencies.
+
+        If verify is True, the stored hash of every node constructed
+        here is checked against its contents, and SpecHashMismatchError
+        is raised if they differ.  Reused nodes were checked (or built)
+        when they were first interned.
+        """
+        deps = {}
+        spec = None
+
+        nodes = data['spec']
+        for node in nodes:
             name = next(iter(node))
-            dep = Spec.from_node_dict(node)
+            dep = None
+            if concrete and 'hash' in node[name]:
+                dep = _interned_specs.get(node[name]['hash'])
+            if dep is None:
+                dep = Spec.from_node_dict(node)
             if not spec:
                 spec = dep
-            deps[dep.name] = dep
+            deps[name] = dep
 
-        for node in yfile['spec']:
+        built = [n for n in nodes if not deps[next(iter(n))]._concrete]
+        for node in built:
             name = next(iter(node))
             for dep_name in node[name]['dependencies']:
                 deps[name].dependencies[dep_name] = deps[dep_name]
+
+        if verify:
+            memo = {}
+            for node in built:
+                name = next(iter(node))
+                stored = node[name].get('hash')
+                if stored is not None:
+                    computed = deps[name]._compute_hash(memo)
+                    if computed != stored:
+                        raise SpecHashMismatchError(name, stored, computed)
+
+        if concrete:
+            for node in built:
+                dep = deps[next(iter(node))]
+                dep._normal = True
+                dep._concrete = True
+            spec = spec._intern()
         return spec
 
     def _concretize_helper(self, presets=None, visited=None):
@@ -1031,15 +1165,45 @@ class Spec(object):
         if self._concrete:
             return
 
+        # Reuse an earlier result if nothing it depends on has changed.
+        # Only roots are cached, as _dup() would disconnect dependents.
+        cache = spack.concretization_cache
+        cache_key = None
+        if (cache.enabled and not self.dependents and
+                spack.concretizer.cacheable()):
+            cache_key = cache.key(self)
+            cached = cache.get(cache_key)
+            tty.debug("Concretization cache %s for %s: %d hits, %d misses"
+                      % ('hit' if cached else 'miss', self.name,
+                         cache.hits, cache.misses))
+            if cached is not None:
+                self._dup(cached)
+                self._mark_concrete()
+                return
+
         changed = True
         force = False
 
+        # Dependency conditions are only re-evaluated for nodes whose
+        # constraints changed since the last pass; see normalize().
+        conditions = {}
+
+        phases = (('normalize', lambda: self._normalize(force, conditions)),
+                  ('expand virtuals', self._expand_virtual_packages),
+                  ('concretize nodes', self._concretize_helper))
+        phase_times = [0.0] * len(phases)
+        iterations = 0
+
         while changed:
-            changes = (self.normalize(force),
-                       self._expand_virtual_packages(),
-                       self._concretize_helper())
+            changes = []
+            for i, (name, phase) in enumerate(phases):
+                start = time.time()
+                changes.append(phase())
+                phase_times[i] += time.time() - start
+
             changed = any(changes)
             force = True
+            iterations += 1
 
         for s in self.traverse():
             # After concretizing, assign namespaces to anything left.
@@ -1056,6 +1220,17 @@ class Spec(object):
         # Mark everything in the spec as concrete, as well.
         self._mark_concrete()
 
+        if cache_key is not None:
+            cache.put(cache_key, self)
+
+        tty.debug("Concretized %s in %d iterations: %s"
+                  % (self.name, iterations,
+                     ", ".join("%s %.3fs" % (name, t) for (name, phase), t
+                               in zip(phases, phase_times))))
+        tty.debug("satisfies() cache: %d hits, %d misses, %d entries"
+                  % (_satisfies_cache.hits, _satisfies_cache.misses,
+                     len(_satisfies_cache)))
+
     def _mark_concrete(self):
         """Mark this spec and its dependencies as concrete.
 
@@ -1066,6 +1241,32 @@ class Spec(object):
             s._normal = True
             s._concrete = True
 
+    def _intern(self):
+        """Return the interned spec with this concrete spec's DAG hash.
+
+        If there is none yet, this spec becomes the interned one, after
+        its dependencies are replaced with their interned versions.
+        Identical sub-DAGs of specs interned this way are the same
+        objects, so interned specs can't be modified: they raise
+        InternedSpecError instead.
+
+        Because an interned spec can be shared by many DAGs, it has no
+        ``dependents``: the ``root`` of an interned spec is itself.
+        Copy a DAG to get a private one with dependents.
+        """
+        key = self.dag_hash()
+        interned = _interned_specs.get(key)
+        if interned is not None:
+            return interned
+
+        dependencies = _InternedDependencyMap(
+            (name, dep._intern()) for name, dep in self.dependencies.items())
+        self.dependencies = dependencies
+        self.dependents = _InternedDependencyMap()
+        self.__class__ = _InternedSpec
+        _interned_specs[key] = self
+        return self
+
     def concretized(self):
         """This is a non-destructive version of concretize().  First clones,
            then returns a concrete version of this package without modifying
@@ -1127,20 +1328,37 @@ class Spec(object):
         for dep in self.flat_dependencies(copy=False):
             self._add_dependency(dep)
 
-    def _evaluate_dependency_conditions(self, name):
+    def _evaluate_dependency_conditions(self, name, memo=None):
         """Evaluate all the conditions on a dependency with this name.
 
         If the package depends on <name> in this configuration, return
         the dependency.  If no conditions are True (and we don't
         depend on it), return None.
+
+        If a memo dict is supplied, results are kept there and reused
+        until the constraints on this node change.  Conditions that
+        constrain dependencies are always evaluated.
         """
         pkg = spack.repo.get(self.fullname)
         conditions = pkg.dependencies[name]
 
+        if memo is not None and not any(w.dependencies for w in conditions):
+            key = (self.name, name)
+            constraints = self._constraints_key()
+            if key in memo and memo[key][0] == constraints:
+                dep = memo[key][1]
+            else:
+                dep = self._evaluate_dependency_conditions(name)
+                memo[key] = (constraints, dep)
+            # Callers may modify the dependency, so hand out copies.
+            return dep.copy() if dep is not None else None
+
         # evaluate when specs to figure out constraints on the dependency.
         dep = None
         for when_spec, dep_spec in conditions.items():
-            sat = self.satisfies(when_spec, strict=True)
+            # Only look past this node if the condition constrains deps.
+            sat = self.satisfies(when_spec, deps=bool(when_spec.dependencies),
+                                 strict=True)
             if sat:
                 if dep is None:
                     dep = Spec(name)
@@ -1183,7 +1401,8 @@ class Spec(object):
             elif required:
                 raise UnsatisfiableProviderSpecError(required[0], vdep)
 
-    def _merge_dependency(self, dep, visited, spec_deps, provider_index):
+    def _merge_dependency(self, dep, visited, spec_deps, provider_index,
+                          conditions):
         """Merge the dependency into this spec.
 
         This is the core of normalize().  There are some basic steps:
@@ -1242,10 +1461,11 @@ class Spec(object):
             self._add_dependency(dependency)
 
         changed |= dependency._normalize_helper(
-            visited, spec_deps, provider_index)
+            visited, spec_deps, provider_index, conditions)
         return changed
 
-    def _normalize_helper(self, visited, spec_deps, provider_index):
+    def _normalize_helper(self, visited, spec_deps, provider_index,
+                          conditions):
         """Recursive helper function for _normalize."""
         if self.name in visited:
             return False
@@ -1266,11 +1486,13 @@ class Spec(object):
             changed = False
             for dep_name in pkg.dependencies:
                 # Do we depend on dep_name?  If so pkg_dep is not None.
-                pkg_dep = self._evaluate_dependency_conditions(dep_name)
+                pkg_dep = self._evaluate_dependency_conditions(
+                    dep_name, conditions)
                 # If pkg_dep is a dependency, merge it.
                 if pkg_dep:
                     changed |= self._merge_dependency(
-                        pkg_dep, visited, spec_deps, provider_index)
+                        pkg_dep, visited, spec_deps, provider_index,
+                        conditions)
             any_change |= changed
 
         return any_change
@@ -1292,6 +1514,13 @@ class Spec(object):
            TODO: normalize should probably implement some form of cycle
            detection, to ensure that the spec is actually a DAG.
         """
+        return self._normalize(force, {})
+
+    def _normalize(self, force, conditions):
+        """Implementation of normalize().  conditions is a memo of
+           evaluated dependency conditions, which concretize() keeps
+           across passes; see _evaluate_dependency_conditions().
+        """
         if not self.name:
             raise SpecError("Attempting to normalize anonymous spec")
 
@@ -1311,7 +1540,8 @@ class Spec(object):
         # traverse the package DAG and fill out dependencies according
         # to package files & their 'when' specs
         visited = set()
-        any_change = self._normalize_helper(visited, spec_deps, provider_index)
+        any_change = self._normalize_helper(
+            visited, spec_deps, provider_index, conditions)
 
         # If there are deps specified but not visited, they're not
         # actually deps of this package.  Raise an error.
@@ -1480,9 +1710,54 @@ class Spec(object):
 
           * `strict`: strict means that we *must* meet all the
             constraints specified on other.
+
+        Results that depend on dependencies or on a virtual's providers
+        are memoized by the constraints of both specs (see
+        _satisfies_key()), so modified specs are looked up again.
+        Other checks cost about as much as building a key, so they are
+        not cached.
         """
         other = self._autospec(other)
 
+        if not other.virtual and not (
+                deps and (self.dependencies or other.dependencies)):
+            return self._satisfies(other, deps, strict)
+
+        key = (self._satisfies_key(deps), other._satisfies_key(deps),
+               deps, strict)
+        result = _satisfies_cache.get(key)
+        if result is None:
+            result = self._satisfies(other, deps, strict)
+            _satisfies_cache[key] = result
+        return result
+
+    def _satisfies_key(self, deps):
+        """Immutable key for everything satisfies() looks at.
+
+        This is the constraints of each node, the names of its
+        dependencies and whether it is marked concrete (which makes
+        variant and flag checks strict), for the root only or (if
+        ``deps``) for the whole DAG.  A concrete DAG is identified by
+        its stored DAG hash instead of being walked.
+        """
+        if deps and self._concrete:
+            return ('concrete', self.dag_hash())
+
+        nodes = self.traverse() if deps else (self,)
+        return tuple((s._constraints_key(), tuple(sorted(s.dependencies)))
+                     for s in nodes)
+
+    def _constraints_key(self):
+        """Immutable key for the constraints on this node alone."""
+        return (self.name, self.namespace, tuple(self.versions),
+                self.architecture,
+                self.compiler and (self.compiler.name,
+                                   tuple(self.compiler.versions)),
+                tuple(sorted((n, v.value) for n, v in self.variants.items())),
+                self.compiler_flags._cmp_key(), self._concrete)
+
+    def _satisfies(self, other, deps, strict):
+        """Uncached implementation of satisfies()."""
         # A concrete provider can satisfy a virtual dependency.
         if not self.virtual and other.virtual:
             pkg = spack.repo.get(self.fullname)
@@ -1549,6 +1824,10 @@ class Spec(object):
         """
         other = self._autospec(other)
 
+        # Nothing to check if other doesn't constrain dependencies.
+        if not other.dependencies:
+            return True
+
         if strict:
             if other.dependencies and not self.dependencies:
                 return False
@@ -1630,9 +1909,10 @@ class Spec(object):
         self.external = other.external
         self.namespace = other.namespace
         self._hash = other._hash
+        self._cmp_key_cache = None
 
         # If we copy dependencies, preserve DAG structure in the new spec
-        if kwargs.get('deps', True):
+        if kwargs.get('deps', True) and other.dependencies:
             # This copies the deps from other using _dup(deps=False)
             new_nodes = other.flat_dependencies()
             new_nodes[self.name] = self
@@ -1766,10 +2046,18 @@ class Spec(object):
         The key is the concatenation of:
           1. A tuple describing this node in the DAG.
           2. The hash of each of this node's dependencies' cmp_keys.
+
+        Concrete specs do not change, so their keys are computed once.
         """
-        return self._cmp_node() + (
+        if self._cmp_key_cache is not None:
+            return self._cmp_key_cache
+
+        key = self._cmp_node() + (
             tuple(hash(self.dependencies[name])
                   for name in sorted(self.dependencies)),)
+        if self._concrete:
+            self._cmp_key_cache = key
+        return key
 
     def colorized(self):
         return colorize_spec(self)
@@ -1985,6 +2273,47 @@ class Spec(object):
         return str(self)
 
 
+class _InternedDependencyMap(DependencyMap):
+    """Dependencies or dependents of an interned spec, which can't be
+       changed."""
+    def _frozen(self, *args, **kwargs):
+        raise InternedSpecError("change the dependencies of")
+
+    __setitem__ = __delitem__ = _frozen
+    clear = pop = popitem = setdefault = update = _frozen
+
+    def copy(self):
+        clone = DependencyMap()
+        for key in self:
+            clone[key] = self[key].copy()
+        return clone
+
+
+class _InternedSpec(Spec):
+    """A concrete spec interned by Spec._intern().
+
+       Interned specs are shared by every DAG that contains them, so
+       they raise InternedSpecError instead of being modified.  Use
+       copy() to get a private spec that can be.
+    """
+    # Lazily computed caches don't change what the spec describes.
+    _cache_attributes = frozenset(['_hash', '_cmp_key_cache'])
+
+    def __setattr__(self, name, value):
+        if name not in self._cache_attributes:
+            raise InternedSpecError("set %s on" % name)
+        super(_InternedSpec, self).__setattr__(name, value)
+
+    def _add_dependency(self, spec):
+        raise InternedSpecError("add a dependency to")
+
+    def _dup(self, other, **kwargs):
+        raise InternedSpecError("overwrite")
+
+    def constrain(self, other, deps=True):
+        raise InternedSpecError("constrain")
+
+
 #
 # These are possible token types in the spec grammar.
 #
@@ -2119,6 +2448,7 @@ class SpecParser(spack.parse.Parser):
         spec.dependencies = DependencyMap()
         spec.namespace = spec_namespace
         spec._hash = None
+        spec._cmp_key_cache = None
 
         spec._normal = False
         spec._concrete = False
@@ -2254,7 +2584,70 @@ def parse(string):
     """Returns a list of specs from an input string.
        For creating one spec, see Spec() constructor.
     """
-    return SpecParser().parse(string)
+    return parse_many([string])[0]
+
+
+def parse_many(strings):
+    """Returns a list with the list of specs parsed from each string.
+
+       Strings seen before are answered from a cache, and the rest are
+       lexed together in one pass.  The specs returned are always fresh
+       copies, so callers are free to modify them.
+    """
+    results = [None] * len(strings)
+    misses = []
+    for i, string in enumerate(strings):
+        cached = _parse_cache.get(string)
+        if cached is None:
+            misses.append(i)
+        else:
+            results[i] = [s.copy() for s in cached]
+
+    all_tokens = _lex_many([strings[i] for i in misses])
+    for i, tokens in zip(misses, all_tokens):
+        string = strings[i]
+        specs = SpecParser().parse(string, tokens)
+
+        # Hashes are looked up in the installed DB, so their results
+        # can change.  Only cache strings without them.
+        if '/' not in string:
+            _parse_cache[string] = [s.copy() for s in specs]
+        results[i] = specs
+
+    return results
+
+
+def _lex_many(strings):
+    """Lex spec strings in a single pass over their concatenation.
+
+       Returns a token list per string, with positions relative to that
+       string.  Tokens can't contain newlines, so none can span two
+       strings.  If anything fails to lex, this returns None for every
+       string, and they are lexed (and errors reported) one by one.
+    """
+    if len(strings) < 2:
+        return [None] * len(strings)
+
+    try:
+        tokens = _lexer.lex('\n'.join(strings))
+    except spack.parse.LexError:
+        return [None] * len(strings)
+
+    result = []
+    t = 0
+    offset = 0
+    for string in strings:
+        end = offset + len(string)
+        string_tokens = []
+        while t < len(tokens) and tokens[t].start < end:
+            token = tokens[t]
+            token.start -= offset
+            token.end -= offset
+            string_tokens.append(token)
+            t += 1
+        result.append(string_tokens)
+        offset = end + 1
+    return result
 
 
 def parse_anonymous_spec(spec_like, pkg_name):
@@ -2506,6 +2899,23 @@ class SpackRecordError(spack.error.SpackError):
         super(SpackRecordError, self).__init__(msg)
 
 
+class SpecHashMismatchError(SpecError):
+    """Raised when a spec read from a file does not match its stored
+       hash."""
+    def __init__(self, name, stored, computed):
+        super(SpecHashMismatchError, self).__init__(
+            "Stored hash %s for %s does not match its contents (%s)"
+            % (stored, name, computed))
+
+
+class InternedSpecError(SpecError):
+    """Raised when an interned spec would be modified."""
+    def __init__(self, action):
+        super(InternedSpecError, self).__init__(
+            "Cannot %s an interned spec, which other specs share.  "
+            "Modify a copy() of it instead." % action)
+
+
 class AmbiguousHashError(SpecError):
 
     def __init__(self, msg, *specs):
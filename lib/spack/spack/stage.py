@@ -30,8 +30,10 @@ from urlparse import urljoin
 
 import llnl.util.tty as tty
 from llnl.util.filesystem import *
+from llnl.util.lock import Lock, max_offset_bits
 
 import spack.util.pattern as pattern
+from spack.util.crypto import hash_bits
 
 import spack
 import spack.config
@@ -40,6 +42,9 @@ import spack.error
 
 STAGE_PREFIX = 'spack-stage-'
 
+# File in spack.stage_path holding a one-byte lock for each stage.
+STAGE_LOCK_FILE = '.lock'
+
 
 class Stage(object):
     """Manages a temporary stage directory for building.
@@ -143,6 +148,14 @@ class Stage(object):
         # Flag to decide whether to delete the stage folder on exit or not
         self.keep = keep
 
+        self._lock = None
+
+    @property
+    def lock(self):
+        """Lock that processes hold while they use this stage."""
+        if self._lock is None:
+            self._lock = _stage_lock(self.name)
+        return self._lock
 
     def __enter__(self):
         """
@@ -473,6 +486,10 @@ class StageComposite:
     def archive_file(self):
         return self[0].archive_file
 
+    @property
+    def lock(self):
+        return self[0].lock
+
 
 class DIYStage(object):
     """Simple class that allows any directory to be a spack stage."""
@@ -481,6 +498,7 @@ class DIYStage(object):
         self.archive_file = None
         self.path = path
         self.source_path = path
+        self.lock = _stage_lock(path)
 
     def chdir(self):
         if os.path.isdir(self.path):
@@ -518,6 +536,13 @@ def _get_mirrors():
     return [val for name, val in config.iteritems()]
 
 
+def _stage_lock(key):
+    """Lock on one byte of the stage lock file, chosen by key."""
+    mkdirp(spack.stage_path)
+    return Lock(join_path(spack.stage_path, STAGE_LOCK_FILE),
+                start=hash_bits(key, max_offset_bits), length=1)
+
+
 def ensure_access(file=spack.stage_path):
     """Ensure we can access a directory and die with an error if we can't."""
     if not can_access(file):
@@ -528,6 +553,9 @@ def purge():
     """Remove all build directories in the top-level stage path."""
     if os.path.isdir(spack.stage_path):
         for stage_dir in os.listdir(spack.stage_path):
+            # Other processes may hold locks in the lock file.
+            if stage_dir == STAGE_LOCK_FILE:
+                continue
             stage_path = join_path(spack.stage_path, stage_dir)
             remove_linked_tree(stage_path)
 
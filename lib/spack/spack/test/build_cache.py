@@ -0,0 +1,192 @@
+##############################################################################
+# Copyright (c) 2013-2016, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/llnl/spack
+# Please also see the LICENSE file for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""
+Tests for the binary build cache in spack.build_cache.
+"""
+import os
+import shutil
+import tempfile
+
+import spack
+import spack.build_cache
+import spack.build_stats
+import spack.installer
+from llnl.util.filesystem import *
+from spack.build_cache import RelocationError
+from spack.database import Database
+from spack.directory_layout import YamlDirectoryLayout
+from spack.fetch_strategy import URLFetchStrategy, FetchStrategyComposite
+from spack.test.mock_packages_test import *
+from spack.test.mock_repo import MockArchive
+
+
+class BuildCacheTest(MockPackagesTest):
+
+    def setUp(self):
+        super(BuildCacheTest, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_path = join_path(self.tmpdir, 'cache')
+
+        self.spack_install_path = spack.install_path
+        self.spack_install_layout = spack.install_layout
+        self.spack_installed_db = spack.installed_db
+
+        # Install trees with roots of different lengths.
+        self.long_root = join_path(self.tmpdir, 'long-install-root')
+        self.short_root = join_path(self.tmpdir, 'short')
+        self.use_install_tree(self.long_root)
+
+        self.repo = MockArchive()
+        spack.do_checksum = False
+
+
+    def tearDown(self):
+        super(BuildCacheTest, self).tearDown()
+        self.repo.destroy()
+        spack.do_checksum = True
+        spack.build_cache_path = None
+
+        spack.install_path = self.spack_install_path
+        spack.install_layout = self.spack_install_layout
+        spack.installed_db = self.spack_installed_db
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+    def use_install_tree(self, root):
+        """Install into a new, empty tree at root."""
+        mkdirp(root)
+        spack.install_path = root
+        spack.install_layout = YamlDirectoryLayout(root)
+        spack.installed_db = Database(root)
+
+
+    def fake_install(self, spec):
+        """Fake install spec, with some files that refer to its paths."""
+        spack.install_layout.create_install_directory(spec)
+        spec.package.do_fake_install()
+        spack.build_stats.BuildStats().write(
+            spack.install_layout.build_stats_path(spec))
+
+        prefix = spec.prefix
+        dep_path = join_path(spack.install_layout.root, 'dep', 'lib')
+        with open(join_path(prefix.bin, 'script'), 'w') as f:
+            f.write("#!/bin/bash %s\n" % spack.build_cache.sbang_path())
+            f.write("LD_LIBRARY_PATH=%s:%s\n" % (prefix.lib, dep_path))
+        with open(join_path(prefix.lib, 'libfake.so'), 'wb') as f:
+            f.write('\0rpath\0%s:%s\0' % (prefix.lib, dep_path))
+        os.symlink(join_path(prefix.bin, 'script'),
+                   join_path(prefix.bin, 'link'))
+
+
+    def test_store_and_extract(self):
+        spec = Spec('libelf').concretized()
+        self.fake_install(spec)
+        old_prefix = spec.prefix
+        old_size = os.path.getsize(join_path(old_prefix.lib, 'libfake.so'))
+
+        tarball = spack.build_cache.store(spec, self.cache_path)
+        self.assertEqual(
+            spack.build_cache.tarball_path(spec, self.cache_path), tarball)
+        self.assertTrue(os.path.isfile(tarball))
+        self.assertTrue(spec.dag_hash() in tarball)
+
+        # Extract into a tree with a shorter root.
+        self.use_install_tree(self.short_root)
+        self.assertTrue(spack.build_cache.extract(spec, self.cache_path))
+        prefix = spec.prefix
+        self.assertNotEqual(old_prefix, prefix)
+        self.assertTrue(spack.install_layout.check_installed(spec))
+
+        dep_path = join_path(self.short_root, 'dep', 'lib')
+        with open(join_path(prefix.bin, 'script')) as f:
+            self.assertEqual(
+                "#!/bin/bash %s\nLD_LIBRARY_PATH=%s:%s\n" % (
+                    spack.build_cache.sbang_path(), prefix.lib, dep_path),
+                f.read())
+
+        # Binaries keep their size: paths are padded with slashes.
+        with open(join_path(prefix.lib, 'libfake.so'), 'rb') as f:
+            data = f.read()
+        self.assertEqual(old_size, len(data))
+        self.assertFalse(self.long_root in data)
+        paths = data.split('\0')[2].split(':')
+        self.assertEqual([prefix.lib, dep_path],
+                         [os.path.normpath(p) for p in paths])
+
+        self.assertEqual(join_path(prefix.bin, 'script'),
+                         os.readlink(join_path(prefix.bin, 'link')))
+
+        # Stats of the original build are not copied.
+        self.assertFalse(os.path.exists(
+            spack.install_layout.build_stats_path(spec)))
+
+        # Nothing is left next to the prefix.
+        self.assertEqual([os.path.basename(prefix)],
+                         os.listdir(os.path.dirname(prefix)))
+
+
+    def test_extract_missing(self):
+        spec = Spec('libelf').concretized()
+        self.assertFalse(spack.build_cache.extract(spec, self.cache_path))
+        self.assertFalse(os.path.exists(spec.prefix))
+
+
+    def test_binary_too_long_to_relocate(self):
+        spec = Spec('libelf').concretized()
+        self.use_install_tree(self.short_root)
+        self.fake_install(spec)
+        spack.build_cache.store(spec, self.cache_path)
+
+        # A longer root doesn't fit in the binary.
+        self.use_install_tree(self.long_root)
+        self.assertRaises(RelocationError, spack.build_cache.extract,
+                          spec, self.cache_path)
+        self.assertFalse(os.path.exists(spec.prefix))
+
+
+    def test_install_from_cache(self):
+        spack.build_cache_path = self.cache_path
+        spec = Spec('cmake-client').concretized()
+        for s in spec.traverse():
+            fetcher = FetchStrategyComposite()
+            fetcher.append(URLFetchStrategy(self.repo.url))
+            s.package.fetcher = fetcher
+
+        spack.installer.install_specs([spec], 1)
+        for s in spec.traverse():
+            self.assertTrue(os.path.isfile(
+                spack.build_cache.tarball_path(s)))
+
+        # Installing into another tree needs no sources.
+        self.use_install_tree(self.short_root)
+        for s in spec.traverse():
+            fetcher = FetchStrategyComposite()
+            fetcher.append(URLFetchStrategy('file:///no/such/archive.tgz'))
+            s.package.fetcher = fetcher
+
+        spack.installer.install_specs([spec], 1)
+        for s in spec.traverse():
+            self.assertTrue(s.package.installed)
+            self.assertTrue(s.prefix.startswith(self.short_root))
@@ -0,0 +1,110 @@
+##############################################################################
+# Copyright (c) 2013-2016, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/llnl/spack
+# Please also see the LICENSE file for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+import os
+import sys
+from StringIO import StringIO
+
+import llnl.util.tty as tty
+import spack
+from spack.build_stats import BuildStats
+from spack.test.mock_database import MockDatabase
+
+build_stats = __import__("spack.cmd.build-stats",
+                         fromlist=['build_stats']).build_stats
+
+
+class Bunch(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class BuildStatsTest(MockDatabase):
+
+    def setUp(self):
+        super(BuildStatsTest, self).setUp()
+
+        # Known stats for three packages; the others have none.
+        walls = {'libdwarf': 5.0, 'libelf': 3.0, 'mpich': 1.0}
+        with spack.installed_db.read_transaction():
+            specs = spack.installed_db.query()
+        for spec in specs:
+            path = spack.install_layout.build_stats_path(spec)
+            if spec.name not in walls:
+                os.remove(path)
+                continue
+            wall = walls[spec.name]
+            BuildStats({
+                'install': {'wall': wall, 'cpu': wall, 'max_rss': 2048},
+                'total': {'wall': wall + 1, 'cpu': wall, 'max_rss': 2048}
+            }).write(path)
+
+
+    def run_build_stats(self, *query_specs, **kwargs):
+        """Run the command; return its table rows and its messages."""
+        args = Bunch(sort=kwargs.get('sort', 'total'),
+                     number=kwargs.get('number'),
+                     query_specs=list(query_specs))
+        messages = []
+        stdout, msg = sys.stdout, tty.msg
+        sys.stdout = StringIO()
+        tty.msg = lambda message, *args: messages.append(message)
+        try:
+            build_stats(None, args)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout, tty.msg = stdout, msg
+        return [line.split() for line in output.splitlines()], messages
+
+
+    def test_sorted_by_total(self):
+        rows, messages = self.run_build_stats()
+        self.assertEqual(['package', 'wall', 'cpu', 'max_rss'], rows[0][:4])
+        self.assertEqual(
+            ['libdwarf', 'libelf', 'mpich'],
+            [row[0].split('@')[0] for row in rows[1:4]])
+        self.assertEqual(['6.0', '5.0', '2M', '0.0', '0.0', '0.0', '0.0',
+                          '5.0', '0.0'], rows[1][1:])
+        self.assertEqual(['total', '(3)', '12.0', '9.0', '2M'], rows[-1][:5])
+        self.assertEqual(["10 installed packages have no build stats."],
+                         messages)
+
+
+    def test_number_and_query(self):
+        rows, _ = self.run_build_stats(number=1)
+        self.assertEqual('libdwarf', rows[1][0].split('@')[0])
+        self.assertEqual(['total', '(1)'], rows[-1][:2])
+
+        rows, messages = self.run_build_stats('libelf')
+        self.assertEqual('libelf', rows[1][0].split('@')[0])
+        self.assertEqual(['total', '(1)'], rows[-1][:2])
+        self.assertEqual([], messages)
+
+
+    def test_no_stats(self):
+        rows, messages = self.run_build_stats('mpileaks')
+        self.assertEqual([], rows)
+        self.assertEqual(["No build stats for 3 installed packages."],
+                         messages)
@@ -22,11 +22,18 @@
 # License along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
+import os
+import shutil
+import tempfile
+
 import spack
 from spack.spec import Spec, CompilerSpec
 from spack.version import ver
-from spack.concretize import find_spec
+from spack.concretize import (find_spec, ConcretizationCache,
+                              concretize_together)
 from spack.test.mock_packages_test import *
+from spack.test.mock_database import MockDatabase
+from spack.preferred_packages import PreferredPackages
 
 class ConcretizeTest(MockPackagesTest):
 
@@ -339,3 +346,146 @@ class ConcretizeTest(MockPackagesTest):
         s.concretize()
         self.assertTrue(s['mpileaks'].satisfies('%clang'))
         self.assertTrue(s['dyninst'].satisfies('%gcc'))
+
+
+    def test_concretize_twice_same_result(self):
+        first = Spec('mpileaks')
+        first.concretize()
+        second = Spec('mpileaks')
+        second.concretize()
+        self.assertEqual(first.dag_hash(), second.dag_hash())
+
+
+    def test_concretize_together(self):
+        strings = ['mpileaks', 'callpath ^mpich', 'dyninst', 'mpileaks']
+        separate = [Spec(s).concretized() for s in strings]
+        together = concretize_together([Spec(s) for s in strings])
+        self.assertEqual([s.dag_hash() for s in separate],
+                         [s.dag_hash() for s in together])
+        self.assertTrue(spack.concretizer.batch is None)
+
+
+    def test_concretize_together_unify(self):
+        first, second = concretize_together(
+            [Spec('mpileaks ^mpich@1.0'), Spec('callpath')], unify=True)
+        self.assertTrue(second.satisfies('^mpich@1.0'))
+        self.assertEqual(first['callpath'].dag_hash(), second.dag_hash())
+
+        # Constraints of later specs still win.
+        first, second = concretize_together(
+            [Spec('mpileaks ^mpich@1.0'), Spec('callpath ^mpich@3.0.4')],
+            unify=True)
+        self.assertTrue(second.satisfies('^mpich@3.0.4'))
+
+
+    def test_concretization_cache(self):
+        saved_cache = spack.concretization_cache
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = ConcretizationCache(cache_dir)
+            spack.concretization_cache = cache
+
+            first = Spec('mpileaks')
+            first.concretize()
+            self.assertEqual((0, 1), (cache.hits, cache.misses))
+
+            second = Spec('mpileaks')
+            second.concretize()
+            self.assertEqual((1, 1), (cache.hits, cache.misses))
+            self.assertTrue(second.concrete)
+            self.assertEqual(first, second)
+            self.assertEqual(first.dag_hash(), second.dag_hash())
+
+            # Specs with different constraints are cached separately.
+            Spec('mpileaks ^mpich').concretize()
+            self.assertEqual((1, 2), (cache.hits, cache.misses))
+
+            self.assertEqual(2, cache.clear())
+            Spec('mpileaks').concretize()
+            self.assertEqual((1, 3), (cache.hits, cache.misses))
+
+            # Package files are only stat'ed for the first key.
+            repo = spack.repo.first_repo()
+
+            def no_stat(pkg_name):
+                raise AssertionError("Package file was stat'ed.")
+            repo._package_file_stat = no_stat
+            try:
+                self.assertEqual(cache.key(Spec('mpileaks')),
+                                 cache.key(Spec('mpileaks')))
+            finally:
+                del repo._package_file_stat
+        finally:
+            spack.concretization_cache = saved_cache
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+    def test_concretization_cache_size(self):
+        saved_cache = spack.concretization_cache
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = ConcretizationCache(cache_dir, max_entries=2)
+            spack.concretization_cache = cache
+
+            def entries():
+                return len([n for n in os.listdir(cache_dir)
+                            if n.endswith('.json')])
+
+            # Make each entry older than the next one.
+            for i, spec in enumerate(('libelf', 'libdwarf', 'mpich')):
+                Spec(spec).concretize()
+                for name in os.listdir(cache_dir):
+                    path = os.path.join(cache_dir, name)
+                    os.utime(path, (os.path.getmtime(path) - 10,) * 2)
+            self.assertEqual(2, entries())
+
+            # libelf was used least recently, so it was removed.
+            Spec('mpich').concretize()
+            Spec('libdwarf').concretize()
+            Spec('libelf').concretize()
+            self.assertEqual((2, 4), (cache.hits, cache.misses))
+            self.assertEqual(2, entries())
+        finally:
+            spack.concretization_cache = saved_cache
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+class ConcretizeReuseTest(MockDatabase):
+
+    def test_reuse_installed(self):
+        installed = spack.installed_db.query('mpileaks ^mpich')[0]
+
+        # Preferring another libelf would otherwise rebuild the stack.
+        saved_pkgsort = spack.pkgsort
+        spack.pkgsort = PreferredPackages()
+        spack.pkgsort.preferred = {'libelf': {'version': ['0.8.12']}}
+        try:
+            spec = Spec('mpileaks ^mpich')
+            spec.concretize()
+            self.assertTrue(spec.satisfies('^libelf@0.8.12'))
+            self.assertNotEqual(installed.dag_hash(), spec.dag_hash())
+
+            spec, = concretize_together([Spec('mpileaks ^mpich')],
+                                        reuse=True)
+            self.assertEqual(installed.dag_hash(), spec.dag_hash())
+
+            # Installed nodes are only used where the spec allows.
+            spec, = concretize_together(
+                [Spec('mpileaks ^mpich ^libelf@0.8.12')], reuse=True)
+            self.assertTrue(spec.satisfies('^libelf@0.8.12'))
+            self.assertEqual(installed['mpich'].dag_hash(),
+                             spec['mpich'].dag_hash())
+        finally:
+            spack.pkgsort = saved_pkgsort
+
+
+    def test_reuse_installed_provider(self):
+        installed = spack.installed_db.query('mpileaks ^zmpi')[0]
+        spec, = concretize_together([Spec('mpileaks ^zmpi')], reuse=True)
+        self.assertEqual(installed.dag_hash(), spec.dag_hash())
+
+        # Dependencies come from the installed spec that reuses the
+        # most, so a mpileaks that needs zmpi gets the installed
+        # callpath that was built with zmpi.
+        spec, = concretize_together([Spec('callpath')], reuse=True)
+        self.assertTrue(spack.installed_db.query(spec))
@@ -28,8 +28,10 @@ both in memory and in its file
 """
 import os.path
 import multiprocessing
+from StringIO import StringIO
 
 import spack
+import spack.database
 from llnl.util.filesystem import join_path
 from llnl.util.lock import *
 from llnl.util.tty.colify import colify
@@ -74,7 +76,7 @@ def _print_ref_counts():
 class DatabaseTest(MockDatabase):
     def test_005_db_exists(self):
         """Make sure db cache file exists after creating."""
-        index_file = join_path(self.install_path, '.spack-db', 'index.yaml')
+        index_file = join_path(self.install_path, '.spack-db', 'index.json')
         lock_file = join_path(self.install_path, '.spack-db', 'lock')
 
         self.assertTrue(os.path.exists(index_file))
@@ -273,3 +275,193 @@ class DatabaseTest(MockDatabase):
         # mpich ref count updated properly.
         mpich_rec = self.installed_db.get_record('mpich')
         self.assertEqual(mpich_rec.ref_count, 0)
+
+
+    def test_100_write_appends_to_journal(self):
+        index_path = self.installed_db._index_path
+        journal_path = self.installed_db._journal_path
+        with open(index_path) as f:
+            index_text = f.read()
+
+        self.installed_db.remove('mpileaks ^mpich')
+
+        # index is untouched; the change went to the journal.
+        with open(index_path) as f:
+            self.assertEqual(f.read(), index_text)
+        self.assertTrue(os.path.exists(journal_path))
+
+        # a fresh database sees the change by replaying the journal.
+        other_db = spack.database.Database(self.install_path)
+        with other_db.read_transaction():
+            self.assertEqual(other_db.query('mpileaks ^mpich'), [])
+            self.assertEqual(len(other_db.query()), 12)
+            self.assertEqual(
+                other_db.get_record('mpich').ref_count,
+                self.installed_db.get_record('mpich').ref_count)
+            other_db._check_ref_counts()
+
+
+    def test_110_journal_compaction(self):
+        saved_max_ops = spack.database._db_journal_max_ops
+        spack.database._db_journal_max_ops = 1
+        try:
+            rec = self.installed_db.get_record('mpileaks ^mpich')
+            self.installed_db.remove('mpileaks ^mpich')
+            self.assertTrue(os.path.exists(self.installed_db._journal_path))
+
+            # journal is over the limit, so the next write compacts it.
+            self.installed_db.add(rec.spec, rec.path)
+            self.assertFalse(os.path.exists(self.installed_db._journal_path))
+        finally:
+            spack.database._db_journal_max_ops = saved_max_ops
+
+        other_db = spack.database.Database(self.install_path)
+        with other_db.read_transaction():
+            self.assertEqual(len(other_db.query('mpileaks ^mpich')), 1)
+            other_db._check_ref_counts()
+
+
+    def test_120_read_yaml_index(self):
+        """Make sure an index.yaml from older Spack is read and converted."""
+        db_dir = join_path(self.install_path, '.spack-db')
+        with self.installed_db.read_transaction():
+            with open(join_path(db_dir, 'index.yaml'), 'w') as f:
+                self.installed_db._write_to_yaml(f)
+        os.remove(join_path(db_dir, 'index.json'))
+
+        other_db = spack.database.Database(self.install_path)
+        with other_db.write_transaction():
+            self.assertEqual(len(other_db.query()), 13)
+
+        self.assertTrue(os.path.exists(join_path(db_dir, 'index.json')))
+        self.assertFalse(os.path.exists(join_path(db_dir, 'index.yaml')))
+
+
+    def test_125_json_index_is_streamed(self):
+        """The index is written record by record, with the same output
+           as dumping the whole database at once."""
+        db = self.installed_db
+        stream = StringIO()
+        with db.read_transaction():
+            db._write_to_json(stream)
+            expected = spack.database.sjson.dump(db._database_dict())
+        self.assertEqual(stream.getvalue(), expected)
+
+
+    def test_130_unchanged_index_not_reparsed(self):
+        loads = []
+        real_load = spack.database.sjson.load
+
+        def counting_load(stream):
+            loads.append(stream)
+            return real_load(stream)
+
+        spack.database.sjson.load = counting_load
+        try:
+            other_db = spack.database.Database(self.install_path)
+            for i in range(3):
+                with other_db.read_transaction():
+                    self.assertEqual(len(other_db.query()), 13)
+        finally:
+            spack.database.sjson.load = real_load
+
+        self.assertEqual(len(loads), 1)
+
+
+    def test_140_read_shares_dependency_nodes(self):
+        other_db = spack.database.Database(self.install_path)
+        with other_db.read_transaction():
+            dyninst = other_db.query('dyninst')[0]
+            mpileaks_specs = other_db.query('mpileaks')
+
+        self.assertEqual(len(mpileaks_specs), 3)
+        for spec in mpileaks_specs:
+            self.assertTrue(spec['dyninst'] is dyninst)
+            self.assertTrue(spec.concrete)
+
+
+    def test_145_interned_nodes_have_no_dependents(self):
+        other_db = spack.database.Database(self.install_path)
+        with other_db.read_transaction():
+            mpileaks = other_db.query('mpileaks')[0]
+            libdwarf = other_db.query('libdwarf')[0]
+
+        # libelf is shared by every DAG read, so it has no dependents.
+        libelf = mpileaks['libelf']
+        self.assertTrue(libdwarf['libelf'] is libelf)
+        self.assertFalse(libelf.dependents)
+        self.assertTrue(libelf.root is libelf)
+
+        # Copies have their own dependents.
+        copy = mpileaks.copy()
+        self.assertEqual(sorted(copy['libelf'].dependents),
+                         ['dyninst', 'libdwarf'])
+        self.assertTrue(copy['libelf'].root is copy)
+
+
+    def test_150_unchanged_database_not_reread(self):
+        db = self.installed_db
+        with db.read_transaction():
+            pass
+
+        hits, misses = db._read_hits, db._read_misses
+        for i in range(3):
+            with db.read_transaction():
+                self.assertEqual(len(db.query()), 13)
+        self.assertEqual(db._read_hits, hits + 3)
+        self.assertEqual(db._read_misses, misses)
+
+        # a change made by another Database instance forces a re-read.
+        other_db = spack.database.Database(self.install_path)
+        other_db.remove('mpileaks ^mpich')
+        with db.read_transaction():
+            self.assertEqual(len(db.query()), 12)
+        self.assertEqual(db._read_misses, misses + 1)
+
+
+    def test_160_indexed_query(self):
+        """Make sure queries narrowed by the indexes match a full scan."""
+        db = self.installed_db
+        arch = db.query('libelf')[0].architecture
+        queries = ['mpileaks', 'mpi', 'mpileaks ^mpich', 'callpath%gcc',
+                   '%gcc', 'libelf arch=%s' % arch, 'dyninst%clang',
+                   'nonexistent']
+        with db.read_transaction():
+            all_specs = db.query()
+            for q in queries:
+                expected = sorted(s for s in all_specs if s.satisfies(q))
+                self.assertEqual(db.query(q), expected)
+
+        # indexes are kept up to date by remove() and add()
+        rec = db.get_record('mpileaks ^mpich')
+        db.remove('mpileaks ^mpich')
+        self.assertEqual(len(db.query('mpileaks')), 2)
+        db.add(rec.spec, rec.path)
+        self.assertEqual(len(db.query('mpileaks')), 3)
+
+
+    def test_170_dependents(self):
+        db = self.installed_db
+        mpich = db.query('mpich')[0]
+        libelf = db.query('libelf')[0]
+
+        self.assertEqual(db.dependents(mpich),
+                         sorted(db.query('callpath ^mpich') +
+                                db.query('mpileaks ^mpich')))
+        self.assertEqual(db.dependents(libelf),
+                         sorted(db.query('dyninst') + db.query('libdwarf')))
+
+        # transitive dependents are the same as a full scan of the DAGs
+        expected = sorted(s for s in db.query()
+                          if s.name != 'libelf' and libelf in s.traverse())
+        self.assertEqual(db.dependents(libelf, transitive=True), expected)
+        self.assertEqual(len(expected), 8)
+
+        # uninstalled records still link dependents together
+        db.remove('callpath ^mpich')
+        self.assertEqual(db.dependents(mpich, transitive=True),
+                         db.query('mpileaks ^mpich'))
+        self.assertEqual(len(db.dependents(mpich, installed=any)), 2)
+
+        db.remove('mpileaks ^mpich')
+        self.assertEqual(db.dependents(mpich, installed=any), [])
@@ -116,6 +116,24 @@ class DirectoryLayoutTest(MockPackagesTest):
             self.assertFalse(os.path.exists(install_dir))
 
 
+    def test_read_spec_shares_nodes(self):
+        """Specs read from install directories are interned, so each
+           concrete DAG is only kept in memory once."""
+        spec = Spec('mpileaks')
+        spec.concretize()
+        for s in (spec, spec['callpath']):
+            self.layout.create_install_directory(s)
+
+        read = lambda s: self.layout.read_spec(self.layout.spec_file_path(s))
+        mpileaks = read(spec)
+        callpath = read(spec['callpath'])
+
+        self.assertEqual(mpileaks, spec)
+        self.assertTrue(read(spec) is mpileaks)
+        self.assertTrue(mpileaks['callpath'] is callpath)
+        self.assertTrue(mpileaks['libelf'] is callpath['libelf'])
+
+
     def test_handle_unknown_package(self):
         """This test ensures that spack can at least do *some*
            operations with packages that are installed but that it
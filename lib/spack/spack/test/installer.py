@@ -0,0 +1,300 @@
+##############################################################################
+# Copyright (c) 2013-2016, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/llnl/spack
+# Please also see the LICENSE file for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""
+Tests for installing several packages at once with spack.installer.
+"""
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+
+import spack
+import spack.build_stats
+import spack.installer
+from spack.database import Database
+from llnl.util.lock import LockError
+from spack.directory_layout import YamlDirectoryLayout
+from spack.fetch_strategy import URLFetchStrategy, FetchStrategyComposite
+from spack.package import Package, InstallError
+from spack.test.mock_packages_test import *
+from spack.test.mock_repo import MockArchive
+from spack.util.crypto import checksum
+from spack.util.executable import Executable
+
+
+class InstallerTest(MockPackagesTest):
+
+    def setUp(self):
+        super(InstallerTest, self).setUp()
+
+        # Install into an empty, temporary layout and database.
+        self.install_path = tempfile.mkdtemp()
+        self.spack_install_path = spack.install_path
+        spack.install_path = self.install_path
+
+        self.spack_install_layout = spack.install_layout
+        spack.install_layout = YamlDirectoryLayout(self.install_path)
+
+        self.spack_installed_db = spack.installed_db
+        spack.installed_db = Database(self.install_path)
+
+        self.do_fake_install = Package.do_fake_install
+
+        # Real installs fetch this archive instead of the package URLs.
+        self.repo = MockArchive()
+        spack.do_checksum = False
+
+
+    def tearDown(self):
+        super(InstallerTest, self).tearDown()
+        Package.do_fake_install = self.do_fake_install
+        self.repo.destroy()
+        spack.do_checksum = True
+
+        shutil.rmtree(self.install_path)
+        spack.install_path = self.spack_install_path
+        spack.install_layout = self.spack_install_layout
+        spack.installed_db = self.spack_installed_db
+
+
+    def fake_fetchify(self, spec):
+        """Make all packages in spec download the mock archive."""
+        for s in spec.traverse():
+            fetcher = FetchStrategyComposite()
+            fetcher.append(URLFetchStrategy(self.repo.url))
+            s.package.fetcher = fetcher
+
+
+    def installed_names(self):
+        with spack.installed_db.read_transaction():
+            return sorted(s.name for s in spack.installed_db.query())
+
+
+    def test_install_specs(self):
+        specs = [Spec('mpileaks ^mpich').concretized(),
+                 Spec('libdwarf').concretized()]
+        spack.installer.install_specs(specs, 3, make_jobs=2, fake=True)
+
+        self.assertEqual(
+            ['callpath', 'dyninst', 'libdwarf', 'libelf', 'mpich',
+             'mpileaks'],
+            self.installed_names())
+
+        with spack.installed_db.read_transaction():
+            explicit = sorted(s.name for s in
+                              spack.installed_db.query(explicit=True))
+        self.assertEqual(['libdwarf', 'mpileaks'], explicit)
+
+        for spec in specs:
+            for s in spec.traverse():
+                self.assertTrue(s.package.installed)
+
+        # Installing again finds everything already installed.
+        spack.installer.install_specs(specs, 3, fake=True)
+        self.assertEqual(6, len(self.installed_names()))
+
+
+    def test_make_jobs_budget(self):
+        def slow_fake_install(pkg):
+            time.sleep(0.1)
+            self.do_fake_install(pkg)
+        Package.do_fake_install = slow_fake_install
+
+        # Record the make jobs of the builds that run at the same time.
+        running = {}
+        totals = []
+        start_build = spack.installer._start_build
+        wait_for_any = spack.installer._wait_for_any
+
+        def recording_start_build(node, make_jobs, *args):
+            pid = start_build(node, make_jobs, *args)
+            running[pid] = make_jobs
+            totals.append(sum(running.values()))
+            return pid
+
+        def recording_wait_for_any(pids):
+            pid, status = wait_for_any(pids)
+            running.pop(pid, None)
+            return pid, status
+
+        spack.installer._start_build = recording_start_build
+        spack.installer._wait_for_any = recording_wait_for_any
+        try:
+            # libelf, mpich and mpich2 are ready at once, but only two
+            # make jobs may run.
+            specs = [Spec('mpileaks ^mpich').concretized(),
+                     Spec('libdwarf').concretized(),
+                     Spec('mpich2').concretized()]
+            spack.installer.install_specs(specs, 3, make_jobs=2, fake=True)
+        finally:
+            spack.installer._start_build = start_build
+            spack.installer._wait_for_any = wait_for_any
+
+        self.assertEqual(7, len(self.installed_names()))
+        self.assertEqual(7, len(totals))
+        self.assertEqual(2, max(totals))
+
+
+    def test_build_stats(self):
+        spec = Spec('libelf').concretized()
+        spack.installer.install_specs([spec], 1, fake=True)
+
+        path = spack.install_layout.build_stats_path(spec)
+        stats = spack.build_stats.BuildStats.read(path)
+        for phase in ('install', 'post_install', 'total'):
+            self.assertTrue(phase in stats)
+            self.assertTrue(stats[phase]['wall'] >= 0)
+            # A fake install runs no processes.
+            self.assertEqual(0, stats[phase]['max_rss'])
+        self.assertTrue(stats['total']['wall'] >= stats['install']['wall'])
+
+
+    def test_build_stats_max_rss(self):
+        python = Executable(sys.executable)
+        stats = spack.build_stats.BuildStats()
+        with stats.phase('total'):
+            with stats.phase('install'):
+                python('-c', 'x = " " * (64 * 1024 * 1024)')
+            with stats.phase('post_install'):
+                python('-c', 'pass')
+
+        # Each phase records the largest process it ran, not the peak
+        # of the processes that ran before it.
+        install, post_install = stats['install'], stats['post_install']
+        self.assertTrue(install['max_rss'] >= 64 * 1024)
+        self.assertTrue(0 < post_install['max_rss'] < 64 * 1024)
+        self.assertEqual(install['max_rss'], stats['total']['max_rss'])
+
+
+    def test_build_stats_add_fetch_stats(self):
+        spec = Spec('libelf').concretized()
+        fetch_stats = spack.build_stats.BuildStats({
+            'fetch': {'wall': 100.0, 'cpu': 2.0, 'max_rss': 1},
+            'total': {'wall': 101.0, 'cpu': 3.0, 'max_rss': 1}})
+        spec.package.do_install_self(fake=True, fetch_stats=fetch_stats)
+
+        path = spack.install_layout.build_stats_path(spec)
+        stats = spack.build_stats.BuildStats.read(path)
+        self.assertEqual(100.0, stats['fetch']['wall'])
+        self.assertTrue(stats['total']['wall'] >= 101.0)
+        self.assertEqual(1, stats['total']['max_rss'])
+
+
+    def test_failure_skips_only_dependents(self):
+        def do_fake_install(pkg):
+            if pkg.name == 'mpich':
+                raise InstallError("Mock failure of mpich.")
+            self.do_fake_install(pkg)
+        Package.do_fake_install = do_fake_install
+
+        spec = Spec('mpileaks ^mpich').concretized()
+        self.assertRaises(InstallError, spack.installer.install_specs,
+                          [spec], 2, fake=True)
+
+        # mpich's dependents are skipped; independent packages install.
+        self.assertEqual(['dyninst', 'libdwarf', 'libelf'],
+                         self.installed_names())
+        self.assertFalse(spec['mpich'].package.installed)
+
+
+    def test_prefetch(self):
+        spec = Spec('cmake-client').concretized()
+        self.fake_fetchify(spec)
+
+        # A fetch worker leaves the archive in the stage for the build,
+        # and sends back the stats of the fetch.
+        pid, result_fd = spack.installer._start_fetch(spec['cmake'])
+        self.assertEqual(0, os.waitpid(pid, 0)[1])
+        self.assertTrue(spec['cmake'].package.stage.archive_file)
+        stats, checked = spack.installer._read_fetch_result(result_fd)
+        self.assertTrue('fetch' in stats)
+        self.assertTrue(stats['total']['wall'] >= stats['fetch']['wall'])
+
+        spack.installer.install_specs([spec], 2, fetch_jobs=2)
+        self.assertEqual(['cmake', 'cmake-client'], self.installed_names())
+
+
+    def test_prefetch_checked(self):
+        spec = Spec('cmake').concretized()
+        pkg = spec.package
+        fetcher = FetchStrategyComposite()
+        fetcher.append(URLFetchStrategy(
+            self.repo.url, checksum(hashlib.md5, self.repo.archive_path)))
+        pkg.fetcher = fetcher
+        spack.do_checksum = True
+
+        # The fetch worker says that it checked the archive.
+        pid, result_fd = spack.installer._start_fetch(spec)
+        self.assertEqual(0, os.waitpid(pid, 0)[1])
+        stats, checked = spack.installer._read_fetch_result(result_fd)
+        self.assertTrue(checked)
+        self.assertTrue('checksum' in stats)
+
+        # A checked archive is not checked again, unless it is fetched
+        # again.
+        checks = []
+        pkg.stage.check = lambda: checks.append(True)
+        pkg.do_fetch()
+        pkg.do_fetch()
+        self.assertEqual([True], checks)
+        os.remove(pkg.stage.archive_file)
+        pkg.do_fetch()
+        self.assertEqual([True, True], checks)
+        pkg.do_clean()
+
+
+    def test_wait_for_other_process(self):
+        spec = Spec('libdwarf').concretized()
+        libelf = spec['libelf']
+
+        def slow_fake_install(pkg):
+            time.sleep(0.5)
+            self.do_fake_install(pkg)
+
+        def install_libelf():
+            Package.do_fake_install = slow_fake_install
+            libelf.package.do_install_self(fake=True)
+
+        other = Process(target=install_libelf)
+        other.start()
+
+        # Wait for the other process to lock libelf's prefix.
+        prefix_lock = spack.installed_db.prefix_lock(libelf)
+        while other.is_alive():
+            try:
+                prefix_lock.acquire_read(timeout=0)
+                prefix_lock.release_read()
+            except LockError:
+                break
+
+        # libelf's worker waits for the other install and reuses it,
+        # rather than failing on the existing prefix.
+        spack.installer.install_specs([spec], 2, fake=True)
+        other.join()
+        self.assertEqual(0, other.exitcode)
+        self.assertEqual(['libdwarf', 'libelf'], self.installed_names())
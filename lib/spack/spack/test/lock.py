@@ -27,6 +27,7 @@ These tests ensure that our lock works correctly.
 """
 import shutil
 import tempfile
+import time
 import unittest
 from multiprocessing import Process
 
@@ -262,3 +263,49 @@ class LockTest(unittest.TestCase):
             lock.release_read()
 
         self.multiproc_test(p1, p2, p3)
+
+
+    #
+    # Byte-range locks in one file are independent of each other.
+    #
+    def test_byte_range_locks(self):
+        def p1(barrier):
+            lock = Lock(self.lock_path, start=10, length=1)
+            lock.acquire_write()
+            barrier.wait() # ---------------------------------------- 1
+            # p2 locks another range, and times out on this one
+            barrier.wait() # ---------------------------------------- 2
+            lock.release_write()
+
+        def p2(barrier):
+            barrier.wait() # ---------------------------------------- 1
+            lock = Lock(self.lock_path, start=20, length=1)
+            lock.acquire_write(0.1)
+            lock.release_write()
+            lock = Lock(self.lock_path, start=10, length=1)
+            self.assertRaises(LockError, lock.acquire_write, 0.1)
+            self.assertRaises(LockError, lock.acquire_read, 0.1)
+            barrier.wait() # ---------------------------------------- 2
+
+        self.multiproc_test(p1, p2)
+
+
+    #
+    # Without a timeout, acquire waits until the lock is released.
+    #
+    def test_acquire_without_timeout(self):
+        def p1(barrier):
+            lock = Lock(self.lock_path)
+            lock.acquire_write()
+            barrier.wait() # ---------------------------------------- 1
+            time.sleep(0.5)
+            lock.release_write()
+
+        def p2(barrier):
+            barrier.wait() # ---------------------------------------- 1
+            lock = Lock(self.lock_path)
+            self.assertRaises(LockError, lock.acquire_write, 0)
+            lock.acquire_write(None)
+            lock.release_write()
+
+        self.multiproc_test(p1, p2)
@@ -94,6 +94,11 @@ class MockPackagesTest(unittest.TestCase):
         # restore later.
         self.saved_deps = {}
 
+        # Tests modify packages in memory, which the concretization
+        # cache can't see, so don't use it.
+        self.cache_enabled = spack.concretization_cache.enabled
+        spack.concretization_cache.enabled = False
+
 
     def set_pkg_dep(self, pkg_name, spec):
         """Alters dependence information for a package.
@@ -118,6 +123,7 @@ class MockPackagesTest(unittest.TestCase):
         spack.config.config_scopes = self.real_scopes
         shutil.rmtree(self.temp_config, ignore_errors=True)
         spack.config.clear_config_caches()
+        spack.concretization_cache.enabled = self.cache_enabled
 
         # Restore dependency changes that happened during the test
         for pkg_name, (pkg, deps) in self.saved_deps.items():
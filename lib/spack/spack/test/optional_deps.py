@@ -112,3 +112,21 @@ class ConcretizeTest(MockPackagesTest):
         self.check_normalize(
             'optional-dep-test+f',
             Spec('optional-dep-test+f', Spec('f'), Spec('g'), Spec('mpi')))
+
+
+    def test_dependency_conditions_memo(self):
+        spec = Spec('optional-dep-test-3~var')
+        conditions = {}
+
+        # Results are handed out as copies.
+        a = spec._evaluate_dependency_conditions('a', conditions)
+        a.constrain('@1.0')
+        self.assertEqual(Spec('a'),
+                         spec._evaluate_dependency_conditions('a', conditions))
+
+        # Conditions are evaluated again once the spec changes.
+        spec.variants['var'].value = True
+        self.assertEqual(None,
+                         spec._evaluate_dependency_conditions('a', conditions))
+        self.assertEqual(Spec('b'),
+                         spec._evaluate_dependency_conditions('b', conditions))
@@ -22,12 +22,20 @@
 # License along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
+import os
+import shutil
+import tempfile
 
 import spack
-from llnl.util.filesystem import join_path
-from spack.repository import Repo
+import spack.fetch_strategy as fs
+import spack.util.spack_json as sjson
+from llnl.util.filesystem import join_path, mkdirp
+from spack.repository import Repo, RepoPath, create_repo
+from spack.repository import UnknownPackageError
+from spack.virtual import ProviderIndex
 from spack.test.mock_packages_test import *
 from spack.util.naming import mod_to_class
+from spack.version import Version
 
 
 class PackagesTest(MockPackagesTest):
@@ -102,3 +110,176 @@ class PackagesTest(MockPackagesTest):
         import spack.pkg.builtin.mock
         import spack.pkg.builtin.mock as m
         from spack.pkg.builtin import mock
+
+
+class RepoCacheTest(MockPackagesTest):
+    """Tests for the caches a Repo keeps in its cache directory."""
+
+    def setUp(self):
+        super(RepoCacheTest, self).setUp()
+        self.cache_path = tempfile.mkdtemp()
+        self.repo_root = join_path(self.cache_path, 'cacherepo')
+        create_repo(self.repo_root)
+
+
+    def tearDown(self):
+        super(RepoCacheTest, self).tearDown()
+        shutil.rmtree(self.cache_path)
+
+
+    def mock_repo(self):
+        """A new Repo for the mock packages, using the test cache."""
+        repo = Repo(spack.mock_packages_path)
+        repo.cache_path = self.cache_path
+        return repo
+
+
+    def make_repo(self):
+        """A new Repo for the scratch repository, using the test cache."""
+        repo = Repo(self.repo_root)
+        repo.cache_path = self.cache_path
+        return repo
+
+
+    def add_package(self, name, body='pass', write_file=True):
+        """Add a package to the scratch repository.  With write_file=False,
+           only its directory is created."""
+        pkg_dir = join_path(self.repo_root, 'packages', name)
+        mkdirp(pkg_dir)
+        if write_file:
+            with open(join_path(pkg_dir, 'package.py'), 'w') as f:
+                f.write("from spack import *\n"
+                        "class %s(Package):\n"
+                        "    %s\n" % (mod_to_class(name), body))
+
+
+    def test_package_metadata(self):
+        md = self.mock_repo().get_pkg_metadata('mpich')
+        pkg = spack.repo.get('mpich')
+
+        self.assertEqual(md.name, 'mpich')
+        self.assertEqual(sorted(md.versions), sorted(pkg.versions))
+        self.assertEqual(md.provided, pkg.provided)
+        self.assertEqual(md.dependencies, pkg.dependencies)
+        self.assertEqual(sorted(md.variants), sorted(pkg.variants))
+        self.assertEqual(md.url, pkg.url)
+
+        # A new repo reads metadata from the cache, without loading
+        # the package.
+        repo = self.mock_repo()
+        self.assertEqual(repo.get_pkg_metadata('mpich').provided,
+                         pkg.provided)
+        self.assertFalse('mpich' in repo._modules)
+
+        # Package is loaded again if its file looks changed.
+        cache_file = join_path(self.cache_path, 'metadata.json')
+        cache = sjson.load(cache_file)
+        cache['packages']['mpich']['stat'] = [0, 0]
+        with open(cache_file, 'w') as f:
+            sjson.dump(cache, f)
+
+        repo = self.mock_repo()
+        repo.get_pkg_metadata('mpich')
+        self.assertTrue('mpich' in repo._modules)
+        cache = sjson.load(cache_file)
+        self.assertEqual(cache['packages']['mpich']['stat'],
+                         repo._package_file_stat('mpich'))
+
+
+    def test_metadata_fetchers(self):
+        md = self.mock_repo().get_pkg_metadata('libelf')
+        pkg = spack.repo.get('libelf')
+        self.assertEqual(
+            md.fetchers, dict((v, str(fs.for_package_version(pkg, v)))
+                              for v in pkg.versions))
+        self.assertEqual(md.format_doc(indent=2), pkg.format_doc(indent=2))
+
+        # Packages that need a spec to find their URLs have none.
+        self.add_package('specurl', (
+            "version('1.0', '0123456789abcdef0123456789abcdef')\n"
+            "    def url_for_version(self, version):\n"
+            "        return 'http://example.com/%s' % self.spec"))
+        md = self.make_repo().get_pkg_metadata('specurl')
+        self.assertEqual(md.fetchers, None)
+        self.assertEqual(md.versions.keys(), [Version('1.0')])
+
+
+    def test_provider_index_cache(self):
+        expected = ProviderIndex(spack.repo.all_package_names())
+        index = self.mock_repo().provider_index
+        self.assertEqual(index.providers, expected.providers)
+
+        # A new repo reads the index from the cache, without loading
+        # any packages.
+        repo = self.mock_repo()
+        self.assertEqual(repo.provider_index.providers, expected.providers)
+        self.assertEqual(repo._modules, {})
+
+
+    def test_package_names_cache(self):
+        self.add_package('foo')
+        self.assertEqual(self.make_repo().all_package_names(), ['foo'])
+
+        # Names come from the cache if the directory is unchanged.
+        repo = self.make_repo()
+
+        def no_scan():
+            raise AssertionError("Package directory was scanned.")
+        repo._scan_package_names = no_scan
+        self.assertEqual(repo.all_package_names(), ['foo'])
+        self.assertTrue(repo.exists('foo'))
+        self.assertFalse(repo.exists('bar'))
+
+        # New package directories invalidate the cache, even if the
+        # package file is added after the cache is written.
+        self.add_package('bar', write_file=False)
+        self.assertEqual(self.make_repo().all_package_names(), ['foo'])
+        self.add_package('bar')
+        self.assertEqual(self.make_repo().all_package_names(),
+                         ['bar', 'foo'])
+        self.assertTrue(self.make_repo().exists('bar'))
+
+
+    def test_deleted_package_file(self):
+        self.add_package('foo', "provides('virt')")
+        self.add_package('bar')
+        repo = self.make_repo()
+        self.assertTrue('virt' in repo.provider_index.providers)
+        self.assertEqual(len(repo.all_package_metadata()), 2)
+
+        # Removing only package.py leaves the packages directory's mtime
+        # alone, so the names cache is checked against the files.
+        os.remove(join_path(self.repo_root, 'packages', 'foo', 'package.py'))
+        repo = self.make_repo()
+        self.assertFalse('virt' in repo.provider_index.providers)
+        self.assertEqual(repo.all_package_names(), ['bar'])
+        self.assertFalse(repo.exists('foo'))
+        self.assertEqual(self.make_repo().all_package_names(), ['bar'])
+
+        repo = self.make_repo()
+        self.assertEqual([m.name for m in repo.all_package_metadata()],
+                         ['bar'])
+        self.assertRaises(UnknownPackageError, repo.get_pkg_metadata, 'foo')
+
+
+    def test_extension_index(self):
+        self.add_package('extendee', 'extendable = True')
+        self.add_package('ext-one', "extends('extendee')")
+        self.add_package('ext-two', "extends('extendee')")
+        self.add_package('other', "depends_on('extendee')")
+
+        index = self.make_repo().extension_index
+        self.assertEqual(index, {'extendee': ['ext-one', 'ext-two']})
+
+        # A new repo reads the index from the cache, and only loads
+        # the candidate packages to check them.
+        repo_path = RepoPath(self.repo_root)
+        repo = repo_path.first_repo()
+        repo.cache_path = self.cache_path
+        spack.repo.swap(repo_path)
+        try:
+            exts = spack.repo.extensions_for('extendee')
+        finally:
+            spack.repo.swap(repo_path)
+        self.assertEqual([p.name for p in exts], ['ext-one', 'ext-two'])
+        self.assertFalse('other' in repo._modules)
@@ -141,6 +141,27 @@ class SpecDagTest(MockPackagesTest):
         self.assertEqual([(x, y.name) for x,y in traversal], pairs)
 
 
+    def test_parents_traversal(self):
+        dag = Spec('mpileaks ^zmpi')
+        dag.normalize()
+
+        traversal = dag['libelf'].traverse(direction='parents', depth=True)
+        self.assertEqual([(x, y.name) for x,y in traversal],
+                         [(0, 'libelf'), (1, 'dyninst'), (2, 'callpath'),
+                          (3, 'mpileaks'), (1, 'libdwarf')])
+
+
+    def test_deep_traversal(self):
+        # Deeper than the recursion limit.
+        nodes = [Spec('node%d' % i) for i in range(2000)]
+        for parent, child in zip(nodes, nodes[1:]):
+            parent._add_dependency(child)
+
+        traversal = nodes[0].traverse(depth=True, order='post')
+        self.assertEqual([(x, y) for x,y in traversal],
+                         list(reversed(list(enumerate(nodes)))))
+
+
     def test_conflicting_spec_constraints(self):
         mpileaks = Spec('mpileaks ^mpich ^callpath ^dyninst ^libelf ^libdwarf')
 
@@ -94,6 +94,30 @@ class SpecSematicsTest(MockPackagesTest):
         self.check_satisfies('libdwarf^libelf@0.8.13', '^libelf@0:1')
 
 
+    def test_satisfies_memoized(self):
+        cache = spack.spec._satisfies_cache
+        spec = Spec('mpileaks^mpich@1.0')
+        self.assertTrue(spec.satisfies('mpileaks^mpich@:1.5'))
+
+        hits = cache.hits
+        self.assertTrue(spec.satisfies('mpileaks^mpich@:1.5'))
+        self.assertEqual(cache.hits, hits + 1)
+
+        # Changing a spec changes its key.
+        spec['mpich'].versions = VersionList(['2.0'])
+        self.assertFalse(spec.satisfies('mpileaks^mpich@:1.5'))
+
+        # Checks without dependencies are not cached.
+        size = len(cache)
+        self.assertTrue(Spec('mpich@1.0').satisfies('mpich@:1.5'))
+        self.assertEqual(len(cache), size)
+
+        # Concrete DAGs are keyed by their hash.
+        concrete = Spec('mpileaks').concretized()
+        self.assertEqual(concrete._satisfies_key(True),
+                         ('concrete', concrete.dag_hash()))
+
+
     def test_satisfies_namespace(self):
         self.check_satisfies('builtin.mpich', 'mpich')
         self.check_satisfies('builtin.mock.mpich', 'mpich')
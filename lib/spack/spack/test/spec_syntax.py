@@ -146,6 +146,39 @@ class SpecSyntaxTest(unittest.TestCase):
         self.assertRaises(DuplicateCompilerSpecError, self.check_parse, "x ^y%intel%gcc")
         self.assertRaises(DuplicateCompilerSpecError, self.check_parse, "x ^y%gcc%intel")
 
+    def test_parse_many(self):
+        strings = ["mvapich_foo ^_openmpi@1.6,1.2:1.4%intel@12.1:12.6+debug~qt_4",
+                   'x@1.2 cppflags="-O3"', "a b ^c", "+mpi", "@1.9:"]
+        many = spack.spec.parse_many(strings)
+        self.assertEqual(len(strings), len(many))
+        for string, specs in zip(strings, many):
+            expected = SpecParser().parse(string)
+            self.assertEqual([str(s) for s in expected],
+                             [str(s) for s in specs])
+
+    def test_parse_many_errors(self):
+        # Errors point into the string that caused them.
+        try:
+            spack.spec.parse_many(["x", "y@@1.2"])
+            self.fail("Expected SpecParseError")
+        except SpecParseError, e:
+            self.assertEqual("y@@1.2", e.string)
+            self.assertEqual(2, e.pos)
+
+        try:
+            spack.spec.parse_many(["x", "y$"])
+            self.fail("Expected LexError")
+        except spack.parse.LexError, e:
+            self.assertEqual("y$", e.string)
+            self.assertEqual(1, e.pos)
+
+    def test_parse_cache_returns_copies(self):
+        spec = Spec("x@1.2+debug ^y")
+        spec.constrain("x~opt ^y@2")
+        spec.versions = VersionList(['1.2.3'])
+        self.assertEqual("x@1.2+debug^y", str(Spec("x@1.2+debug ^y")))
+        self.assertEqual("x@1.2+debug^y", str(parse("x@1.2+debug ^y")[0]))
+
 
     # ================================================================================
     # Lex checks
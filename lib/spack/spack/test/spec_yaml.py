@@ -27,9 +27,29 @@
 YAML format preserves DAG informatoin in the spec.
 
 """
-from spack.spec import Spec
+from __future__ import absolute_import
+
+import sys
+import base64
+import hashlib
+
+import yaml
+
+import spack.util.spack_yaml as syaml
+from spack.spec import Spec, InternedSpecError
+from spack.version import VersionList
 from spack.test.mock_packages_test import *
 
+
+def yaml_dag_hash(spec):
+    """Hash a spec DAG by running its node dicts through the YAML emitter."""
+    node = spec.to_node_dict()
+    node[spec.name]['dependencies'] = dict(
+        (name, yaml_dag_hash(dep)) for name, dep in spec.dependencies.items())
+    yaml_text = yaml.dump(node, default_flow_style=True, width=sys.maxint)
+    return base64.b32encode(hashlib.sha1(yaml_text).digest()).lower()
+
+
 class SpecDagTest(MockPackagesTest):
 
     def check_yaml_round_trip(self, spec):
@@ -69,3 +89,116 @@ class SpecDagTest(MockPackagesTest):
 
         for dep in ('callpath', 'mpich', 'dyninst', 'libdwarf', 'libelf'):
             self.assertTrue(spec[dep].eq_dag(yaml_spec[dep]))
+
+
+    def test_flow_dump(self):
+        for data in ({'a': {'versions': ['1.2', '1.2.3', '10', ':3']}},
+                     {'b': {'parameters': {'cflags': ['-O2', '-g'],
+                                           'debug': True, 'opt': False},
+                            'arch': None, 'namespace': 'builtin.mock'}},
+                     {'c': {'version': 'yes', 'e': '', 'f': u'unicode',
+                            'g': 'a b', 'h': 2016, 'i': 1.5}},
+                     {'d': {'1.0': 'x', '': 'empty key'}}):
+            self.assertEqual(
+                syaml.flow_dump(data),
+                yaml.dump(data, default_flow_style=True, width=sys.maxint))
+
+        # Shared containers, and longs, are written as aliases by YAML.
+        shared = []
+        big = 2 ** 64
+        for data in ({'e': {'x': shared, 'y': shared}},
+                     {'f': {'x': big, 'y': big}}):
+            self.assertEqual(
+                syaml.flow_dump(data),
+                yaml.dump(data, default_flow_style=True, width=sys.maxint))
+
+
+    def test_dag_hash_matches_yaml(self):
+        for spec_string in ('mpileaks', 'mpileaks+debug~opt',
+                            'mpileaks@1.0:5.0,6.1,7.3 cppflags="-O3"'):
+            spec = Spec(spec_string)
+            spec.normalize()
+            for s in spec.traverse():
+                self.assertEqual(s.dag_hash(), yaml_dag_hash(s))
+
+            spec.concretize()
+            for s in spec.traverse():
+                self.assertEqual(s.dag_hash(), yaml_dag_hash(s))
+
+
+    def test_dag_hash_tracks_changes(self):
+        spec = Spec('mpileaks')
+        spec.normalize()
+        before = spec.dag_hash()
+
+        # Non-concrete hashes are not cached across calls.
+        spec['callpath'].versions = VersionList(['1.0'])
+        self.assertNotEqual(spec.dag_hash(), before)
+        self.assertEqual(spec.dag_hash(), yaml_dag_hash(spec))
+
+        # The hash of a concrete spec is cached in full.
+        spec.concretize()
+        self.assertEqual(len(spec.dag_hash(7)), 7)
+        self.assertEqual(spec.dag_hash(), yaml_dag_hash(spec))
+
+
+    def test_to_yaml_matches_to_dict(self):
+        spec = Spec('mpileaks^mpich+debug')
+        spec.concretize()
+        self.assertEqual(yaml.load(spec.to_yaml()), spec.to_dict())
+
+
+    def test_concrete_yaml_shares_nodes(self):
+        spec = Spec('mpileaks^mpich')
+        spec.concretize()
+        other = Spec('callpath^mpich')
+        other.concretize()
+
+        first = Spec.from_yaml(spec.to_yaml(), concrete=True)
+        self.assertTrue(first.concrete)
+        self.assertEqual(spec.dag_hash(), first.dag_hash())
+        self.assertTrue(spec.eq_dag(first))
+
+        # Reading again, or reading a sub-DAG, reuses the same nodes.
+        self.assertTrue(
+            Spec.from_yaml(spec.to_yaml(), concrete=True) is first)
+        second = Spec.from_yaml(other.to_yaml(), concrete=True)
+        self.assertTrue(second is first['callpath'])
+
+
+    def test_interned_specs_are_frozen(self):
+        spec = Spec('mpileaks^mpich')
+        spec.concretize()
+        interned = Spec.from_yaml(spec.to_yaml(), concrete=True)
+        libelf = interned['libelf']
+
+        # Shared nodes can't be changed, or added to other DAGs.
+        self.assertRaises(InternedSpecError, setattr, libelf, 'name', 'x')
+        self.assertRaises(InternedSpecError, libelf.constrain, '+debug')
+        self.assertRaises(InternedSpecError,
+                          libelf.dependencies.__setitem__, 'x', spec)
+        self.assertRaises(InternedSpecError,
+                          Spec('libdwarf')._add_dependency, libelf)
+        self.assertFalse(libelf.dependents)
+
+        # Copies are private, with dependents.
+        copy = interned.copy()
+        self.assertTrue(copy.eq_dag(interned))
+        self.assertTrue(copy['libelf'].dependents)
+        copy['libelf'].versions = VersionList(['1.0'])
+        self.assertEqual(spec.dag_hash(), interned.dag_hash())
+
+
+    def test_yaml_hash_verification(self):
+        spec = Spec('mpileaks')
+        spec.concretize()
+        yaml_text = spec.to_yaml()
+        bad_text = yaml_text.replace(spec['callpath'].dag_hash(), 'x' * 32)
+
+        # Stored hashes are trusted unless verification is requested.
+        self.assertEqual('x' * 32, Spec.from_yaml(bad_text)['callpath']
+                         .dag_hash())
+        self.assertEqual(spec.dag_hash(),
+                         Spec.from_yaml(yaml_text, verify=True).dag_hash())
+        self.assertRaises(spack.spec.SpecHashMismatchError,
+                          Spec.from_yaml, bad_text, verify=True)
@@ -52,6 +52,14 @@ def checksum(hashlib_algo, filename, **kwargs):
     return hasher.hexdigest()
 
 
+def hash_bits(string, bits):
+    """Returns the first bits bits of the SHA-1 digest of string, as
+       a nonnegative integer.  Used to spread keys over a large range,
+       e.g. the byte offsets of byte-range locks.
+    """
+    digest = int(hashlib.sha1(string).hexdigest(), 16)
+    return digest >> (hashlib.sha1().digest_size * 8 - bits)
+
 
 class Checker(object):
     """A checker checks files against one particular hex digest.
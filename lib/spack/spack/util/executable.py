@@ -25,8 +25,10 @@
 
 import os
 import re
+import errno
 import subprocess
 import inspect
+import threading
 
 import llnl.util.tty as tty
 import spack
@@ -158,7 +160,7 @@ class Executable(object):
                 stderr=estream,
                 stdout=ostream,
                 env=env)
-            out, err = proc.communicate()
+            out, err = _communicate(proc)
 
             rc = self.returncode = proc.returncode
             if fail_on_error and rc != 0 and (rc not in ignore_errors):
@@ -207,6 +209,48 @@ class Executable(object):
         return ' '.join(self.exe)
 
 
+def _communicate(proc):
+    """Like proc.communicate() for a process without a stdin pipe, but
+       reaps the process with os.wait4() and reports its resource usage
+       to spack.build_stats."""
+    out = err = None
+    if proc.stdout and proc.stderr:
+        # Read both pipes at once, so that neither fills up.
+        errs = []
+        reader = threading.Thread(
+            target=lambda: errs.append(proc.stderr.read()))
+        reader.daemon = True
+        reader.start()
+        out = proc.stdout.read()
+        reader.join()
+        err = errs[0]
+    elif proc.stdout:
+        out = proc.stdout.read()
+    elif proc.stderr:
+        err = proc.stderr.read()
+    for stream in (proc.stdout, proc.stderr):
+        if stream:
+            stream.close()
+
+    while True:
+        try:
+            _, status, rusage = os.wait4(proc.pid, 0)
+            break
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+
+    # Imported here because build_stats imports llnl.util.filesystem,
+    # which imports this module.
+    import spack.build_stats
+    spack.build_stats.child_exited(rusage)
+    return out, err
+
+
 def which(name, **kwargs):
     """Finds an executable in the path like command-line which."""
     path = kwargs.get('path', os.environ.get('PATH', '').split(os.pathsep))
@@ -0,0 +1,84 @@
+##############################################################################
+# Copyright (c) 2013-2016, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/llnl/spack
+# Please also see the LICENSE file for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""Simple wrapper around JSON to guarantee consistent use of load/dump.
+
+JSON is used for Spack's internal caches (e.g., the install database
+index) because Python's ``json`` module parses with a C extension and
+is much faster than PyYAML.  User-facing files are still YAML.
+
+- ``load()`` and ``loads()`` return ``str`` instead of ``unicode``
+  wherever a string is pure ASCII, like ``spack_yaml`` does.  Spack
+  code (and hashes computed from YAML dumps) expect ``str``.
+
+"""
+import json
+
+# Only export load and dump
+__all__ = ['load', 'loads', 'dump', 'dumps']
+
+# Keep output compact; these files are not meant to be edited by hand.
+_json_dump_args = {
+    'separators': (',', ':'),
+    'sort_keys': True
+}
+
+
+def _strify(data):
+    """Convert unicode strings in data to ASCII ``str`` where possible."""
+    if isinstance(data, dict):
+        return dict((_strify(k), _strify(v)) for k, v in data.iteritems())
+    elif isinstance(data, list):
+        return [_strify(v) for v in data]
+    elif isinstance(data, unicode):
+        try:
+            return data.encode('ascii')
+        except UnicodeEncodeError:
+            return data
+    return data
+
+
+def load(stream):
+    """Load JSON from a file object or from the file at a path."""
+    if isinstance(stream, basestring):
+        with open(stream, 'r') as f:
+            return _strify(json.load(f))
+    return _strify(json.load(stream))
+
+
+def loads(string):
+    """Load JSON from a string."""
+    return _strify(json.loads(string))
+
+
+def dump(data, stream=None):
+    """Dump JSON to a stream, or return it as a string if no stream."""
+    if stream is None:
+        return json.dumps(data, **_json_dump_args)
+    json.dump(data, stream, **_json_dump_args)
+
+
+def dumps(data):
+    """Dump JSON to a string."""
+    return json.dumps(data, **_json_dump_args)
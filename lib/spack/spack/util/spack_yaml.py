@@ -30,7 +30,13 @@
 - ``Our load methods use ``OrderedDict`` class instead of YAML's
   default unorderd dict.
 
+- ``flow_dump()`` writes the same text as YAML's flow style for the
+  simple data in spec node dicts, without going through the YAML
+  emitter.
+
 """
+import re
+import sys
 import yaml
 from yaml.nodes import *
 from yaml.constructor import ConstructorError
@@ -38,7 +44,7 @@ from yaml.representer import SafeRepresenter
 from ordereddict_backport import OrderedDict
 
 # Only export load and dump
-__all__ = ['load', 'dump']
+__all__ = ['load', 'dump', 'flow_dump']
 
 # Make new classes so we can add custom attributes.
 # Also, use OrderedDict instead of just dict.
@@ -199,3 +205,119 @@ def load(*args, **kwargs):
 def dump(*args, **kwargs):
     kwargs['Dumper'] = OrderedLineDumper
     return yaml.dump(*args, **kwargs)
+
+
+# Strings made of these characters are written either plain or in single
+# quotes, and never need escaping.
+_simple_flow_str = re.compile(r'^[A-Za-z0-9_.+:-]+$')
+
+# Keys must also be plain and not start with an indicator.
+_plain_flow_key = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_.+-]*$')
+
+# Keys longer than this are not simple keys, and are written differently.
+_max_simple_key_length = 128
+
+
+class _NeedsEmitter(Exception):
+    """Raised when flow_dump() can't be sure it matches YAML's output."""
+
+
+def _resolves_to_str(value):
+    """Whether a plain scalar with this value is read back as a string."""
+    resolvers = yaml.Dumper.yaml_implicit_resolvers
+    for tag, regexp in (resolvers.get(value[0], []) +
+                        resolvers.get(None, [])):
+        if regexp.match(value):
+            return False
+    return True
+
+
+def _needs_quotes(value):
+    """Whether YAML quotes a string that matches _simple_flow_str."""
+    # ':' is an indicator in flow context, as are a lone '-' and
+    # document markers.
+    if (':' in value or value == '-' or
+            value.startswith('---') or value.startswith('...')):
+        return True
+
+    # Otherwise it's quoted only if it would be read back as another
+    # type, like 1.2 (float) or yes (bool).
+    return not _resolves_to_str(value)
+
+
+def _flow_scalar(value):
+    t = type(value)
+    if t is str and _simple_flow_str.match(value):
+        if _needs_quotes(value):
+            return "'%s'" % value
+        return value
+    elif t is bool:
+        return 'true' if value else 'false'
+    elif value is None:
+        return 'null'
+    elif t is int:
+        # Not longs: YAML writes repeated longs as aliases.
+        return str(value)
+    elif t is str or t is unicode or t is float:
+        # Quoted or tagged scalars: let the emitter decide how they look.
+        text = yaml.dump([value], default_flow_style=True, width=sys.maxint)
+        if not (text.startswith('[') and text.endswith(']\n') and
+                text.count('\n') == 1):
+            raise _NeedsEmitter()
+        return text[1:-2]
+    else:
+        raise _NeedsEmitter()
+
+
+def _flow_write(data, out, seen):
+    t = type(data)
+    if t is not dict and t is not list:
+        out.append(_flow_scalar(data))
+        return
+
+    # YAML writes repeated containers as anchors and aliases.
+    if id(data) in seen:
+        raise _NeedsEmitter()
+    seen.add(id(data))
+
+    if t is list:
+        out.append('[')
+        for i, item in enumerate(data):
+            if i:
+                out.append(', ')
+            _flow_write(item, out, seen)
+        out.append(']')
+    else:
+        out.append('{')
+        for i, key in enumerate(sorted(data)):
+            if type(key) is not str or not _plain_flow_key.match(key):
+                raise _NeedsEmitter()
+            text = _flow_scalar(key)
+            if len(text) >= _max_simple_key_length:
+                raise _NeedsEmitter()
+            if i:
+                out.append(', ')
+            out.append(text)
+            out.append(': ')
+            _flow_write(data[key], out, seen)
+        out.append('}')
+
+
+def flow_dump(data):
+    """Equivalent to ``yaml.dump(data, default_flow_style=True,
+    width=sys.maxint)`` for a dict or list, but faster.
+
+    Spec hashes are computed from this text, so it must match YAML's
+    output byte for byte.  Plain dicts, lists, strings, bools, ints and
+    None are written directly; anything else falls back to the YAML
+    emitter.
+    """
+    if type(data) is dict or type(data) is list:
+        out = []
+        try:
+            _flow_write(data, out, set())
+            out.append('\n')
+            return ''.join(out)
+        except _NeedsEmitter:
+            pass
+    return yaml.dump(data, default_flow_style=True, width=sys.maxint)
@@ -22,6 +22,9 @@
 # License along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 ##############################################################################
+import re
+import textwrap
+
 
 def comma_list(sequence, article=''):
     if type(sequence) != list:
@@ -47,3 +50,12 @@ def comma_or(sequence):
 
 def comma_and(sequence):
     return comma_list(sequence, 'and')
+
+
+def format_doc(doc, indent=0):
+    """Wrap a doc string at 72 characters and indent it."""
+    if not doc:
+        return ""
+
+    lines = textwrap.wrap(re.sub(r'\s+', ' ', doc), 72)
+    return "".join((" " * indent) + line + "\n" for line in lines)
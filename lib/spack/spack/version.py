@@ -552,7 +552,10 @@ class VersionList(object):
 
 
     def copy(self):
-        return VersionList(self)
+        # Already sorted and merged, so skip add().
+        clone = VersionList()
+        clone.versions = list(self.versions)
+        return clone
 
 
     def lowest(self):
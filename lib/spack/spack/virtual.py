@@ -63,7 +63,12 @@ class ProviderIndex(object):
             self.update(spec)
 
 
-    def update(self, spec):
+    def update(self, spec, provided=None):
+        """Add the virtual packages that spec provides to the index.
+
+        ``provided`` is the package's dict of provided spec -> when
+        spec.  If it is not supplied, it is read from spec's package.
+        """
         if type(spec) != spack.spec.Spec:
             spec = spack.spec.Spec(spec)
 
@@ -71,10 +76,15 @@ class ProviderIndex(object):
             # Empty specs do not have a package
             return
 
-        assert(not spec.virtual)
+        if provided is None:
+            # Read the class attribute; instantiating a package for every
+            # variant of spec the concretizer indexes is expensive.  Classes
+            # without provides() only get the dict when instantiated.
+            assert(not spec.virtual)
+            pkg_class = spack.repo.repo_for_pkg(spec).get_pkg_class(spec.name)
+            provided = getattr(pkg_class, 'provided', {})
 
-        pkg = spec.package
-        for provided_spec, provider_spec in pkg.provided.iteritems():
+        for provided_spec, provider_spec in provided.iteritems():
             provider_spec.compiler_flags = spec.compiler_flags.copy()#We want satisfaction other than flags
             if provider_spec.satisfies(spec, deps=False):
                 provided_name = provided_spec.name
@@ -148,6 +158,46 @@ class ProviderIndex(object):
         return name in self.providers
 
 
+    def merge(self, other, exclude=()):
+        """Add the providers in another index to this one.
+
+        Providers whose package names are in ``exclude`` are skipped.
+        This is used to merge the indexes of several repositories, where
+        packages in earlier repositories hide packages of the same name
+        in later ones.
+        """
+        for vname, other_map in other.providers.items():
+            provider_map = self.providers.setdefault(vname, {})
+            for provided_spec, spec_set in other_map.items():
+                specs = set(s for s in spec_set if s.name not in exclude)
+                if specs:
+                    provider_map.setdefault(provided_spec, set()).update(specs)
+            if not provider_map:
+                del self.providers[vname]
+
+
+    def to_dict(self):
+        """Dictionary representation of the index, for caching."""
+        return {
+            'restrict': self.restrict,
+            'providers': dict(
+                (vname, sorted([str(vspec), sorted(str(s) for s in spec_set)]
+                               for vspec, spec_set in provider_map.items()))
+                for vname, provider_map in self.providers.items())
+        }
+
+
+    @staticmethod
+    def from_dict(d):
+        index = ProviderIndex([], restrict=d['restrict'])
+        for vname, entries in d['providers'].items():
+            index.providers[vname] = dict(
+                (spack.spec.Spec(vspec),
+                 set(spack.spec.Spec(s) for s in spec_strs))
+                for vspec, spec_strs in entries)
+        return index
+
+
     def satisfies(self, other):
         """Check that providers of virtual specs are compatible."""
         common = set(self.providers) & set(other.providers)
@@ -0,0 +1,89 @@
+##############################################################################
+# Copyright (c) 2013-2016, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/llnl/spack
+# Please also see the LICENSE file for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""Compare Spec.dag_hash() against hashing YAML emitter output.
+
+Normalizes a spec for every package in the configured repos, then hashes
+every node both ways, checks that the hashes agree, and prints timings.
+
+Run with:
+
+    spack python share/spack/benchmarks/dag_hash.py [repetitions]
+"""
+import sys
+import time
+import base64
+import hashlib
+
+import yaml
+
+import llnl.util.tty as tty
+
+import spack
+from spack.spec import Spec
+
+
+def yaml_dag_hash(spec):
+    """dag_hash() the way it was computed with the YAML emitter."""
+    node = spec.to_node_dict()
+    d = node[spec.name]
+    d['dependencies'] = dict((name, yaml_dag_hash(dep))
+                             for name, dep in spec.dependencies.items())
+    yaml_text = yaml.dump(node, default_flow_style=True, width=sys.maxint)
+    sha = hashlib.sha1(yaml_text)
+    return base64.b32encode(sha.digest()).lower()
+
+
+def timed(fun, specs, reps):
+    start = time.time()
+    for i in range(reps):
+        hashes = [fun(s) for s in specs]
+    return hashes, (time.time() - start) / reps
+
+
+reps = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+specs = []
+for name in spack.repo.all_package_names():
+    try:
+        spec = Spec(name)
+        spec.normalize()
+        specs.extend(spec.traverse())
+    except Exception as e:
+        tty.debug("Skipping %s: %s" % (name, e))
+
+tty.msg("Hashing %d nodes from %d packages"
+        % (len(specs), len(spack.repo.all_package_names())))
+
+yaml_hashes, yaml_time = timed(yaml_dag_hash, specs, reps)
+fast_hashes, fast_time = timed(Spec.dag_hash, specs, reps)
+
+mismatches = [s for s, a, b in zip(specs, yaml_hashes, fast_hashes) if a != b]
+if mismatches:
+    tty.die("%d hashes differ, e.g. for %s"
+            % (len(mismatches), mismatches[0].name))
+
+print "%-10s %10.3fs" % ('yaml', yaml_time)
+print "%-10s %10.3fs" % ('dag_hash', fast_time)
+print "%-10s %10.1fx" % ('speedup', yaml_time / fast_time)
@@ -0,0 +1,122 @@
+##############################################################################
+# Copyright (c) 2013-2016, Lawrence Livermore National Security, LLC.
+# Produced at the Lawrence Livermore National Laboratory.
+#
+# This file is part of Spack.
+# Created by Todd Gamblin, tgamblin@llnl.gov, All rights reserved.
+# LLNL-CODE-647188
+#
+# For details, see https://github.com/llnl/spack
+# Please also see the LICENSE file for our notice and the LGPL.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License (as
+# published by the Free Software Foundation) version 2.1, February 1999.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the IMPLIED WARRANTY OF
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the terms and
+# conditions of the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+##############################################################################
+"""Compare Spec.traverse() against the old recursive traversal.
+
+Builds synthetic DAGs -- a long chain and a wide, layered DAG -- and
+walks them with each cover and order, checking that both traversals
+yield the same nodes and printing timings.
+
+Run with:
+
+    spack python share/spack/benchmarks/traverse.py [repetitions]
+"""
+import sys
+import time
+import random
+
+import llnl.util.tty as tty
+
+from spack.spec import Spec
+
+
+def recursive_traverse(spec, visited=None, d=0, **kwargs):
+    """Spec.traverse() the way it was written as a recursive generator."""
+    depth = kwargs.get('depth', False)
+    cover = kwargs.get('cover', 'nodes')
+    order = kwargs.get('order', 'pre')
+
+    if visited is None:
+        visited = set()
+    key = id(spec)
+    if key in visited and cover == 'nodes':
+        return
+
+    result = (d, spec) if depth else spec
+    if order == 'pre':
+        yield result
+
+    if not (key in visited and cover == 'edges'):
+        visited.add(key)
+        for name in sorted(spec.dependencies):
+            child = spec.dependencies[name]
+            for elt in recursive_traverse(child, visited, d + 1, **kwargs):
+                yield elt
+
+    if order == 'post':
+        yield result
+
+
+def chain(length):
+    """A DAG where each node depends only on the next one."""
+    nodes = [Spec('node%d' % i) for i in range(length)]
+    for parent, child in zip(nodes, nodes[1:]):
+        parent._add_dependency(child)
+    return nodes[0]
+
+
+def layered(layers, width, fanout):
+    """A DAG of layers, where each node depends on fanout random nodes
+       in the layer below it."""
+    random.seed(0)
+    rows = [[Spec('node%d_%d' % (layer, i)) for i in range(width)]
+            for layer in range(layers)]
+    for upper, lower in zip(rows, rows[1:]):
+        for node in upper:
+            for child in random.sample(lower, fanout):
+                node._add_dependency(child)
+
+    root = Spec('root')
+    for node in rows[0]:
+        root._add_dependency(node)
+    return root
+
+
+def timed(fun, reps):
+    start = time.time()
+    for i in range(reps):
+        result = [id(s) for s in fun()]
+    return result, (time.time() - start) / reps
+
+
+reps = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+dags = [('chain(400)', chain(400), ('nodes', 'edges', 'paths')),
+        ('layered(40x25)', layered(40, 25, 3), ('nodes', 'edges')),
+        ('layered(6x8)', layered(6, 8, 3), ('paths',))]
+
+print "%-16s %-6s %-5s %10s %10s %8s" % (
+    'dag', 'cover', 'order', 'recursive', 'traverse', 'speedup')
+for name, root, covers in dags:
+    for cover in covers:
+        for order in ('pre', 'post'):
+            kwargs = {'cover': cover, 'order': order}
+            old, old_time = timed(
+                lambda: recursive_traverse(root, **kwargs), reps)
+            new, new_time = timed(lambda: root.traverse(**kwargs), reps)
+            if old != new:
+                tty.die("Traversals of %s differ with %s" % (name, kwargs))
+
+            print "%-16s %-6s %-5s %9.4fs %9.4fs %7.1fx" % (
+                name, cover, order, old_time, new_time, old_time / new_time)